@@ -4,6 +4,7 @@ __all__ = [
     "location_by_name",
     "get_forecast",
     "redis_client",
+    "redis_async_client",
 ]
 
 import redis
@@ -12,5 +13,6 @@ from redis import Redis
 from .celery_tasks.tasks import location_by_name, get_forecast
 from .utils.settings import settings
 from .utils.db_engine import db_engine
+from .utils.redis_engine import redis_async_client
 
 redis_client: Redis = redis.Redis(host=settings.REDIS_LOCALHOST)
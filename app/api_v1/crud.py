@@ -0,0 +1,164 @@
+"""
+Module. Gazetteer database access for location search.
+"""
+
+from typing import Any, Dict, List
+
+from prometheus_client import Counter
+from sqlalchemy import Select, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.search_cache import normalize_query
+from app.models import Gazetteer, GazetteerQuery
+from app.utils.settings import settings
+from app.utils.utils import handling_interface_error
+
+gazetteer_lookups: Counter = Counter(
+    "gazetteer_lookups_total",
+    "Location searches by gazetteer outcome.",
+    ["outcome"],
+)
+gazetteer_locations_seen: Counter = Counter(
+    "gazetteer_locations_seen_total",
+    "Locations returned by the weather API, by whether they were already known.",
+    ["known"],
+)
+
+
+def _location(location: Gazetteer) -> Dict[str, Any]:
+    return {
+        "id": location.id,
+        "name": location.name,
+        "region": location.region,
+        "country": location.country,
+        "lat": location.lat,
+        "lon": location.lon,
+    }
+
+
+@handling_interface_error
+async def find_gazetteer_locations(
+    session: AsyncSession, query: str
+) -> List[Dict[str, Any]] | None:
+    """
+    Function. Answer a location search from the gazetteer. A query searched
+    upstream before gets the same locations, even when there were none.
+    Otherwise, only when GAZETTEER_MIN_SIMILARITY is set, locations with a
+    similar enough name are returned.
+    :param session: SQLAlchemy session.
+    :param query: normalized search query
+    :return: locations or None if the gazetteer cannot answer
+    """
+    seen_query: GazetteerQuery | None = await session.scalar(
+        select(GazetteerQuery).where(GazetteerQuery.query == query)
+    )
+    if seen_query is not None:
+        locations: List[Gazetteer] = list(
+            await session.scalars(
+                select(Gazetteer).where(Gazetteer.id.in_(seen_query.location_ids))
+            )
+        )
+        order: Dict[int, int] = {
+            location_id: position
+            for position, location_id in enumerate(seen_query.location_ids)
+        }
+        locations.sort(key=lambda location: order[location.id])
+        await session.execute(
+            update(GazetteerQuery)
+            .where(GazetteerQuery.id == seen_query.id)
+            .values(hits=GazetteerQuery.hits + 1)
+        )
+        outcome: str = "seen"
+    elif settings.search_cache.GAZETTEER_MIN_SIMILARITY is None:
+        locations = []
+        outcome = "unseen"
+    else:
+        similarity = func.similarity(Gazetteer.search_name, query)
+        similar_locations: Select = (
+            select(Gazetteer)
+            # The % operator is what the trigram index serves.
+            .where(Gazetteer.search_name.op("%")(query))
+            .where(similarity >= settings.search_cache.GAZETTEER_MIN_SIMILARITY)
+            .order_by(similarity.desc(), Gazetteer.hits.desc())
+            .limit(settings.search_cache.GAZETTEER_MAX_RESULTS)
+        )
+        locations = list(await session.scalars(similar_locations))
+        outcome = "similar" if locations else "unseen"
+
+    gazetteer_lookups.labels(outcome).inc()
+    if outcome == "unseen":
+        return None
+
+    if locations:
+        await session.execute(
+            update(Gazetteer)
+            .where(Gazetteer.id.in_([location.id for location in locations]))
+            .values(hits=Gazetteer.hits + 1)
+        )
+    await session.commit()
+    return [_location(location) for location in locations]
+
+
+@handling_interface_error
+async def save_gazetteer_locations(
+    session: AsyncSession, query: str, locations: List[Dict[str, Any]]
+) -> None:
+    """
+    Function. Persist weather API search results and the query they answer.
+    :param session: SQLAlchemy session.
+    :param query: normalized search query
+    :param locations: weather API search results
+    :return: None
+    """
+    if locations:
+        known: int = await session.scalar(
+            select(func.count())
+            .select_from(Gazetteer)
+            .where(Gazetteer.id.in_([location["id"] for location in locations]))
+        )
+        gazetteer_locations_seen.labels("yes").inc(known)
+        gazetteer_locations_seen.labels("no").inc(len(locations) - known)
+
+        upsert_locations = insert(Gazetteer).values(
+            [
+                {
+                    "id": location["id"],
+                    "name": location["name"],
+                    "region": location["region"],
+                    "country": location["country"],
+                    "lat": location["lat"],
+                    "lon": location["lon"],
+                    "search_name": normalize_query(location["name"], {}),
+                }
+                for location in locations
+            ]
+        )
+        await session.execute(
+            upsert_locations.on_conflict_do_update(
+                index_elements=[Gazetteer.id],
+                set_={
+                    "name": upsert_locations.excluded.name,
+                    "region": upsert_locations.excluded.region,
+                    "country": upsert_locations.excluded.country,
+                    "lat": upsert_locations.excluded.lat,
+                    "lon": upsert_locations.excluded.lon,
+                    "search_name": upsert_locations.excluded.search_name,
+                    "last_seen_at": func.now(),
+                },
+            )
+        )
+
+    upsert_query = insert(GazetteerQuery).values(
+        query=query, location_ids=[location["id"] for location in locations]
+    )
+    await session.execute(
+        upsert_query.on_conflict_do_update(
+            index_elements=[GazetteerQuery.query],
+            set_={
+                "location_ids": upsert_query.excluded.location_ids,
+                "searched_at": func.now(),
+            },
+        )
+    )
+    await session.commit()
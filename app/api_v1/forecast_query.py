@@ -0,0 +1,193 @@
+"""
+Module. Compact query encoding of forecast settings for the cacheable GET
+forecast route, and the validators of its responses.
+
+Display settings are flag letters, e.g.
+    ?units=C&days=3&hours=8&current=hpvw&daily=ahv&hourly=hv
+Letters may come in any order and repeat; the canonical form sorts them,
+so every spelling of the same settings gets the same ETag. A sparse
+fieldset, e.g. fields=current.temp,forecasthour.temp, is canonicalized
+the same way.
+"""
+
+from hashlib import blake2b
+from typing import Annotated, Dict, List, NamedTuple, Type
+
+from fastapi import Depends, HTTPException, Query
+
+from app.api_v1.projection import FieldSelection, parse_fields
+from app.utils.settings import settings
+
+from app.schemas.setting_schemas import (
+    CurrentSettings,
+    DailySettings,
+    HourlySettings,
+    UserSettings,
+    WeatherSettings,
+)
+
+# Flag letter: settings field.
+CURRENT_FLAGS: Dict[str, str] = {
+    "h": "humidity",
+    "p": "pressure",
+    "v": "visibility",
+    "w": "wind_extended",
+}
+DAILY_FLAGS: Dict[str, str] = {
+    "a": "astro",
+    "h": "humidity",
+    "v": "visibility",
+}
+HOURLY_FLAGS: Dict[str, str] = CURRENT_FLAGS
+
+
+def _flag_pattern(flags: Dict[str, str]) -> str:
+    return f"^[{''.join(flags)}]*$"
+
+
+def parse_flags(
+    letters: str | None, flags: Dict[str, str], model: Type[WeatherSettings]
+) -> WeatherSettings | None:
+    """
+    Function. Display settings of flag letters.
+    :param letters: flag letters, None if not given
+    :param flags: flag letters of the settings model
+    :param model: settings model
+    :return: settings, None if not given
+    """
+    if letters is None:
+        return None
+    return model(**{field: letter in letters for letter, field in flags.items()})
+
+
+def encode_flags(
+    display_settings: WeatherSettings | None, flags: Dict[str, str]
+) -> str | None:
+    """
+    Function. Canonical flag letters of display settings.
+    :param display_settings: settings, None if not given
+    :param flags: flag letters of the settings model
+    :return: sorted flag letters, None if not given
+    """
+    if display_settings is None:
+        return None
+    return "".join(
+        letter for letter, field in flags.items() if getattr(display_settings, field)
+    )
+
+
+class ForecastQuery(NamedTuple):
+    """
+    Class. Forecast settings of a GET forecast request.
+    Attributes:
+        user_settings (UserSettings): units, forecast days and hours.
+        current (CurrentSettings | None): current weather settings.
+        daily (DailySettings | None): daily weather settings.
+        hourly (HourlySettings | None): hourly weather settings.
+        fields (FieldSelection): sparse fieldset, empty for all fields.
+    """
+
+    user_settings: UserSettings
+    current: CurrentSettings | None
+    daily: DailySettings | None
+    hourly: HourlySettings | None
+    fields: FieldSelection = ()
+
+    @property
+    def canonical(self) -> str:
+        """
+        Function. Canonical query string of the settings.
+        :return: query string without the leading "?"
+        """
+        params: List[str] = [
+            f"units={self.user_settings.units}",
+            f"days={self.user_settings.daily}",
+            f"hours={self.user_settings.hourly}",
+        ]
+        for name, display_settings, flags in (
+            ("current", self.current, CURRENT_FLAGS),
+            ("daily", self.daily, DAILY_FLAGS),
+            ("hourly", self.hourly, HOURLY_FLAGS),
+        ):
+            letters: str | None = encode_flags(display_settings, flags)
+            if letters is not None:
+                params.append(f"{name}={letters}")
+        if self.fields:
+            params.append(f"fields={','.join(self.fields)}")
+        return "&".join(params)
+
+    def etag(self, updated_at: int, local_hour: int) -> str:
+        """
+        Function. Strong ETag of a forecast response. The body is fixed by
+        the upstream update, the location local hour starting the hourly
+        window and the settings.
+        :param updated_at: upstream update time in epoch seconds
+        :param local_hour: location local hour at fetch time
+        :return: quoted entity tag
+        """
+        settings_hash: str = blake2b(self.canonical.encode(), digest_size=8).hexdigest()
+        return f'"{updated_at}.{local_hour}-{settings_hash}"'
+
+
+def field_selection(
+    fields: Annotated[str | None, Query()] = None,
+) -> FieldSelection:
+    """
+    Function. Sparse fieldset of the fields query parameter, a route
+    dependency.
+    :param fields: comma separated "section" or "section.field" selectors
+    :return: field selection
+    :raises HTTPException: 422 on unknown sections or fields
+    """
+    try:
+        return parse_fields(fields)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+
+def forecast_query(
+    fields: Annotated[FieldSelection, Depends(field_selection)],
+    units: Annotated[str, Query(pattern="^[CF]$")] = "F",
+    days: Annotated[int, Query(ge=1, le=settings.forecast_cache.UPSTREAM_MAX_DAYS)] = 3,
+    hours: Annotated[
+        int, Query(ge=0, le=settings.forecast_cache.UPSTREAM_MAX_DAYS * 24)
+    ] = 8,
+    current: Annotated[str | None, Query(pattern=_flag_pattern(CURRENT_FLAGS))] = None,
+    daily: Annotated[str | None, Query(pattern=_flag_pattern(DAILY_FLAGS))] = None,
+    hourly: Annotated[str | None, Query(pattern=_flag_pattern(HOURLY_FLAGS))] = None,
+) -> ForecastQuery:
+    """
+    Function. Forecast settings of query parameters, a route dependency.
+    :param fields: sparse fieldset
+    :param units: "C" for metric, "F" for British
+    :param days: forecast days, up to the upstream horizon
+    :param hours: forecast hours, up to the upstream horizon
+    :param current: current weather flag letters
+    :param daily: daily weather flag letters
+    :param hourly: hourly weather flag letters
+    :return: forecast query
+    """
+    return ForecastQuery(
+        user_settings=UserSettings(units=units, daily=days, hourly=hours),
+        current=parse_flags(current, CURRENT_FLAGS, CurrentSettings),
+        daily=parse_flags(daily, DAILY_FLAGS, DailySettings),
+        hourly=parse_flags(hourly, HOURLY_FLAGS, HourlySettings),
+        fields=fields,
+    )
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    """
+    Function. Whether an If-None-Match header matches an ETag, compared
+    weakly as RFC 9110 asks for If-None-Match.
+    :param etag: quoted entity tag
+    :param if_none_match: header value, None if not sent
+    :return: match flag
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
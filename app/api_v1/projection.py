@@ -0,0 +1,364 @@
+"""
+Module. Compiled projection plans shaping cached forecast documents into
+ForecastPublic responses. A plan lists, per response section, the fields
+kept by the units, the display settings and an optional sparse fieldset,
+so shaping is a walk over cached dicts instead of model validation and
+sections left out of a fieldset are never shaped.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Set, Tuple, Type
+
+from pydantic import BaseModel
+
+from app.schemas.setting_schemas import (
+    CurrentSettings,
+    DailySettings,
+    HourlySettings,
+)
+from app.schemas.weather_schemas import (
+    Astro,
+    CurrentWeatherBritish,
+    CurrentWeatherMetric,
+    CurrentWeatherPublic,
+    DailyWeatherBritish,
+    DailyWeatherMetric,
+    DailyWeatherPublic,
+    HourlyForecastPublic,
+    HourlyWeatherBritish,
+    HourlyWeatherMetric,
+    Location,
+    exclude_fields,
+)
+
+SectionPlan = Tuple[str, ...]
+# Canonical sparse fieldset: sorted "section" and "section.field"
+# selectors, empty for the whole response.
+FieldSelection = Tuple[str, ...]
+
+# Suffixes dropped from unit fields, so "temp" selects temp_c or temp_f.
+UNIT_SUFFIXES: Tuple[str, ...] = (
+    "_c",
+    "_f",
+    "_kph",
+    "_mph",
+    "_mb",
+    "_in",
+    "_mm",
+    "_km",
+    "_miles",
+)
+SECTION_MODELS: Dict[str, Tuple[Type[BaseModel], ...]] = {
+    "location": (Location,),
+    "current": (CurrentWeatherPublic,),
+    "forecastday": (DailyWeatherPublic, Astro),
+    "forecasthour": (HourlyForecastPublic,),
+    "alerts": (),
+}
+
+
+def project(section: SectionPlan, values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Function. Shape canonical document values into a response section.
+    Documents are validated at ingest and hold no empty values, so fields
+    are copied as they are; a field left out upstream stays out.
+    :param section: section plan
+    :param values: canonical document values
+    :return: response section
+    """
+    return {name: values[name] for name in section if name in values}
+
+
+def unit_stem(name: str) -> str:
+    """
+    Function. Field name without its unit suffix.
+    :param name: field name
+    :return: unit-neutral name
+    """
+    for suffix in UNIT_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def _selectable(section: str) -> FrozenSet[str]:
+    names: Set[str] = {"date", "astro"} if section == "forecastday" else set()
+    for model in SECTION_MODELS[section]:
+        for name in model.model_fields:
+            names.update({name, unit_stem(name)})
+    return frozenset(names)
+
+
+SELECTABLE: Dict[str, FrozenSet[str]] = {
+    section: _selectable(section) for section in SECTION_MODELS
+}
+
+
+def parse_fields(fields: str | None) -> FieldSelection:
+    """
+    Function. Canonical sparse fieldset of a fields selector such as
+    "current.temp,forecasthour.temp,forecasthour.condition". A section
+    alone selects all of it, a unit-neutral name both unit fields.
+    :param fields: comma separated selectors, None or empty for all
+    :return: field selection
+    :raises ValueError: empty selector, unknown section or field
+    """
+    if not fields:
+        return ()
+    selectors: Set[str] = set()
+    unknown: List[str] = []
+    for selector in fields.split(","):
+        selector = selector.strip()
+        section, dot, name = selector.partition(".")
+        if not section or (dot and not name):
+            raise ValueError(f"Empty field selector in {fields!r}.")
+        if section not in SELECTABLE or (name and name not in SELECTABLE[section]):
+            unknown.append(selector)
+        else:
+            selectors.add(selector)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    # A whole section covers its fields.
+    return tuple(
+        sorted(
+            selector
+            for selector in selectors
+            if selector.partition(".")[0] not in selectors or "." not in selector
+        )
+    )
+
+
+def select_section(
+    section: SectionPlan,
+    names: FrozenSet[str] | None,
+    keep: FrozenSet[str] = frozenset(),
+) -> SectionPlan:
+    """
+    Function. Section plan narrowed to selected fields.
+    :param section: section plan
+    :param names: selected names, None for all
+    :param keep: fields kept regardless of the selection
+    :return: section plan
+    """
+    if names is None:
+        return section
+    return tuple(
+        name
+        for name in section
+        if name in keep or name in names or unit_stem(name) in names
+    )
+
+
+def compile_section(
+    public: Type[BaseModel], source: Type[BaseModel], exclude: frozenset = frozenset()
+) -> SectionPlan:
+    """
+    Function. Plan of a response section: the fields of the public model,
+    in its order, that the units model provides and settings keep.
+    :param public: response model of the section
+    :param source: units model of the section
+    :param exclude: fields excluded by display settings
+    :return: section plan
+    """
+    return tuple(
+        name
+        for name in public.model_fields
+        if name in source.model_fields and name not in exclude
+    )
+
+
+class ProjectionPlan(NamedTuple):
+    """
+    Class. Compiled shape of a forecast response for one combination of
+    units, display settings and sparse fieldset. A section plan of None
+    leaves the section out of the response.
+    Attributes:
+        location (SectionPlan | None): location fields.
+        current (SectionPlan | None): current weather fields.
+        day (SectionPlan | None): daily weather fields, None without
+            forecast days, empty for days without the day section.
+        astro (SectionPlan | None): astro fields, None if hidden.
+        hour (SectionPlan | None): hourly weather fields.
+        alerts (bool): whether alerts are shown.
+    """
+
+    location: SectionPlan | None
+    current: SectionPlan | None
+    day: SectionPlan | None
+    astro: SectionPlan | None
+    hour: SectionPlan | None
+    alerts: bool = True
+
+    def shape(
+        self,
+        forecast: Dict[str, Any],
+        days: int,
+        first_hour: int,
+        hours: int,
+    ) -> Dict[str, Any]:
+        """
+        Function. Shape a cached forecast.
+        :param forecast: canonical forecast document, never mutated
+        :param days: forecast days
+        :param first_hour: first hour of the hourly window, counted from
+        the first forecast day
+        :param hours: hours in the hourly window
+        :return: ForecastPublic shaped data
+        """
+        forecast_days: List[Dict[str, Any]] = forecast["forecast"]["forecastday"][:days]
+        shaped: Dict[str, Any] = {}
+        if self.location is not None:
+            shaped["location"] = project(self.location, forecast["location"])
+        if self.current is not None:
+            shaped["current"] = project(self.current, forecast["current"])
+
+        shaped_forecast: Dict[str, Any] = {}
+        if self.day is not None:
+            shaped_days: List[Dict[str, Any]] = []
+            for forecast_day in forecast_days:
+                shaped_day: Dict[str, Any] = {"date": forecast_day["date"]}
+                if self.day:
+                    shaped_day["day"] = project(self.day, forecast_day["day"])
+                if self.astro is not None:
+                    shaped_day["astro"] = project(self.astro, forecast_day["astro"])
+                shaped_days.append(shaped_day)
+            shaped_forecast["forecastday"] = shaped_days
+
+        if self.hour is not None:
+            window: List[Dict[str, Any]] = []
+            skip: int = first_hour
+            for forecast_day in forecast_days:
+                day_hours: List[Dict[str, Any]] = forecast_day["hour"]
+                if skip >= len(day_hours):
+                    skip -= len(day_hours)
+                    continue
+                window.extend(day_hours[skip : skip + hours - len(window)])
+                skip = 0
+                if len(window) >= hours:
+                    break
+            shaped_forecast["forecasthour"] = [
+                project(self.hour, hour) for hour in window
+            ]
+
+        if shaped_forecast:
+            shaped["forecast"] = shaped_forecast
+        if self.alerts:
+            shaped["alerts"] = forecast["alerts"]
+        return shaped
+
+
+def _settings_key(display_settings: BaseModel | None) -> Tuple[Any, ...] | None:
+    if display_settings is None:
+        return None
+    return tuple(display_settings.model_dump().items())
+
+
+def _narrow(plan: ProjectionPlan, fields: FieldSelection) -> ProjectionPlan:
+    if not fields:
+        return plan
+    selection: Dict[str, Set[str] | None] = {}
+    for selector in fields:
+        section, _, name = selector.partition(".")
+        if not name:
+            selection[section] = None
+        else:
+            selection.setdefault(section, set()).add(name)
+    names: Dict[str, FrozenSet[str] | None] = {
+        section: None if selected is None else frozenset(selected)
+        for section, selected in selection.items()
+    }
+
+    day: SectionPlan | None = None
+    astro: SectionPlan | None = None
+    if "forecastday" in names:
+        day_names: FrozenSet[str] | None = names["forecastday"]
+        day = select_section(plan.day, day_names)
+        astro = plan.astro
+        if astro is not None and day_names is not None and "astro" not in day_names:
+            astro = select_section(astro, day_names) or None
+
+    return ProjectionPlan(
+        location=(
+            select_section(plan.location, names["location"])
+            if "location" in names
+            else None
+        ),
+        current=(
+            select_section(plan.current, names["current"])
+            if "current" in names
+            else None
+        ),
+        day=day,
+        astro=astro,
+        # Hours are always told apart by their time.
+        hour=(
+            select_section(plan.hour, names["forecasthour"], frozenset({"time"}))
+            if "forecasthour" in names
+            else None
+        ),
+        alerts="alerts" in names,
+    )
+
+
+@lru_cache(maxsize=256)
+def _compile_plan(
+    units: str,
+    current_key: Tuple[Any, ...] | None,
+    daily_key: Tuple[Any, ...] | None,
+    hourly_key: Tuple[Any, ...] | None,
+    fields: FieldSelection = (),
+) -> ProjectionPlan:
+    current_settings = CurrentSettings(**dict(current_key)) if current_key else None
+    daily_settings = DailySettings(**dict(daily_key)) if daily_key else None
+    hourly_settings = HourlySettings(**dict(hourly_key)) if hourly_key else None
+    metric: bool = units == "C"
+    daily_exclude: frozenset = frozenset(exclude_fields(daily=daily_settings))
+
+    return _narrow(
+        ProjectionPlan(
+            location=compile_section(Location, Location),
+            current=compile_section(
+                CurrentWeatherPublic,
+                CurrentWeatherMetric if metric else CurrentWeatherBritish,
+                frozenset(exclude_fields(current=current_settings)),
+            ),
+            day=compile_section(
+                DailyWeatherPublic,
+                DailyWeatherMetric if metric else DailyWeatherBritish,
+                daily_exclude,
+            ),
+            astro=(None if "astro" in daily_exclude else compile_section(Astro, Astro)),
+            hour=compile_section(
+                HourlyForecastPublic,
+                HourlyWeatherMetric if metric else HourlyWeatherBritish,
+                frozenset(exclude_fields(hourly=hourly_settings)),
+            ),
+        ),
+        fields,
+    )
+
+
+def projection_plan(
+    units: str,
+    current_settings: CurrentSettings | None,
+    daily_settings: DailySettings | None,
+    hourly_settings: HourlySettings | None,
+    fields: FieldSelection = (),
+) -> ProjectionPlan:
+    """
+    Function. Projection plan of units, display settings and a sparse
+    fieldset, compiled on first use and memoized.
+    :param units: "C" for metric, British otherwise
+    :param current_settings: current weather user settings
+    :param daily_settings: daily weather user settings
+    :param hourly_settings: hourly weather user settings
+    :param fields: field selection of parse_fields, empty for all
+    :return: projection plan
+    """
+    return _compile_plan(
+        units,
+        _settings_key(current_settings),
+        _settings_key(daily_settings),
+        _settings_key(hourly_settings),
+        fields,
+    )
@@ -2,15 +2,21 @@
 Module. Get data from DB and API and prepare it to be passed to the router.
 """
 
-import json
 from datetime import datetime
 from typing import Any, List, Dict
 
-import redis
-from redis import Redis
+from fastapi import HTTPException, Response
+from pydantic_core import to_json
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import redis_client
-from app.celery_tasks.tasks import location_by_name, get_forecast
+from app.api_v1.crud import find_gazetteer_locations, save_gazetteer_locations
+from app.api_v1.forecast_query import ForecastQuery, etag_matches
+from app.api_v1.projection import FieldSelection, ProjectionPlan, projection_plan
+from app.cache.forecast_cache import forecast_cache, CachedForecast
+from app.cache.search_cache import search_cache
+from app.cache.shaped_cache import shaped_forecast_cache
+from app.logger.logging_handler import database_logger
 from app.schemas.setting_schemas import (
     LocationPublic,
     CurrentSettings,
@@ -18,160 +24,296 @@ from app.schemas.setting_schemas import (
     HourlySettings,
     UserSettings,
 )
-from app.schemas.weather_schemas import (
-    HourlyWeatherBritish,
-    HourlyWeatherMetric,
-    exclude_fields,
-    DailyWeatherBritish,
-    DailyWeatherMetric,
-    DailyWeather,
-    CurrentWeatherMetric,
-    CurrentWeatherBritish,
-    Location,
-    CurrentWeatherPublic,
-    DailyWeatherPublic,
-    Astro,
-    DailyForecastPublic,
-    HourlyForecastPublic,
-    Conditions,
-)
+from app.schemas.weather_schemas import ForecastError
 from app.utils import settings
+from app.utils.retry import UpstreamError, upstream_status_code
 
 
-def get_locations(location_name: str) -> List[LocationPublic]:
+async def get_locations(
+    location_name: str, session: AsyncSession
+) -> List[LocationPublic]:
     """
     Function. Get a list of locations by name based on user request.
+    Cached searches are answered without a Celery round trip, the rest
+    from the gazetteer when possible and only then by the weather API.
+    A failing gazetteer never fails the search, it is skipped.
     :param location_name: Name of location.
+    :param session: SQLAlchemy session.
     :return: List of locations found.
     """
-    result: Any = location_by_name.apply_async(args=[location_name])
 
-    return [LocationPublic(**location) for location in result.get()]
+    async def search(query: str) -> List[Dict[str, Any]]:
+        # The database error handler returns the error instead of raising it.
+        known_locations: List[Dict[str, Any]] | Exception | None
+        try:
+            known_locations = await find_gazetteer_locations(
+                session=session, query=query
+            )
+        except SQLAlchemyError as exc:
+            database_logger.error(msg="Gazetteer lookup failed", exc_info=exc)
+            await session.rollback()
+            known_locations = None
+        if known_locations is not None and not isinstance(known_locations, Exception):
+            return known_locations
+
+        found_locations: List[Dict[str, Any]] = await search_cache.search_upstream(
+            query
+        )
+        try:
+            await save_gazetteer_locations(
+                session=session, query=query, locations=found_locations
+            )
+        except SQLAlchemyError as exc:
+            database_logger.error(msg="Gazetteer update failed", exc_info=exc)
+            await session.rollback()
+        return found_locations
 
+    locations: List[Dict[str, Any]] = await search_cache.get(location_name, search)
 
-def get_location_weather(
+    return [LocationPublic(**location) for location in locations]
+
+
+async def get_location_weather(
     location_id: int,
     current_settings: CurrentSettings,
     daily_settings: DailySettings,
     hourly_settings: HourlySettings,
     user_settings: UserSettings,
-) -> Dict[str, Any] | None:
+    fields: FieldSelection = (),
+) -> Response:
     """
     Function. Fetch weather data for a given location based on user settings.
+    Responses are encoded once per shaping key and served as bytes afterwards.
+    The Age header tells how old the data is - a forecast may be served stale
+    while it is refreshed.
     :param user_settings: User settings.
     :param hourly_settings: Hourly user settings
     :param daily_settings: daily user settings
     :param location_id: location id
     :param current_settings: current weather user settings
-    :return: current weather data
+    :param fields: sparse fieldset, empty for all fields
+    :return: encoded forecast response
     """
 
-    if redis_client.get(str(location_id)):
-        location_weather: Dict[str, Any] = json.loads(
-            redis_client.get(str(location_id))
-        )
-    else:
-        weather_forecast = get_forecast.apply_async(
-            args=(location_id, user_settings.daily)
-        )
-        location_weather = weather_forecast.get()
-        redis_client.set(str(location_id), json.dumps(location_weather))
-
-        current_datetime = datetime.now()
-        time_upper_bound: int = 30 if current_datetime.minute < 30 else 60
-        expiration_time: int = (time_upper_bound - current_datetime.minute) * 60
-        redis_client.expire(str(location_id), expiration_time)
+    # The payload is shared between coalesced requests - never mutate it.
+    cached: CachedForecast = await forecast_cache.get(location_id, user_settings.daily)
+    body: bytes = shape_cached_weather(
+        location_id,
+        cached,
+        projection_plan(
+            user_settings.units,
+            current_settings,
+            daily_settings,
+            hourly_settings,
+            fields,
+        ),
+        current_settings,
+        daily_settings,
+        hourly_settings,
+        user_settings,
+        fields,
+    )
 
-    location_weather_response: dict[str, Location | CurrentWeatherPublic | Dict] = {}
-    location_weather_response.update(location=Location(**location_weather["location"]))
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Age": str(cached.age)},
+    )
 
-    # Current weather filtering based on user settings.
 
-    location_weather["current"]["condition"] = Conditions(
-        **location_weather["current"]["condition"]
+async def get_cacheable_location_weather(
+    location_id: int,
+    query: ForecastQuery,
+    if_none_match: str | None,
+    shared: bool,
+) -> Response:
+    """
+    Function. Fetch weather data for a given location for the GET route.
+    The strong ETag is known before shaping, so a revalidation of an
+    unchanged forecast is answered 304 without shaping or encoding it.
+    Cache-Control max-age is the time left until the forecast goes stale,
+    and both answers vary on Authorization.
+    :param location_id: location id
+    :param query: forecast settings
+    :param if_none_match: If-None-Match header value
+    :param shared: whether shared caches may store the response
+    :return: encoded forecast response or 304 response
+    """
+    cached: CachedForecast = await forecast_cache.get(
+        location_id, query.user_settings.daily
     )
-    current_weather_filter: Dict[str, Any] = (
-        CurrentWeatherMetric(**location_weather["current"]).model_dump(
-            exclude=exclude_fields(current=current_settings)
-        )
-        if user_settings.units == "C"
-        else CurrentWeatherBritish(**location_weather["current"]).model_dump(
-            exclude=exclude_fields(current=current_settings)
-        )
+    local_time: datetime = datetime.strptime(
+        cached.forecast["location"]["localtime"], "%Y-%m-%d %H:%M"
     )
+    etag: str = query.etag(cached.updated_at, local_time.hour)
+    headers: Dict[str, str] = {
+        "ETag": etag,
+        "Cache-Control": (
+            f"{'public' if shared else 'private'}, max-age={cached.max_age}"
+        ),
+        "Age": str(cached.age),
+        # Public or private depends on the credentials sent.
+        "Vary": "Authorization",
+    }
+    if etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
 
-    location_weather_response.update(
-        current=CurrentWeatherPublic.model_validate(current_weather_filter)
+    body: bytes = shape_cached_weather(
+        location_id,
+        cached,
+        projection_plan(
+            query.user_settings.units,
+            query.current,
+            query.daily,
+            query.hourly,
+            query.fields,
+        ),
+        query.current,
+        query.daily,
+        query.hourly,
+        query.user_settings,
+        query.fields,
     )
 
-    # Daily weather filtering based on user settings.
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    sample_forecast_day = []
-    forecast_hour_list: list = []
-    local_time: datetime = datetime.strptime(
-        location_weather["location"]["localtime"], "%Y-%m-%d %H:%M"
-    )
 
-    for day in range(user_settings.daily):
-        location_weather["forecast"]["forecastday"][day]["day"]["condition"] = (
-            Conditions(
-                **location_weather["forecast"]["forecastday"][day]["day"]["condition"]
-            )
+async def get_locations_weather(
+    location_ids: List[int],
+    current_settings: CurrentSettings,
+    daily_settings: DailySettings,
+    hourly_settings: HourlySettings,
+    user_settings: UserSettings,
+    fields: FieldSelection = (),
+) -> Response:
+    """
+    Function. Fetch weather data for many locations with one settings block.
+    Cached forecasts are read in one round trip and misses fetched
+    concurrently. A location that fails is answered with a ForecastError
+    entry; only when every location fails is the request answered with
+    the first error. The Age header tells the age of the oldest forecast.
+    :param location_ids: location ids, duplicates are answered once
+    :param current_settings: current weather user settings
+    :param daily_settings: daily user settings
+    :param hourly_settings: Hourly user settings
+    :param user_settings: User settings.
+    :param fields: sparse fieldset, empty for all fields
+    :return: encoded list of forecasts and errors in request order
+    """
+    cached_forecasts: Dict[int, CachedForecast | Exception] = (
+        await forecast_cache.get_many(
+            list(dict.fromkeys(location_ids)), user_settings.daily
         )
+    )
+    ages: List[int] = [
+        cached.age
+        for cached in cached_forecasts.values()
+        if isinstance(cached, CachedForecast)
+    ]
+    if not ages:
+        raise next(iter(cached_forecasts.values()))
 
-        daily_weather_filter: Dict[str, Any] = (
-            DailyWeatherMetric(
-                **location_weather["forecast"]["forecastday"][day]["day"]
-            ).model_dump(exclude=exclude_fields(daily=daily_settings))
-            if user_settings.units == "C"
-            else DailyWeatherBritish(
-                **location_weather["forecast"]["forecastday"][day]["day"]
-            ).model_dump(exclude=exclude_fields(daily=daily_settings))
+    plan: ProjectionPlan = projection_plan(
+        user_settings.units, current_settings, daily_settings, hourly_settings, fields
+    )
+    body: bytes = (
+        b"["
+        + b",".join(
+            (
+                shape_cached_weather(
+                    location_id,
+                    cached,
+                    plan,
+                    current_settings,
+                    daily_settings,
+                    hourly_settings,
+                    user_settings,
+                    fields,
+                )
+                if isinstance(cached, CachedForecast)
+                else to_json(forecast_error(location_id, cached))
+            )
+            for location_id, cached in cached_forecasts.items()
         )
+        + b"]"
+    )
 
-        day_weather: DailyWeather = DailyWeather(
-            date=location_weather["forecast"]["forecastday"][day]["date"],
-            day=DailyWeatherPublic.model_validate(daily_weather_filter),
-            astro=Astro.model_validate(
-                location_weather["forecast"]["forecastday"][day]["astro"]
-            ),
-        )
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Age": str(max(ages))},
+    )
 
-        sample_forecast_day.append(
-            DailyForecastPublic.model_validate(
-                day_weather.model_dump(exclude=exclude_fields(daily=daily_settings))
-            )
-        )
 
-        forecast_hour_list.extend(
-            location_weather["forecast"]["forecastday"][day]["hour"]
-        )
+def forecast_error(location_id: int, exc: Exception) -> Dict[str, Any]:
+    """
+    Function. Batch entry of a location whose forecast failed, with the
+    status the location alone would have been answered with.
+    :param location_id: location id
+    :param exc: load error
+    :return: ForecastError data
+    """
+    if isinstance(exc, HTTPException):
+        status_code, detail = exc.status_code, str(exc.detail)
+    elif isinstance(exc, UpstreamError):
+        status_code = upstream_status_code(exc)
+        detail = "Weather service is unavailable."
+    else:
+        status_code, detail = 500, "Forecast could not be loaded."
+    return ForecastError(
+        id=location_id, status_code=status_code, detail=detail
+    ).model_dump()
 
-    location_weather_response.update(forecast={})
-    location_weather_response["forecast"].update(forecastday=sample_forecast_day)
 
-    # Hourly weather filtering based on user settings.
+def shape_cached_weather(
+    location_id: int,
+    cached: CachedForecast,
+    plan: ProjectionPlan,
+    current_settings: CurrentSettings,
+    daily_settings: DailySettings,
+    hourly_settings: HourlySettings,
+    user_settings: UserSettings,
+    fields: FieldSelection = (),
+) -> bytes:
+    """
+    Function. Encoded forecast response of a cached forecast, shaped once
+    per shaping key.
+    :param location_id: location id
+    :param cached: cached forecast
+    :param plan: projection plan of units and display settings
+    :param current_settings: current weather user settings
+    :param daily_settings: daily user settings
+    :param hourly_settings: Hourly user settings
+    :param user_settings: User settings.
+    :param fields: sparse fieldset the plan was compiled with
+    :return: encoded ForecastPublic
+    """
+    local_time: datetime = datetime.strptime(
+        cached.forecast["location"]["localtime"], "%Y-%m-%d %H:%M"
+    )
 
-    location_weather_response["forecast"].update(forecasthour=[])
+    shaped_key = shaped_forecast_cache.key(
+        location_id,
+        cached,
+        local_time.hour,
+        user_settings,
+        current_settings,
+        daily_settings,
+        hourly_settings,
+        fields,
+    )
+    body: bytes | None = shaped_forecast_cache.get(shaped_key)
 
-    for hour in forecast_hour_list[
-        local_time.hour : local_time.hour + user_settings.daily
-    ]:
-        hour["condition"] = Conditions(**hour["condition"])
-        hour_weather_filter: Dict[str, Any] = (
-            HourlyWeatherMetric(**hour).model_dump(
-                exclude=exclude_fields(hourly=hourly_settings)
+    if body is None:
+        # The hourly window spans as many hours as forecast days are shown.
+        body = to_json(
+            plan.shape(
+                cached.forecast,
+                user_settings.daily,
+                local_time.hour,
+                user_settings.daily,
             )
-            if user_settings.units == "C"
-            else HourlyWeatherBritish(**hour).model_dump(
-                exclude=exclude_fields(hourly=hourly_settings)
-            )
-        )
-
-        location_weather_response["forecast"]["forecasthour"].append(
-            HourlyForecastPublic.model_validate(hour_weather_filter)
         )
+        shaped_forecast_cache.set(shaped_key, body)
 
-    location_weather_response.update(alerts=location_weather["alerts"])
-
-    return location_weather_response
+    return body
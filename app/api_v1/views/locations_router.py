@@ -2,11 +2,12 @@
 Module. Location API routes.
 """
 
-from typing import Any, List
+from typing import Annotated, List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Body, Depends, Header, Response
 from fastapi.security import HTTPBasic
 from fastapi_limiter.depends import RateLimiter
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.setting_schemas import (
     UserSettings,
@@ -15,9 +16,17 @@ from app.schemas.setting_schemas import (
     DailySettings,
     LocationPublic,
 )
-from app.schemas.weather_schemas import ForecastPublic
-from .location_controller import get_locations, get_location_weather
+from app.schemas.weather_schemas import ForecastError, ForecastPublic
+from app.api_v1.forecast_query import ForecastQuery, field_selection, forecast_query
+from app.api_v1.projection import FieldSelection
+from .location_controller import (
+    get_locations,
+    get_cacheable_location_weather,
+    get_location_weather,
+    get_locations_weather,
+)
 from ... import settings
+from ...utils import db_engine
 from ...utils.auth import user_auth
 
 location_router = APIRouter(prefix="/api_v1")
@@ -37,13 +46,17 @@ security: HTTPBasic = HTTPBasic(auto_error=False)
     ],
     response_model=List[LocationPublic],
 )
-def get_location_by_name(location_name: str) -> list[LocationPublic] | None:
+async def get_location_by_name(
+    location_name: str,
+    session: AsyncSession = Depends(db_engine.session_dependency),
+) -> list[LocationPublic] | None:
     """
     Function to get location by name.
     :param location_name: Location name string.
+    :param session: a Database session
     :return: List of locations found.
     """
-    locations_found: List[LocationPublic] = get_locations(location_name)
+    locations_found: List[LocationPublic] = await get_locations(location_name, session)
 
     return locations_found
 
@@ -63,13 +76,14 @@ def get_location_by_name(location_name: str) -> list[LocationPublic] | None:
     response_model=ForecastPublic,
     response_model_exclude_none=True,
 )
-def get_forecast_by_id(
+async def get_forecast_by_id(
     location_id: int,
     user_settings: UserSettings | None = None,
     current: CurrentSettings | None = None,
     hourly: HourlySettings | None = None,
     daily: DailySettings | None = None,
-) -> dict[str, Any] | None:
+    fields: FieldSelection = Depends(field_selection),
+) -> Response:
     """
     Function to get forecast by ID.
     :param location_id: location ID.
@@ -77,15 +91,108 @@ def get_forecast_by_id(
     :param current: current weather user settings.
     :param hourly: hourly weather user settings.
     :param daily: daily weather user settings.
-    :return: forecast info
+    :param fields: sparse fieldset.
+    :return: encoded forecast info
     """
 
-    forecast_info = get_location_weather(
+    forecast_info: Response = await get_location_weather(
         location_id,
         current,
         daily,
         hourly,
         user_settings,
+        fields,
     )
 
     return forecast_info
+
+
+@location_router.get(
+    "/id/{location_id}/",
+    summary="Get cacheable forecast by ID.",
+    dependencies=[
+        Depends(user_auth),
+        Depends(
+            RateLimiter(
+                times=settings.limiter.REQUEST_LIMIT,
+                seconds=settings.limiter.DURATION_LIMIT_SEC,
+            )
+        ),
+    ],
+    response_model=ForecastPublic,
+    response_model_exclude_none=True,
+)
+async def get_cacheable_forecast_by_id(
+    location_id: int,
+    query: Annotated[ForecastQuery, Depends(forecast_query)],
+    if_none_match: Annotated[str | None, Header()] = None,
+    authorization: Annotated[str | None, Header()] = None,
+) -> Response:
+    """
+    Function to get forecast by ID with settings in the query string.
+    :param location_id: location ID.
+    :param query: forecast settings.
+    :param if_none_match: If-None-Match header.
+    :param authorization: Authorization header, None for anonymous requests.
+    :return: encoded forecast info or 304 response
+    """
+
+    # AuthResponseMiddleware answers any Authorization header with a
+    # refreshed token - keep those responses private.
+    forecast_info: Response = await get_cacheable_location_weather(
+        location_id,
+        query,
+        if_none_match,
+        shared=authorization is None,
+    )
+
+    return forecast_info
+
+
+@location_router.post(
+    "/ids/",
+    summary="Get forecasts of many locations by ID.",
+    dependencies=[
+        Depends(user_auth),
+        Depends(
+            RateLimiter(
+                times=settings.limiter.REQUEST_LIMIT,
+                seconds=settings.limiter.DURATION_LIMIT_SEC,
+            )
+        ),
+    ],
+    response_model=List[ForecastPublic | ForecastError],
+    response_model_exclude_none=True,
+)
+async def get_forecasts_by_ids(
+    location_ids: Annotated[
+        List[int],
+        Body(min_length=1, max_length=settings.forecast_cache.BATCH_MAX_IDS),
+    ],
+    user_settings: UserSettings | None = None,
+    current: CurrentSettings | None = None,
+    hourly: HourlySettings | None = None,
+    daily: DailySettings | None = None,
+    fields: FieldSelection = Depends(field_selection),
+) -> Response:
+    """
+    Function to get forecasts of many locations by ID with one settings block.
+    :param location_ids: location IDs.
+    :param user_settings: user settings.
+    :param current: current weather user settings.
+    :param hourly: hourly weather user settings.
+    :param daily: daily weather user settings.
+    :param fields: sparse fieldset.
+    :return: encoded list of forecasts in request order
+    """
+
+    forecasts_info: Response = await get_locations_weather(
+        location_ids,
+        current,
+        daily,
+        hourly,
+        user_settings,
+        fields,
+    )
+
+    return forecasts_info
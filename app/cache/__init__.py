@@ -0,0 +1,24 @@
+__all__ = (
+    "CacheCodec",
+    "get_codec",
+    "LocalCache",
+    "SingleFlight",
+    "TtlPolicy",
+    "ttl_policy",
+    "CachedForecast",
+    "ForecastCache",
+    "forecast_cache",
+    "ShapedForecastCache",
+    "shaped_forecast_cache",
+    "SearchCache",
+    "search_cache",
+    "normalize_query",
+)
+
+from .codec import CacheCodec, get_codec
+from .local_cache import LocalCache
+from .single_flight import SingleFlight
+from .ttl_policy import TtlPolicy, ttl_policy
+from .forecast_cache import CachedForecast, ForecastCache, forecast_cache
+from .shaped_cache import ShapedForecastCache, shaped_forecast_cache
+from .search_cache import SearchCache, search_cache, normalize_query
@@ -0,0 +1,184 @@
+"""
+Module. Versioned binary codecs for cached values.
+
+Encoded value layout: one format version byte followed by the compressed
+serialized value. Values written before codecs existed are plain JSON and
+are recognised by their leading "{".
+"""
+
+import json
+import zlib
+from typing import Any, Callable, Dict
+
+from app.logger.logging_handler import info_logger
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+LEGACY_JSON_PREFIX: bytes = b"{"
+
+
+class CacheCodec:
+    """
+    Class. Serializer and compressor pair tagged with a format version byte.
+    Attributes:
+        name (str): codec name used in settings.
+        version (int): format version byte, never reuse a retired one.
+        dumps (Callable): value to bytes serializer.
+        loads (Callable): bytes to value deserializer.
+        compress (Callable): bytes compressor.
+        decompress (Callable): bytes decompressor.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        version: int,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+        compress: Callable[[bytes], bytes],
+        decompress: Callable[[bytes], bytes],
+    ):
+        self.name = name
+        self.version = version
+        self.dumps = dumps
+        self.loads = loads
+        self.compress = compress
+        self.decompress = decompress
+
+    def encode(self, value: Any) -> bytes:
+        """
+        Function. Serialize, compress and tag value.
+        :param value: value to encode
+        :return: encoded bytes
+        """
+        return bytes((self.version,)) + self.compress(self.dumps(value))
+
+    def decode(self, data: bytes) -> Any:
+        """
+        Function. Decode bytes produced by this codec.
+        :param data: encoded bytes
+        :return: value
+        """
+        return self.loads(self.decompress(data[1:]))
+
+
+CODECS: Dict[int, CacheCodec] = {}
+
+
+def register_codec(codec: CacheCodec) -> None:
+    """
+    Function. Make codec available for writing and reading.
+    :param codec: cache codec
+    :return: None
+    """
+    if codec.version in CODECS or codec.version == LEGACY_JSON_PREFIX[0]:
+        raise ValueError(f"Cache format version {codec.version} is taken.")
+    CODECS[codec.version] = codec
+
+
+def get_codec(name: str, fallback: str | None = None) -> CacheCodec:
+    """
+    Function. Get registered codec by name.
+    :param name: codec name
+    :param fallback: codec name used when name is not registered, e.g.
+        because its package is not installed
+    :return: cache codec
+    :raises ValueError: neither codec is registered
+    """
+    for codec in CODECS.values():
+        if codec.name == name:
+            return codec
+    if fallback is not None:
+        info_logger.warning(
+            f"Cache codec {name!r} is not available, using {fallback!r}."
+        )
+        return get_codec(fallback)
+    raise ValueError(
+        f"Cache codec {name!r} is not available, "
+        f"choose one of {[codec.name for codec in CODECS.values()]}."
+    )
+
+
+def decode(data: bytes) -> Any:
+    """
+    Function. Decode a cached value written by any registered codec
+    or by the legacy plain JSON writer.
+    :param data: encoded bytes
+    :return: value
+    :raises ValueError: unknown format version or corrupted value
+    """
+    if data[:1] == LEGACY_JSON_PREFIX:
+        return json.loads(data)
+
+    codec: CacheCodec | None = CODECS.get(data[0])
+    if codec is None:
+        raise ValueError(f"Unknown cache format version {data[0]}.")
+    try:
+        return codec.decode(data)
+    except Exception as exc:
+        raise ValueError(f"Corrupted {codec.name!r} cache value.") from exc
+
+
+def _zlib_compress(data: bytes) -> bytes:
+    return zlib.compress(data, 6)
+
+
+register_codec(
+    CacheCodec(
+        "json-zlib",
+        1,
+        dumps=lambda value: json.dumps(value, separators=(",", ":")).encode(),
+        loads=json.loads,
+        compress=_zlib_compress,
+        decompress=zlib.decompress,
+    )
+)
+
+if orjson is not None:
+    register_codec(
+        CacheCodec(
+            "orjson-zlib",
+            2,
+            dumps=orjson.dumps,
+            loads=orjson.loads,
+            compress=_zlib_compress,
+            decompress=zlib.decompress,
+        )
+    )
+
+if msgpack is not None:
+    register_codec(
+        CacheCodec(
+            "msgpack-zlib",
+            3,
+            dumps=msgpack.packb,
+            loads=lambda data: msgpack.unpackb(data, raw=False),
+            compress=_zlib_compress,
+            decompress=zlib.decompress,
+        )
+    )
+
+if msgpack is not None and lz4_frame is not None:
+    register_codec(
+        CacheCodec(
+            "msgpack-lz4",
+            4,
+            dumps=msgpack.packb,
+            loads=lambda data: msgpack.unpackb(data, raw=False),
+            compress=lz4_frame.compress,
+            decompress=lz4_frame.decompress,
+        )
+    )
@@ -0,0 +1,402 @@
+"""
+Module. Two-tier forecast cache: in-process LRU in front of Redis,
+with coalesced upstream loading and stale-while-revalidate serving.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, NamedTuple, Set
+from uuid import uuid4
+
+from prometheus_client import Counter
+from redis.asyncio import Redis as AsyncRedis
+
+from app.celery_tasks.result_consumer import result_consumer
+from app.celery_tasks.tasks import get_forecast
+from app.logger.logging_handler import info_logger
+from app.utils.quota import QuotaState
+from app.utils.redis_engine import PubSubListener, redis_async_client, pubsub_listener
+from app.utils.settings import settings
+from .codec import CacheCodec, decode, get_codec
+from .local_cache import LocalCache
+from .single_flight import SingleFlight
+from .ttl_policy import TtlPolicy, ttl_policy
+
+stale_if_error_served: Counter = Counter(
+    "forecast_cache_stale_if_error_total",
+    "Expired forecasts served because loading a fresh one failed.",
+)
+low_quota_served: Counter = Counter(
+    "forecast_cache_low_quota_total",
+    "Stale forecasts served without refreshing because the upstream quota is low.",
+)
+
+
+class CachedForecast(NamedTuple):
+    """
+    Class. Cached forecast with its freshness bounds.
+    Attributes:
+        forecast (Dict[str, Any]): canonical forecast document.
+        fetched_at (float): epoch seconds the payload was fetched.
+        stale_at (float): epoch seconds the payload becomes stale.
+        days (int): forecast days requested upstream, 0 if unknown.
+    """
+
+    forecast: Dict[str, Any]
+    fetched_at: float
+    stale_at: float
+    days: int = 0
+
+    def covers(self, days: int) -> bool:
+        """
+        Function. Whether the payload was fetched for at least days.
+        :param days: days of forecast
+        :return: coverage flag
+        """
+        return self.days >= days
+
+    @property
+    def updated_at(self) -> int:
+        """
+        Function. Epoch seconds upstream last updated the weather, the fetch
+        time if upstream left it out.
+        :return: update time in epoch seconds
+        """
+        return self.forecast["current"].get("last_updated_epoch") or int(
+            self.fetched_at
+        )
+
+    @property
+    def max_age(self) -> int:
+        """
+        Function. Seconds until the payload becomes stale.
+        :return: remaining fresh time in seconds
+        """
+        return max(0, int(self.stale_at - time.time()))
+
+    @property
+    def age(self) -> int:
+        """
+        Function. Seconds since the payload was fetched.
+        :return: age in seconds
+        """
+        return max(0, int(time.time() - self.fetched_at))
+
+    @property
+    def is_stale(self) -> bool:
+        """
+        Function. Whether the payload is past its soft expiry.
+        :return: stale flag
+        """
+        return time.time() >= self.stale_at
+
+
+class ForecastCache:
+    """
+    Class. Forecast cache keyed by location id.
+    Parsed forecasts are kept in a process-local LRU. Every write is announced
+    on the invalidation channel so other workers drop their local copy.
+    Entries become stale when the TTL policy says so but are kept for
+    a grace period: a stale entry is served at once while a single
+    background refresh replaces it. Past the grace period an entry is only
+    served when loading a fresh one fails, e.g. the upstream circuit is open.
+    Every load fetches at least max_days, so any shorter request is served
+    from the same entry; only a longer one refetches.
+    While the upstream quota is low, stale entries are neither refreshed
+    nor expired: the quota is kept for locations with nothing cached.
+    Attributes:
+        redis_connection (AsyncRedis): async redis connection.
+        listener (PubSubListener): shared pub/sub listener.
+        single_flight (SingleFlight): coalesces concurrent misses.
+        local_cache (LocalCache): in-process tier of parsed forecasts.
+        key_prefix (str): cache key prefix.
+        channel (str): invalidation channel.
+        stale_grace (int): seconds a stale entry may still be served.
+        stale_if_error (int): seconds a stale entry is kept for upstream failures.
+        codec (CacheCodec): codec of written entries, any known one is read.
+        max_days (int): forecast horizon fetched on every load.
+        ttl_policy (TtlPolicy): decides when written entries become stale.
+        quota (QuotaState): upstream quota level.
+    """
+
+    def __init__(
+        self,
+        redis_connection: AsyncRedis,
+        listener: PubSubListener,
+        single_flight: SingleFlight,
+        local_cache: LocalCache[int, CachedForecast],
+        key_prefix: str = settings.forecast_cache.KEY_PREFIX,
+        channel: str = settings.forecast_cache.INVALIDATION_CHANNEL,
+        stale_grace: int = settings.forecast_cache.STALE_GRACE_SEC,
+        stale_if_error: int = settings.forecast_cache.STALE_IF_ERROR_SEC,
+        codec: CacheCodec = get_codec(
+            settings.forecast_cache.CODEC, settings.forecast_cache.FALLBACK_CODEC
+        ),
+        max_days: int = settings.forecast_cache.MAX_DAYS,
+        ttl_policy: TtlPolicy = ttl_policy,
+        quota: QuotaState | None = None,
+    ):
+        self.redis_connection = redis_connection
+        self.listener = listener
+        self.single_flight = single_flight
+        self.local_cache = local_cache
+        self.key_prefix = key_prefix
+        self.channel = channel
+        self.stale_grace = stale_grace
+        self.stale_if_error = stale_if_error
+        self.codec = codec
+        self.max_days = max_days
+        self.ttl_policy = ttl_policy
+        self.quota = quota or QuotaState(redis_connection)
+        self._origin: str = uuid4().hex
+        self._refreshes: Set[asyncio.Task] = set()
+
+    def key(self, location_id: int) -> str:
+        """
+        Function. Cache key of location forecast.
+        :param location_id: location id
+        :return: cache key
+        """
+        return f"{self.key_prefix}:{location_id}"
+
+    def horizon(self, days: int) -> int:
+        """
+        Function. Days to fetch upstream for a request of days.
+        :param days: days of forecast
+        :return: fetched days
+        """
+        return max(days, self.max_days)
+
+    def flight_key(self, location_id: int, horizon: int) -> str:
+        """
+        Function. Coalescing key of a location forecast load.
+        :param location_id: location id
+        :param horizon: fetched days
+        :return: coalescing key
+        """
+        return f"{self.key(location_id)}:{horizon}"
+
+    async def subscribe_invalidations(self) -> None:
+        """
+        Function. Start dropping local entries refreshed by other workers.
+        :return: None
+        """
+        await self.listener.add_handler(self.channel, self._on_invalidation)
+
+    async def read(self, location_id: int) -> CachedForecast | None:
+        """
+        Function. Read cached forecast, local tier first.
+        :param location_id: location id
+        :return: cached forecast or None if missing
+        """
+        cached: CachedForecast | None = self.local_cache.get(location_id)
+        if cached is not None:
+            return cached
+
+        async with self.redis_connection.pipeline(transaction=False) as pipe:
+            pipe.get(self.key(location_id))
+            pipe.pttl(self.key(location_id))
+            cached_weather, ttl_ms = await pipe.execute()
+
+        return self._load_entry(location_id, cached_weather, ttl_ms)
+
+    async def read_many(
+        self, location_ids: List[int]
+    ) -> Dict[int, CachedForecast | None]:
+        """
+        Function. Read cached forecasts, local tier first, the rest in one
+        round trip.
+        :param location_ids: location ids
+        :return: cached forecast or None by location id
+        """
+        found: Dict[int, CachedForecast | None] = {
+            location_id: self.local_cache.get(location_id)
+            for location_id in location_ids
+        }
+        missing: List[int] = [
+            location_id for location_id, cached in found.items() if cached is None
+        ]
+        if not missing:
+            return found
+
+        keys: List[str] = [self.key(location_id) for location_id in missing]
+        async with self.redis_connection.pipeline(transaction=False) as pipe:
+            pipe.mget(keys)
+            for key in keys:
+                pipe.pttl(key)
+            cached_weathers, *ttls_ms = await pipe.execute()
+
+        for location_id, cached_weather, ttl_ms in zip(
+            missing, cached_weathers, ttls_ms
+        ):
+            found[location_id] = self._load_entry(location_id, cached_weather, ttl_ms)
+        return found
+
+    def _load_entry(
+        self, location_id: int, cached_weather: bytes | None, ttl_ms: int
+    ) -> CachedForecast | None:
+        if not cached_weather:
+            return None
+
+        try:
+            cached = CachedForecast(**decode(cached_weather))
+        except (ValueError, TypeError) as exc:
+            # Written by a newer release or in an old layout - refetch.
+            info_logger.error(f"Unreadable forecast cache entry: {exc!r}")
+            return None
+        self.local_cache.set(location_id, cached, ttl_ms / 1000 if ttl_ms > 0 else None)
+        return cached
+
+    async def write(
+        self,
+        location_id: int,
+        forecast: Dict[str, Any],
+        days: int,
+        not_before: float | None = None,
+    ) -> CachedForecast:
+        """
+        Function. Store forecast, stale when the TTL policy says and expired
+        after the grace period. Invalidates other workers' local copies.
+        :param location_id: location id
+        :param forecast: forecast payload
+        :param days: days of forecast requested upstream
+        :param not_before: epoch seconds the forecast must stay fresh until
+        :return: cached forecast
+        """
+        fetched_at: float = time.time()
+        cached = CachedForecast(
+            forecast,
+            fetched_at,
+            self.ttl_policy.stale_at(forecast, fetched_at, not_before),
+            days,
+        )
+        fresh_time: int = int(cached.stale_at - fetched_at)
+        await self.redis_connection.set(
+            self.key(location_id),
+            self.codec.encode(cached._asdict()),
+            ex=fresh_time + max(self.stale_grace, self.stale_if_error),
+        )
+        self.local_cache.set(location_id, cached, fresh_time + self.stale_grace)
+        await self.redis_connection.publish(
+            self.channel, f"{self._origin}:{location_id}"
+        )
+        return cached
+
+    async def get(self, location_id: int, days: int) -> CachedForecast:
+        """
+        Function. Get forecast covering days from cache, fetching it once on
+        a miss. A stale entry is returned as is and refreshed in the background.
+        The payload may hold more days than asked for, callers slice it.
+        :param location_id: location id
+        :param days: days of forecast
+        :return: cached forecast
+        """
+        return await self._serve(location_id, days, await self.read(location_id))
+
+    async def get_many(
+        self, location_ids: List[int], days: int
+    ) -> Dict[int, CachedForecast | Exception]:
+        """
+        Function. Get forecasts covering days for many locations. Cached
+        entries are read in one round trip, misses are fetched concurrently.
+        A location that fails is answered with its error, the others are
+        still served.
+        :param location_ids: location ids
+        :param days: days of forecast
+        :return: cached forecast or load error by location id
+        """
+        found: Dict[int, CachedForecast | None] = await self.read_many(location_ids)
+        forecasts: List[CachedForecast | BaseException] = await asyncio.gather(
+            *(
+                self._serve(location_id, days, cached)
+                for location_id, cached in found.items()
+            ),
+            return_exceptions=True,
+        )
+        for location_id, forecast in zip(found, forecasts):
+            if not isinstance(forecast, BaseException):
+                continue
+            if not isinstance(forecast, Exception):
+                raise forecast
+            info_logger.error(f"Batch forecast {location_id} failed: {forecast!r}")
+        return dict(zip(found, forecasts))
+
+    async def _serve(
+        self, location_id: int, days: int, cached: CachedForecast | None
+    ) -> CachedForecast:
+        if self._servable(cached, days):
+            if cached.is_stale and not await self.quota.is_low():
+                self._refresh_in_background(location_id, cached.days)
+            return cached
+
+        if cached is not None and cached.covers(days) and await self.quota.is_low():
+            low_quota_served.inc()
+            return cached
+
+        horizon: int = self.horizon(days)
+        try:
+            return await self.single_flight.do(
+                self.flight_key(location_id, horizon),
+                read=lambda: self._read_servable(location_id, days),
+                load=lambda: self._load(location_id, horizon),
+            )
+        except Exception as exc:
+            if cached is None:
+                raise
+            info_logger.error(
+                f"Serving stale forecast {location_id} after load failure: {exc!r}"
+            )
+            stale_if_error_served.inc()
+            return cached
+
+    def _servable(self, cached: CachedForecast | None, days: int) -> bool:
+        return (
+            cached is not None
+            and cached.covers(days)
+            and time.time() < cached.stale_at + self.stale_grace
+        )
+
+    async def _read_servable(
+        self, location_id: int, days: int
+    ) -> CachedForecast | None:
+        cached: CachedForecast | None = await self.read(location_id)
+        return cached if self._servable(cached, days) else None
+
+    async def _load(self, location_id: int, days: int) -> CachedForecast:
+        forecast: Dict[str, Any] = await result_consumer.apply(
+            get_forecast, args=(location_id, days)
+        )
+        return await self.write(location_id, forecast, days)
+
+    def _refresh_in_background(self, location_id: int, days: int) -> None:
+        horizon: int = self.horizon(days)
+        refresh: asyncio.Task = asyncio.create_task(
+            self.single_flight.try_lead(
+                self.flight_key(location_id, horizon),
+                lambda: self._load(location_id, horizon),
+            )
+        )
+        self._refreshes.add(refresh)
+        refresh.add_done_callback(self._on_refresh_done)
+
+    def _on_refresh_done(self, refresh: asyncio.Task) -> None:
+        self._refreshes.discard(refresh)
+        if not refresh.cancelled() and refresh.exception():
+            info_logger.error(f"Forecast refresh failed: {refresh.exception()!r}")
+
+    def _on_invalidation(self, data: bytes) -> None:
+        origin, location_id = data.decode().split(":")
+        if origin != self._origin:
+            self.local_cache.delete(int(location_id))
+
+
+forecast_cache: ForecastCache = ForecastCache(
+    redis_async_client,
+    pubsub_listener,
+    SingleFlight(redis_async_client, pubsub_listener),
+    LocalCache(
+        "forecast",
+        max_size=settings.forecast_cache.LOCAL_MAX_SIZE,
+        max_ttl=settings.forecast_cache.LOCAL_MAX_TTL_SEC,
+    ),
+)
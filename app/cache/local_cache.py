@@ -0,0 +1,115 @@
+"""
+Module. Bounded in-process LRU cache with per-entry expiry.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Tuple, TypeVar
+
+from prometheus_client import Counter
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+cache_hits: Counter = Counter(
+    "local_cache_hits_total", "In-process cache hits.", ["cache"]
+)
+cache_misses: Counter = Counter(
+    "local_cache_misses_total", "In-process cache misses.", ["cache"]
+)
+cache_evictions: Counter = Counter(
+    "local_cache_evictions_total",
+    "In-process cache entries dropped by size, expiry or invalidation.",
+    ["cache", "reason"],
+)
+
+
+class LocalCache(Generic[K, V]):
+    """
+    Class. Process-local LRU cache. Not shared between workers, use pub/sub
+    invalidation to keep workers consistent.
+    Attributes:
+        name (str): cache name used as metrics label.
+        max_size (int): maximum number of entries.
+        max_ttl (float): upper bound of entry lifetime in seconds.
+    """
+
+    def __init__(self, name: str, max_size: int, max_ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        """
+        Function. Get live entry and mark it recently used.
+        :param key: entry key
+        :return: value or None if missing or expired
+        """
+        entry: Tuple[float, V] | None = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            cache_hits.labels(self.name).inc()
+            return entry[1]
+
+        if entry is not None:
+            self._evict(key, "expired")
+        self.misses += 1
+        cache_misses.labels(self.name).inc()
+        return None
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """
+        Function. Store entry, evicting least recently used ones over max size.
+        :param key: entry key
+        :param value: entry value
+        :param ttl: entry lifetime in seconds, capped by max_ttl
+        :return: None
+        """
+        ttl = self.max_ttl if ttl is None else min(ttl, self.max_ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._evict(next(iter(self._entries)), "size")
+
+    def delete(self, key: K) -> None:
+        """
+        Function. Drop entry if present.
+        :param key: entry key
+        :return: None
+        """
+        if key in self._entries:
+            self._evict(key, "invalidated")
+
+    def clear(self) -> None:
+        """
+        Function. Drop all entries.
+        :return: None
+        """
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Function. Cache counters.
+        :return: hits, misses, evictions and current size
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+    def _evict(self, key: K, reason: str) -> None:
+        del self._entries[key]
+        self.evictions += 1
+        cache_evictions.labels(self.name, reason).inc()
+
+    def __len__(self) -> int:
+        return len(self._entries)
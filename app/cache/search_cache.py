@@ -0,0 +1,169 @@
+"""
+Module. Location search results cached by normalized query.
+"""
+
+import re
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, List
+
+from prometheus_client import Counter
+from redis.asyncio import Redis as AsyncRedis
+
+from app.celery_tasks.result_consumer import result_consumer
+from app.celery_tasks.tasks import location_by_name
+from app.logger.logging_handler import info_logger
+from app.utils.redis_engine import redis_async_client, pubsub_listener
+from app.utils.settings import settings
+from .codec import CacheCodec, decode, get_codec
+from .single_flight import SingleFlight
+
+search_cache_requests: Counter = Counter(
+    "search_cache_requests_total",
+    "Location searches by cache outcome.",
+    ["outcome"],
+)
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str, aliases: Dict[str, str]) -> str:
+    """
+    Function. Canonical form of a location search query: accents folded,
+    case folded, whitespace collapsed, aliases resolved.
+    :param query: search query as typed
+    :param aliases: canonical query by normalized alias
+    :return: normalized query
+    """
+    decomposed: str = unicodedata.normalize("NFKD", query)
+    folded: str = "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).casefold()
+    normalized: str = WHITESPACE.sub(" ", folded).strip()
+    return aliases.get(normalized, normalized)
+
+
+class SearchCache:
+    """
+    Class. Redis cache of weather API location searches.
+    Place names rarely change, so results are kept for a long time and
+    queries differing only in case, accents, spacing or by a known alias
+    share one entry. Concurrent misses of a query are searched once.
+    Attributes:
+        redis_connection (AsyncRedis): async redis connection.
+        single_flight (SingleFlight): coalesces concurrent misses.
+        key_prefix (str): cache key prefix.
+        ttl (int): lifetime of non-empty results in seconds.
+        empty_ttl (int): lifetime of empty results in seconds.
+        aliases (Dict[str, str]): canonical query by normalized alias.
+        codec (CacheCodec): codec of written entries, any known one is read.
+    """
+
+    def __init__(
+        self,
+        redis_connection: AsyncRedis,
+        single_flight: SingleFlight,
+        key_prefix: str = settings.search_cache.KEY_PREFIX,
+        ttl: int = settings.search_cache.TTL_SEC,
+        empty_ttl: int = settings.search_cache.EMPTY_TTL_SEC,
+        aliases: Dict[str, str] = settings.search_cache.ALIASES,
+        codec: CacheCodec = get_codec(
+            settings.forecast_cache.CODEC, settings.forecast_cache.FALLBACK_CODEC
+        ),
+    ):
+        self.redis_connection = redis_connection
+        self.single_flight = single_flight
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        # Both sides are normalized, so an alias and its name share one entry.
+        self.aliases = {
+            normalize_query(alias, {}): normalize_query(name, {})
+            for alias, name in aliases.items()
+        }
+        self.codec = codec
+
+    def key(self, query: str) -> str:
+        """
+        Function. Cache key of a normalized query.
+        :param query: normalized query
+        :return: cache key
+        """
+        return f"{self.key_prefix}:{query}"
+
+    async def read(self, query: str) -> List[Dict[str, Any]] | None:
+        """
+        Function. Read cached search results.
+        :param query: normalized query
+        :return: locations or None if missing
+        """
+        cached_locations: bytes | None = await self.redis_connection.get(
+            self.key(query)
+        )
+        if cached_locations is None:
+            return None
+
+        try:
+            return decode(cached_locations)
+        except ValueError as exc:
+            info_logger.error(f"Unreadable search cache entry: {exc!r}")
+            return None
+
+    async def write(self, query: str, locations: List[Dict[str, Any]]) -> None:
+        """
+        Function. Store search results, empty ones for a shorter time.
+        :param query: normalized query
+        :param locations: found locations
+        :return: None
+        """
+        await self.redis_connection.set(
+            self.key(query),
+            self.codec.encode(locations),
+            ex=self.ttl if locations else self.empty_ttl,
+        )
+
+    async def get(
+        self,
+        location_name: str,
+        load: Callable[[str], Awaitable[List[Dict[str, Any]]]] | None = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Function. Get locations found by name, searching only on a miss.
+        :param location_name: search query as typed
+        :param load: searches a normalized query, the weather API by default
+        :return: found locations
+        """
+        load = load or self.search_upstream
+        query: str = normalize_query(location_name, self.aliases)
+        locations: List[Dict[str, Any]] | None = await self.read(query)
+        if locations is not None:
+            search_cache_requests.labels("hit").inc()
+            return locations
+
+        search_cache_requests.labels("miss").inc()
+        return await self.single_flight.do(
+            self.key(query),
+            read=lambda: self.read(query),
+            load=lambda: self._load(query, load),
+        )
+
+    @staticmethod
+    async def search_upstream(query: str) -> List[Dict[str, Any]]:
+        """
+        Function. Search the weather API through a Celery worker.
+        :param query: normalized query
+        :return: found locations
+        """
+        return await result_consumer.apply(location_by_name, args=(query,))
+
+    async def _load(
+        self, query: str, load: Callable[[str], Awaitable[List[Dict[str, Any]]]]
+    ) -> List[Dict[str, Any]]:
+        locations: List[Dict[str, Any]] = await load(query)
+        await self.write(query, locations)
+        return locations
+
+
+search_cache: SearchCache = SearchCache(
+    redis_async_client,
+    SingleFlight(redis_async_client, pubsub_listener),
+)
@@ -0,0 +1,98 @@
+"""
+Module. Cache of serialized forecast responses shaped by user settings.
+"""
+
+from typing import Any, Hashable, Tuple
+
+from pydantic import BaseModel
+
+from app.schemas.setting_schemas import (
+    CurrentSettings,
+    DailySettings,
+    HourlySettings,
+    UserSettings,
+)
+from app.utils.settings import settings
+from .forecast_cache import CachedForecast
+from .local_cache import LocalCache
+
+
+class ShapedForecastCache:
+    """
+    Class. Process-local cache of encoded ForecastPublic bodies.
+    Keys carry the raw entry's fetch time, so a refreshed forecast is never
+    answered with a body shaped from the previous one.
+    Attributes:
+        local_cache (LocalCache): encoded bodies by shaping key.
+    """
+
+    def __init__(self, local_cache: LocalCache[Tuple[Hashable, ...], bytes]):
+        self.local_cache = local_cache
+
+    @staticmethod
+    def key(
+        location_id: int,
+        cached: CachedForecast,
+        local_hour: int,
+        user_settings: UserSettings | None,
+        current_settings: CurrentSettings | None,
+        daily_settings: DailySettings | None,
+        hourly_settings: HourlySettings | None,
+        fields: Tuple[str, ...] = (),
+    ) -> Tuple[Hashable, ...]:
+        """
+        Function. Shaping key of a forecast response.
+        :param location_id: location id
+        :param cached: raw cached forecast
+        :param local_hour: location local hour, start of the hourly window
+        :param user_settings: user settings
+        :param current_settings: current weather user settings
+        :param daily_settings: daily weather user settings
+        :param hourly_settings: hourly weather user settings
+        :param fields: sparse fieldset, empty for all fields
+        :return: hashable key
+        """
+        return (
+            location_id,
+            cached.fetched_at,
+            user_settings.units if user_settings else None,
+            user_settings.daily if user_settings else None,
+            user_settings.hourly if user_settings else None,
+            _flags(current_settings),
+            _flags(daily_settings),
+            _flags(hourly_settings),
+            local_hour,
+            fields,
+        )
+
+    def get(self, key: Tuple[Hashable, ...]) -> bytes | None:
+        """
+        Function. Get encoded response body.
+        :param key: shaping key
+        :return: body or None if missing
+        """
+        return self.local_cache.get(key)
+
+    def set(self, key: Tuple[Hashable, ...], body: bytes) -> None:
+        """
+        Function. Store encoded response body.
+        :param key: shaping key
+        :param body: encoded body
+        :return: None
+        """
+        self.local_cache.set(key, body)
+
+
+def _flags(display_settings: BaseModel | None) -> Tuple[Any, ...] | None:
+    if display_settings is None:
+        return None
+    return tuple(display_settings.model_dump().values())
+
+
+shaped_forecast_cache: ShapedForecastCache = ShapedForecastCache(
+    LocalCache(
+        "forecast_shaped",
+        max_size=settings.forecast_cache.SHAPED_MAX_SIZE,
+        max_ttl=settings.forecast_cache.LOCAL_MAX_TTL_SEC,
+    )
+)
@@ -0,0 +1,153 @@
+"""
+Module. Cross-process request coalescing on a Redis lease.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+from uuid import uuid4
+
+from redis.asyncio import Redis as AsyncRedis
+
+from app.utils.exception_handler import GatewayTimeoutError
+from app.utils.redis_engine import PubSubListener
+from app.utils.settings import settings
+
+T = TypeVar("T")
+
+RELEASE_LEASE_SCRIPT: str = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Class. Runs at most one loader per key across all processes.
+    The process holding the lease loads the value, the others wait for the
+    "landed" notification and read the stored value. Concurrent callers in
+    the same process share one flight without touching Redis.
+    Attributes:
+        redis_connection (AsyncRedis): async redis connection.
+        listener (PubSubListener): shared pub/sub listener.
+        lease_ms (int): lease lifetime, must outlive one upstream fetch.
+        wait_timeout (float): seconds a follower waits before giving up.
+    """
+
+    def __init__(
+        self,
+        redis_connection: AsyncRedis,
+        listener: PubSubListener,
+        lease_ms: int = settings.forecast_cache.LEASE_MS,
+        wait_timeout: float = settings.forecast_cache.WAIT_TIMEOUT_SEC,
+    ):
+        self.redis_connection = redis_connection
+        self.listener = listener
+        self.lease_ms = lease_ms
+        self.wait_timeout = wait_timeout
+        self._release_lease = redis_connection.register_script(RELEASE_LEASE_SCRIPT)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(
+        self,
+        key: str,
+        read: Callable[[], Awaitable[T | None]],
+        load: Callable[[], Awaitable[T]],
+    ) -> T:
+        """
+        Function. Return the value for key, loading it at most once.
+        :param key: coalescing key
+        :param read: reads the stored value, None if missing
+        :param load: fetches and stores the value
+        :return: value
+        """
+        inflight: asyncio.Future | None = self._inflight.get(key)
+        if inflight is not None:
+            value: T | None = await asyncio.shield(inflight)
+            if value is not None:
+                return value
+
+        return await self._fly(key, self._do(key, read, load))
+
+    async def try_lead(self, key: str, load: Callable[[], Awaitable[T]]) -> bool:
+        """
+        Function. Run loader only if nobody else is loading the key.
+        Used for background refreshes, which never wait for another flight.
+        :param key: coalescing key
+        :param load: fetches and stores the value
+        :return: whether the loader ran
+        """
+        if key in self._inflight:
+            return False
+
+        return await self._fly(key, self._lead(key, load)) is not None
+
+    async def _fly(self, key: str, flight_coro: Awaitable[T | None]) -> T | None:
+        flight: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = flight
+        try:
+            value: T | None = await flight_coro
+        except BaseException as exc:
+            flight.set_exception(exc)
+            # Mark retrieved, there may be no other callers to await it.
+            flight.exception()
+            raise
+        else:
+            flight.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+
+    async def _lead(self, key: str, load: Callable[[], Awaitable[T]]) -> T | None:
+        lease_key: str = f"lease:{key}"
+        token: str = uuid4().hex
+        if not await self.redis_connection.set(
+            lease_key, token, nx=True, px=self.lease_ms
+        ):
+            return None
+
+        try:
+            return await load()
+        finally:
+            await self._release_lease(keys=[lease_key], args=[token])
+            await self.redis_connection.publish(f"landed:{key}", token)
+
+    async def _do(
+        self,
+        key: str,
+        read: Callable[[], Awaitable[T | None]],
+        load: Callable[[], Awaitable[T]],
+    ) -> T:
+        deadline: float = asyncio.get_running_loop().time() + self.wait_timeout
+
+        while True:
+            value: T | None = await self._lead(key, load)
+            if value is not None:
+                return value
+
+            async with self.listener.waiter(f"landed:{key}") as landed:
+                # Subscribed before re-reading, a landing in between is not lost.
+                value = await read()
+                if value is not None:
+                    return value
+
+                remaining: float = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    raise GatewayTimeoutError(
+                        "Weather service did not respond in time."
+                    )
+
+                lease_left_ms: int = await self.redis_connection.pttl(f"lease:{key}")
+                if lease_left_ms > 0:
+                    try:
+                        await asyncio.wait_for(
+                            landed.get(), min(remaining, lease_left_ms / 1000)
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+
+            value = await read()
+            if value is not None:
+                return value
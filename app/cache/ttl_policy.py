@@ -0,0 +1,104 @@
+"""
+Module. Freshness policy of cached forecasts.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from prometheus_client import Counter, Histogram
+
+from app.utils.settings import settings
+
+forecast_fresh_ttl: Histogram = Histogram(
+    "forecast_cache_fresh_ttl_seconds",
+    "Seconds a written forecast stays fresh.",
+    buckets=(60, 300, 600, 900, 1200, 1500, 1800, 2700, 3600, 7200),
+)
+forecast_stale_offset: Histogram = Histogram(
+    "forecast_cache_stale_offset_seconds",
+    "Seconds past the :00/:30 boundary a forecast becomes stale, "
+    "a flat distribution means expiries are spread.",
+    buckets=tuple(range(120, 1801, 120)),
+)
+forecast_ttl_source: Counter = Counter(
+    "forecast_cache_ttl_source_total",
+    "Written forecasts by the bound that decided their freshness.",
+    ["source"],
+)
+
+
+def next_half_hour(moment: datetime) -> datetime:
+    """
+    Function. First :00 or :30 boundary after moment.
+    :param moment: local datetime
+    :return: boundary datetime
+    """
+    floor: datetime = moment.replace(
+        minute=0 if moment.minute < 30 else 30, second=0, microsecond=0
+    )
+    return floor + timedelta(minutes=30)
+
+
+class TtlPolicy:
+    """
+    Class. Decides when a fetched forecast becomes stale.
+    A forecast is fresh until the provider is expected to publish newer
+    data, counted from current.last_updated_epoch of the payload, so it is
+    never refetched before there is something new to fetch. Payloads
+    without it fall back to the next :00/:30 boundary. Random jitter is
+    added on top, so locations fetched together do not expire together.
+    Attributes:
+        upstream_interval (int): seconds between provider updates.
+        min_ttl (int): shortest freshness, bounds refetching of late data.
+        max_ttl (int): longest freshness.
+        jitter (int): upper bound of the random extension in seconds.
+    """
+
+    def __init__(
+        self,
+        upstream_interval: int = settings.forecast_cache.UPSTREAM_INTERVAL_SEC,
+        min_ttl: int = settings.forecast_cache.MIN_FRESH_SEC,
+        max_ttl: int = settings.forecast_cache.MAX_FRESH_SEC,
+        jitter: int = settings.forecast_cache.JITTER_SEC,
+    ):
+        self.upstream_interval = upstream_interval
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.jitter = jitter
+
+    def stale_at(
+        self,
+        forecast: Dict[str, Any],
+        fetched_at: float,
+        not_before: float | None = None,
+    ) -> float:
+        """
+        Function. Epoch seconds the forecast becomes stale.
+        :param forecast: forecast payload
+        :param fetched_at: epoch seconds the payload was fetched
+        :param not_before: epoch seconds the payload must stay fresh until
+        :return: epoch seconds
+        """
+        last_updated: Any = forecast.get("current", {}).get("last_updated_epoch")
+        if isinstance(last_updated, (int, float)):
+            source: str = "upstream"
+            stale_at: float = last_updated + self.upstream_interval
+        else:
+            source = "boundary"
+            stale_at = next_half_hour(datetime.fromtimestamp(fetched_at)).timestamp()
+
+        if stale_at < fetched_at + self.min_ttl:
+            source, stale_at = "min", fetched_at + self.min_ttl
+        if not_before is not None and stale_at < not_before:
+            source, stale_at = "not_before", not_before
+        stale_at = min(stale_at, fetched_at + self.max_ttl)
+        stale_at += random.uniform(0, self.jitter)
+
+        forecast_ttl_source.labels(source).inc()
+        forecast_fresh_ttl.observe(stale_at - fetched_at)
+        forecast_stale_offset.observe(stale_at % 1800)
+        return stale_at
+
+
+ttl_policy: TtlPolicy = TtlPolicy()
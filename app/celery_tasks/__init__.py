@@ -2,7 +2,10 @@ __all__ = (
     "celery_app",
     "location_by_name",
     "get_forecast",
+    "get_forecasts",
+    "result_consumer",
 )
 
 from .run_celery import celery_app
-from .tasks import location_by_name, get_forecast
+from .tasks import location_by_name, get_forecast, get_forecasts
+from .result_consumer import result_consumer
@@ -0,0 +1,55 @@
+"""
+Module. Coroutine versions of the interactive upstream tasks, run in the
+awaiting process by the asyncio execution mode.
+"""
+
+from typing import Any, Awaitable, Callable, Dict
+
+from .http_client import async_upstream_client
+from .tasks import (
+    current_weather_request,
+    forecast_document,
+    forecast_request,
+    get_current_weather,
+    get_forecast,
+    location_by_name,
+    search_request,
+)
+
+
+async def location_by_name_async(location_name: str) -> Any:
+    """
+    Function. Get locations by name from API.
+    :param location_name: Location name string
+    :return: List of locations
+    """
+    return await async_upstream_client.get(*search_request(location_name))
+
+
+async def get_forecast_async(location_id: int, amount_of_days: int) -> Any:
+    """
+    Function. Get location forecast by id from API.
+    :param location_id: location id integer
+    :param amount_of_days: days of forecast
+    :return: canonical forecast document
+    """
+    return forecast_document(
+        await async_upstream_client.get(*forecast_request(location_id, amount_of_days))
+    )
+
+
+async def get_current_weather_async(location_id: int) -> Any:
+    """
+    Function. Get location current weather by id from API.
+    :param location_id: location id integer
+    :return: current weather payload
+    """
+    return await async_upstream_client.get(*current_weather_request(location_id))
+
+
+# Coroutine version by Celery task name.
+ASYNC_TASKS: Dict[str, Callable[..., Awaitable[Any]]] = {
+    location_by_name.name: location_by_name_async,
+    get_forecast.name: get_forecast_async,
+    get_current_weather.name: get_current_weather_async,
+}
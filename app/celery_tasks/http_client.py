@@ -0,0 +1,415 @@
+"""
+Module. Pooled keep-alive HTTP clients of the weather API: a sync one
+for Celery workers and an async one for the asyncio execution mode.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+import httpx
+from celery.signals import worker_process_init, worker_process_shutdown
+from prometheus_client import Histogram
+
+from app.logger.logging_handler import info_logger
+from app.utils.quota import Credential, CredentialPool, credential_pool
+from app.utils.retry import (
+    QuotaExhaustedError,
+    UpstreamError,
+    UpstreamRateLimitedError,
+    UpstreamUnavailableError,
+)
+from app.utils.settings import settings
+
+RETRYABLE_STATUS_CODES: frozenset[int] = frozenset({500, 502, 503, 504})
+
+upstream_request_seconds: Histogram = Histogram(
+    "upstream_request_seconds",
+    "Weather API call duration.",
+    ["endpoint", "connection"],
+)
+upstream_connect_seconds: Histogram = Histogram(
+    "upstream_connect_seconds",
+    "TCP and TLS setup time of new weather API connections.",
+    ["endpoint"],
+)
+
+
+class BaseUpstreamClient:
+    """
+    Class. Weather API client settings and call accounting shared by the
+    sync and async clients. Every call is paid for from the quota of
+    a pooled API key; a key the weather API rejects is quarantined and
+    the call is repeated with the next one.
+    Attributes:
+        credentials (CredentialPool): pooled API keys.
+        base_url (str): weather API base url.
+        timeout (httpx.Timeout): connect and read timeouts.
+        limits (httpx.Limits): pool size and keep-alive limits.
+        http2 (bool): negotiate HTTP/2 if the h2 package is installed.
+    """
+
+    def __init__(
+        self,
+        credentials: CredentialPool = credential_pool,
+        base_url: str = settings.upstream_base_url,
+        connect_timeout: float = settings.upstream.CONNECT_TIMEOUT_SEC,
+        read_timeout: float = settings.upstream.READ_TIMEOUT_SEC,
+        max_connections: int = settings.upstream.MAX_CONNECTIONS,
+        max_keepalive: int = settings.upstream.MAX_KEEPALIVE,
+        keepalive_expiry: float = settings.upstream.KEEPALIVE_EXPIRY_SEC,
+        http2: bool = settings.upstream.HTTP2,
+    ):
+        self.credentials = credentials
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+
+    def _http2_available(self) -> bool:
+        if self.http2:
+            try:
+                import h2  # pylint: disable=import-outside-toplevel,unused-import
+            except ImportError:
+                info_logger.error("HTTP/2 requested but h2 is not installed.")
+                return False
+        return self.http2
+
+    @staticmethod
+    def _on_connect(connect: Dict[str, float], event_name: str) -> None:
+        if event_name == "connection.connect_tcp.started":
+            connect["started"] = time.perf_counter()
+        elif event_name in (
+            "connection.connect_tcp.complete",
+            "connection.start_tls.complete",
+        ):
+            connect["complete"] = time.perf_counter()
+
+    @staticmethod
+    def _observe(
+        endpoint: str,
+        credential: Credential,
+        response: httpx.Response,
+        elapsed: float,
+        connect: Dict[str, float],
+    ) -> None:
+        connection: str = "new" if "started" in connect else "reused"
+        upstream_request_seconds.labels(endpoint, connection).observe(elapsed)
+        connect_time: float = 0.0
+        if "complete" in connect:
+            connect_time = connect["complete"] - connect["started"]
+            upstream_connect_seconds.labels(endpoint).observe(connect_time)
+        info_logger.info(
+            f"Upstream {endpoint}: {response.status_code} in {elapsed * 1000:.0f} ms, "
+            f"{connection} connection, connect {connect_time * 1000:.0f} ms "
+            f"({response.http_version}), key {credential.id}"
+        )
+
+    @staticmethod
+    def _checked(endpoint: str, response: httpx.Response) -> httpx.Response:
+        if response.status_code == 429:
+            raise UpstreamRateLimitedError(f"{endpoint}: HTTP 429")
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise UpstreamUnavailableError(f"{endpoint}: HTTP {response.status_code}")
+        if response.is_error:
+            raise UpstreamError(f"{endpoint}: HTTP {response.status_code}")
+        return response
+
+
+class UpstreamClient(BaseUpstreamClient):
+    """
+    Class. Weather API client keeping connections alive between tasks.
+    The pool is built per process: at worker process init, or lazily on
+    first use, and never reused across a fork.
+    Attributes:
+        bulk_max_locations (int): locations per bulk request.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        bulk_max_locations: int = settings.upstream.BULK_MAX_LOCATIONS,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.bulk_max_locations = bulk_max_locations
+        self._client: httpx.Client | None = None
+        self._pid: int | None = None
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        """
+        Function. Pooled client of the current process.
+        :return: httpx client
+        """
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self.start()
+        return self._client
+
+    def start(self) -> None:
+        """
+        Function. Build the connection pool of the current process.
+        :return: None
+        """
+        self._client = httpx.Client(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=self.limits,
+            http2=self._http2_available(),
+        )
+        self._pid = os.getpid()
+
+    def close(self) -> None:
+        """
+        Function. Close pooled connections of the current process.
+        :return: None
+        """
+        if self._client is not None and self._pid == os.getpid():
+            self._client.close()
+        self._client = None
+
+    def get(self, endpoint: str, params: Dict[str, Any]) -> Any:
+        """
+        Function. Call a weather API endpoint and time it.
+        :param endpoint: endpoint path, e.g. "forecast.json"
+        :param params: query parameters, the API key is added
+        :return: decoded JSON body
+        :raises UpstreamUnavailableError: connection failure, timeout or
+        overload, worth retrying
+        :raises QuotaExhaustedError: no healthy API key has quota left,
+        call not made
+        :raises UpstreamError: request rejected
+        """
+        return self._request("GET", endpoint, params).json()
+
+    def get_bulk(
+        self, endpoint: str, params: Dict[str, Any], queries: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """
+        Function. Call a weather API endpoint for many locations with bulk
+        requests, each holding at most the provider's limit of locations.
+        Every location is paid for as one call.
+        :param endpoint: endpoint path, e.g. "forecast.json"
+        :param params: query parameters shared by all locations
+        :param queries: location query by custom id, e.g. {"42": "id:42"}
+        :return: location payload by custom id, failed locations left out
+        :raises UpstreamUnavailableError: connection failure, timeout or
+        overload, worth retrying
+        :raises QuotaExhaustedError: no healthy API key has quota left
+        :raises UpstreamError: request rejected
+        """
+        items: List[tuple[str, str]] = list(queries.items())
+        payloads: Dict[str, Any] = {}
+        for offset in range(0, len(items), self.bulk_max_locations):
+            chunk: List[tuple[str, str]] = items[
+                offset : offset + self.bulk_max_locations
+            ]
+            response: httpx.Response = self._request(
+                "POST",
+                endpoint,
+                {**params, "q": "bulk"},
+                calls=len(chunk),
+                json={
+                    "locations": [
+                        {"q": query, "custom_id": custom_id}
+                        for custom_id, query in chunk
+                    ]
+                },
+            )
+            for entry in response.json().get("bulk", []):
+                payload: Dict[str, Any] = dict(entry.get("query", {}))
+                custom_id: str | None = payload.pop("custom_id", None)
+                payload.pop("q", None)
+                if "error" in payload or custom_id is None:
+                    info_logger.error(
+                        f"Upstream bulk {endpoint} {custom_id}: "
+                        f"{payload.get('error')}"
+                    )
+                    continue
+                payloads[custom_id] = payload
+        return payloads
+
+    def _request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Dict[str, Any],
+        calls: int = 1,
+        json: Any = None,
+    ) -> httpx.Response:
+        tried: List[str] = []
+        while True:
+            try:
+                credential: Credential = self.credentials.acquire(
+                    endpoint, tried, calls
+                )
+            except QuotaExhaustedError:
+                if not tried:
+                    raise
+                # Every usable key was rejected, report the last rejection.
+                break
+            response: httpx.Response = self._send(
+                method, endpoint, params, credential, json
+            )
+            if not self.credentials.record(credential, response.status_code):
+                break
+            tried.append(credential.id)
+
+        return self._checked(endpoint, response)
+
+    def _send(
+        self,
+        method: str,
+        endpoint: str,
+        params: Dict[str, Any],
+        credential: Credential,
+        json: Any = None,
+    ) -> httpx.Response:
+        connect: Dict[str, float] = {}
+
+        def trace(event_name: str, _: Dict[str, Any]) -> None:
+            self._on_connect(connect, event_name)
+
+        started: float = time.perf_counter()
+        try:
+            response: httpx.Response = self.client.request(
+                method,
+                endpoint,
+                params={"key": credential.token, **params},
+                json=json,
+                extensions={"trace": trace},
+            )
+        except httpx.TransportError as exc:
+            self.credentials.record(credential, None)
+            raise UpstreamUnavailableError(f"{endpoint}: {exc!r}") from exc
+        self._observe(
+            endpoint, credential, response, time.perf_counter() - started, connect
+        )
+        return response
+
+
+class AsyncUpstreamClient(BaseUpstreamClient):
+    """
+    Class. Weather API client for coroutines: one pooled async client per
+    event loop, so a single process keeps hundreds of calls in flight.
+    Key pool bookkeeping is awaited on async Redis, no thread is taken.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Function. Pooled client of the running event loop.
+        :return: httpx async client
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self._http2_available(),
+            )
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        """
+        Function. Close pooled connections of the running event loop.
+        :return: None
+        """
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+
+    async def get(self, endpoint: str, params: Dict[str, Any]) -> Any:
+        """
+        Function. Call a weather API endpoint and time it.
+        :param endpoint: endpoint path, e.g. "forecast.json"
+        :param params: query parameters, the API key is added
+        :return: decoded JSON body
+        :raises UpstreamUnavailableError: connection failure, timeout or
+        overload, worth retrying
+        :raises QuotaExhaustedError: no healthy API key has quota left,
+        call not made
+        :raises UpstreamError: request rejected
+        """
+        tried: List[str] = []
+        while True:
+            try:
+                credential: Credential = await self.credentials.acquire_async(
+                    endpoint, tried
+                )
+            except QuotaExhaustedError:
+                if not tried:
+                    raise
+                break
+            response: httpx.Response = await self._send(endpoint, params, credential)
+            if not await self.credentials.record_async(
+                credential, response.status_code
+            ):
+                break
+            tried.append(credential.id)
+
+        return self._checked(endpoint, response).json()
+
+    async def _send(
+        self, endpoint: str, params: Dict[str, Any], credential: Credential
+    ) -> httpx.Response:
+        connect: Dict[str, float] = {}
+
+        async def trace(event_name: str, _: Dict[str, Any]) -> None:
+            self._on_connect(connect, event_name)
+
+        started: float = time.perf_counter()
+        try:
+            response: httpx.Response = await self.client.get(
+                endpoint,
+                params={"key": credential.token, **params},
+                extensions={"trace": trace},
+            )
+        except httpx.TransportError as exc:
+            await self.credentials.record_async(credential, None)
+            raise UpstreamUnavailableError(f"{endpoint}: {exc!r}") from exc
+        self._observe(
+            endpoint, credential, response, time.perf_counter() - started, connect
+        )
+        return response
+
+
+upstream_client: UpstreamClient = UpstreamClient()
+async_upstream_client: AsyncUpstreamClient = AsyncUpstreamClient(
+    max_connections=settings.task_execution.ASYNC_MAX_CONNECTIONS,
+    max_keepalive=settings.task_execution.ASYNC_MAX_CONNECTIONS,
+)
+
+
+@worker_process_init.connect
+def start_upstream_client(**_: Any) -> None:
+    """
+    Function. Build the pool in every worker process after fork.
+    :return: None
+    """
+    upstream_client.start()
+
+
+@worker_process_shutdown.connect
+def close_upstream_client(**_: Any) -> None:
+    """
+    Function. Close pooled connections on worker process shutdown.
+    :return: None
+    """
+    upstream_client.close()
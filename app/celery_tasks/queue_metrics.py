@@ -0,0 +1,57 @@
+"""
+Module. Celery queue depth metrics read from the Redis broker on scrape.
+"""
+
+from typing import Iterator, List
+
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from redis import Redis, RedisError
+
+from app.logger.logging_handler import info_logger
+
+
+class QueueDepthCollector(Collector):
+    """
+    Class. Reports tasks waiting in each Celery queue. A Redis broker keeps
+    a queue as a list named after it, so one LLEN per queue is enough.
+    Attributes:
+        redis_connection (Redis): broker redis connection.
+        queues (List[str]): queue names.
+    """
+
+    def __init__(self, redis_connection: Redis, queues: List[str]):
+        self.redis_connection = redis_connection
+        self.queues = queues
+
+    def describe(self) -> Iterator[GaugeMetricFamily]:
+        """
+        Function. Metric names for registration, without reading Redis.
+        :return: empty queue depth gauge
+        """
+        yield self._gauge()
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        """
+        Function. Read queue depths.
+        :return: queue depth gauge
+        """
+        try:
+            with self.redis_connection.pipeline(transaction=False) as pipe:
+                for queue in self.queues:
+                    pipe.llen(queue)
+                depths: List[int] = pipe.execute()
+        except RedisError as exc:
+            info_logger.error(f"Celery queue depth read failed: {exc!r}")
+            return
+
+        gauge: GaugeMetricFamily = self._gauge()
+        for queue, depth in zip(self.queues, depths):
+            gauge.add_metric([queue], depth)
+        yield gauge
+
+    @staticmethod
+    def _gauge() -> GaugeMetricFamily:
+        return GaugeMetricFamily(
+            "celery_queue_depth", "Tasks waiting in a Celery queue.", labels=["queue"]
+        )
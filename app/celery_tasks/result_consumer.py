@@ -0,0 +1,140 @@
+"""
+Module. Await Celery task results from the event loop without blocking threads.
+In the asyncio execution mode the interactive tasks run as coroutines in the
+awaiting process instead of being sent to a worker.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Sequence
+
+from celery import Celery, Task, states, uuid
+from celery.result import denied_join_result
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.exception_handler import GatewayTimeoutError
+from app.utils.redis_engine import PubSubListener, pubsub_listener
+from app.utils.retry import UpstreamRetryHandler, upstream_retry
+from app.utils.settings import settings
+from .async_tasks import ASYNC_TASKS
+from .run_celery import celery_app
+
+
+class AsyncResultConsumer:
+    """
+    Class. Awaits task results published by the Celery redis result backend.
+    The backend publishes every stored result on a channel named after the
+    result key, so waiting is a pub/sub subscription instead of polling.
+    Attributes:
+        listener (PubSubListener): shared pub/sub listener.
+        app (Celery): Celery application owning the result backend.
+        mode (str): "celery" to send tasks to workers, "asyncio" to run
+            tasks with a coroutine version in this process.
+        coroutines (Dict[str, Callable[..., Awaitable[Any]]]): coroutine
+            version by task name.
+        retry (UpstreamRetryHandler): upstream call policy of coroutines.
+        in_flight (asyncio.Semaphore): limit of coroutines running at once.
+    """
+
+    def __init__(
+        self,
+        listener: PubSubListener,
+        app: Celery = celery_app,
+        mode: str = settings.task_execution.MODE,
+        coroutines: Dict[str, Callable[..., Awaitable[Any]]] | None = None,
+        retry: UpstreamRetryHandler = upstream_retry,
+        max_in_flight: int = settings.task_execution.ASYNC_MAX_IN_FLIGHT,
+    ):
+        self.listener = listener
+        self.app = app
+        self.mode = mode
+        self.coroutines = ASYNC_TASKS if coroutines is None else coroutines
+        self.retry = retry
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self._backend_lock = threading.Lock()
+
+    async def apply(
+        self,
+        task: Task,
+        args: Sequence[Any] = (),
+        timeout: float = settings.task_result.TIMEOUT_SEC,
+        **options: Any,
+    ) -> Any:
+        """
+        Function. Send a task and await its result.
+        :param task: celery task
+        :param args: task arguments
+        :param timeout: seconds to wait for the result
+        :param options: extra apply_async options
+        :return: task result
+        """
+        coroutine = self.coroutines.get(task.name)
+        if self.mode == "asyncio" and coroutine is not None:
+            return await self.run(coroutine, args, timeout)
+
+        task_id: str = uuid()
+        result_key: str = self.app.backend.get_key_for_task(task_id).decode()
+
+        async with self.listener.waiter(result_key) as messages:
+            await run_in_threadpool(self._send, task, args, task_id, options)
+            deadline: float = asyncio.get_running_loop().time() + timeout
+
+            while True:
+                remaining: float = deadline - asyncio.get_running_loop().time()
+                try:
+                    payload: bytes = await asyncio.wait_for(messages.get(), remaining)
+                except asyncio.TimeoutError:
+                    # A message may be lost on pub/sub reconnect,
+                    # the stored result is not.
+                    payload = await self.listener.redis_connection.get(result_key)
+                    if payload is None:
+                        raise GatewayTimeoutError(
+                            "Weather service did not respond in time."
+                        )
+
+                meta: dict[str, Any] = self.app.backend.decode_result(payload)
+                if meta["status"] in states.READY_STATES:
+                    break
+                if remaining <= 0:
+                    raise GatewayTimeoutError(
+                        "Weather service did not respond in time."
+                    )
+
+        if meta["status"] != states.SUCCESS:
+            raise meta["result"]
+        return meta["result"]
+
+    def _send(
+        self, task: Task, args: Sequence[Any], task_id: str, options: Dict[str, Any]
+    ) -> None:
+        # The result is awaited on the shared listener. Denying joins keeps
+        # apply_async from also subscribing the backend's own result consumer,
+        # whose pub/sub connection nothing here would read. The flag is
+        # process wide, so sends from the thread pool take turns setting it.
+        with self._backend_lock, denied_join_result():
+            task.apply_async(args=args, task_id=task_id, **options)
+
+    async def run(
+        self,
+        coroutine: Callable[..., Awaitable[Any]],
+        args: Sequence[Any],
+        timeout: float,
+    ) -> Any:
+        """
+        Function. Run a task coroutine in this process.
+        :param coroutine: task coroutine function
+        :param args: task arguments
+        :param timeout: seconds to wait for the result
+        :return: task result
+        """
+        try:
+            async with asyncio.timeout(timeout):
+                async with self.in_flight:
+                    return await self.retry.call_async(coroutine, *args)
+        except TimeoutError as exc:
+            raise GatewayTimeoutError(
+                "Weather service did not respond in time."
+            ) from exc
+
+
+result_consumer: AsyncResultConsumer = AsyncResultConsumer(pubsub_listener)
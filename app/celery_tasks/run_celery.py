@@ -2,6 +2,7 @@ import os
 import sys
 
 from celery import Celery
+from celery.schedules import crontab
 
 sys.path.insert(1, os.path.join(sys.path[0], ".."))
 
@@ -11,6 +12,27 @@ celery_app = Celery(
     "run_tasks",
     broker=settings.REDIS_LOCAL_CONN,
     backend=settings.REDIS_LOCAL_CONN,
-    include=["celery_tasks.tasks"],
+    # Imported under the app package, like the web side does, so no module
+    # is loaded twice under two names.
+    include=["app.celery_tasks.tasks", "app.celery_tasks.warmer"],
     ignore_result=False,
 )
+
+# A user waiting on a miss must never queue behind background refreshes:
+# interactive tasks get a queue and a worker pool of their own.
+celery_app.conf.task_default_queue = settings.task_queues.BULK
+celery_app.conf.task_routes = {
+    "run_tasks.location_by_name": {"queue": settings.task_queues.INTERACTIVE},
+    "run_tasks.get_forecast": {"queue": settings.task_queues.INTERACTIVE},
+    "run_tasks.get_current_weather": {"queue": settings.task_queues.INTERACTIVE},
+}
+
+warm_minute: int = 30 - settings.cache_warmer.LEAD_MIN
+celery_app.conf.beat_schedule = {
+    "warm-forecast-cache": {
+        "task": "run_tasks.warm_forecast_cache",
+        "schedule": crontab(minute=f"{warm_minute},{warm_minute + 30}"),
+        # A run that missed its slot is useless after the boundary.
+        "options": {"expires": settings.cache_warmer.LEAD_MIN * 60},
+    },
+}
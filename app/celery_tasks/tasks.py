@@ -1,47 +1,134 @@
-from typing import Any
-import requests
-from requests import Response
+from typing import Any, Dict, List, NamedTuple
+
+from pydantic import ValidationError
 
 from .run_celery import celery_app
+from .http_client import upstream_client
+
+from app.logger.logging_handler import info_logger
+from app.schemas.weather_schemas import normalize_forecast
+from app.utils.retry import UpstreamError, upstream_retry
+
+
+class UpstreamRequest(NamedTuple):
+    """
+    Class. Weather API call of a task, shared by its Celery and coroutine
+    versions.
+    Attributes:
+        endpoint (str): endpoint path.
+        params (Dict[str, Any]): query parameters without the API key.
+    """
+
+    endpoint: str
+    params: Dict[str, Any]
+
+
+def search_request(location_name: str) -> UpstreamRequest:
+    """
+    Function. Location search call.
+    :param location_name: Location name string
+    :return: upstream request
+    """
+    return UpstreamRequest("search.json", {"q": location_name, "aqi": "no"})
 
-from .config import API_TOKEN as TOKEN
 
-from app.utils.retry import RetryTask, APIRetryHandler
+def forecast_params(amount_of_days: int) -> Dict[str, Any]:
+    """
+    Function. Forecast query parameters shared by single and bulk calls.
+    :param amount_of_days: days of forecast
+    :return: query parameters
+    """
+    return {
+        "days": amount_of_days if amount_of_days > 1 else 2,
+        "aqi": "no",
+        "alerts": "yes",
+    }
 
 
-@celery_app.task(name="run_tasks.location_by_name", serializer="json")
-@APIRetryHandler(max_retries=5, delay=1)
+def forecast_request(location_id: int, amount_of_days: int) -> UpstreamRequest:
+    """
+    Function. Location forecast call.
+    :param location_id: location id integer
+    :param amount_of_days: days of forecast
+    :return: upstream request
+    """
+    return UpstreamRequest(
+        "forecast.json", {"q": f"id:{location_id}", **forecast_params(amount_of_days)}
+    )
+
+
+def forecast_document(forecast: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Function. Validate an upstream forecast once, at ingest, into a canonical
+    forecast document.
+    :param forecast: upstream forecast payload
+    :return: canonical forecast document
+    :raises UpstreamError: malformed payload
+    """
+    try:
+        return normalize_forecast(forecast)
+    except ValidationError as exc:
+        raise UpstreamError(f"forecast.json: malformed payload, {exc!r}") from exc
+
+
+def current_weather_request(location_id: int) -> UpstreamRequest:
+    """
+    Function. Location current weather call.
+    :param location_id: location id integer
+    :return: upstream request
+    """
+    return UpstreamRequest("current.json", {"q": f"id:{location_id}", "aqi": "no"})
+
+
+@celery_app.task(name="run_tasks.location_by_name", serializer="json", bind=True)
+@upstream_retry
 def location_by_name(location_name) -> Any | None:
     """
     Function. Get locations by name from API.
     :param location_name: Location name string
     :return: List of locations
     """
-    result: Response = requests.get(
-        f"https://api.weatherapi.com/v1/search.json?key={TOKEN}&q={location_name}&aqi=no"
-    )
-    return result.json()
+    return upstream_client.get(*search_request(location_name))
 
 
-@celery_app.task(name="run_tasks.get_forecast", serializer="json")
-@APIRetryHandler(max_retries=5, delay=1)
-def get_forecast(location_id: int, amount_of_days: int) -> Response | None:
+@celery_app.task(name="run_tasks.get_forecast", serializer="json", bind=True)
+@upstream_retry
+def get_forecast(location_id: int, amount_of_days: int) -> Any | None:
     """
-    Function. Get locations by id from API.
+    Function. Get location forecast by id from API.
     :param amount_of_days: days of forecast
     :param location_id: location id integer
-    :return: Location object
+    :return: canonical forecast document
     """
-    forecast_weather_result: Response = requests.get(
-        f"https://api.weatherapi.com/v1/forecast.json?key={TOKEN}&q=id:{location_id}&days={amount_of_days if amount_of_days > 1 else 2}&aqi=no&alerts=yes"
+    return forecast_document(
+        upstream_client.get(*forecast_request(location_id, amount_of_days))
     )
-    return forecast_weather_result.json()
 
 
-@celery_app.task(name="run_tasks.get_current_weather", serializer="json")
-@APIRetryHandler(max_retries=5, delay=1)
-def get_current_weather(location_id) -> Any | None:
-    current_weather_result: Response = requests.get(
-        f"https://api.weatherapi.com/v1/current.json?key={TOKEN}&q=id:{location_id}&aqi=no"
+@celery_app.task(name="run_tasks.get_forecasts", serializer="json", bind=True)
+@upstream_retry
+def get_forecasts(location_ids: List[int], amount_of_days: int) -> Dict[str, Any]:
+    """
+    Function. Get forecasts of many locations from API with bulk requests.
+    :param location_ids: location ids
+    :param amount_of_days: days of forecast
+    :return: forecast by location id string, failed locations left out
+    """
+    forecasts: Dict[str, Any] = upstream_client.get_bulk(
+        "forecast.json",
+        forecast_params(amount_of_days),
+        {str(location_id): f"id:{location_id}" for location_id in location_ids},
     )
-    return current_weather_result.json()
+    documents: Dict[str, Any] = {}
+    for location_id, forecast in forecasts.items():
+        try:
+            documents[location_id] = forecast_document(forecast)
+        except UpstreamError as exc:
+            info_logger.error(f"Upstream bulk forecast.json {location_id}: {exc!r}")
+    return documents
+
+
+@celery_app.task(name="run_tasks.get_current_weather", serializer="json", bind=True)
+@upstream_retry
+def get_current_weather(location_id) -> Any | None:
+    return upstream_client.get(*current_weather_request(location_id))
@@ -0,0 +1,226 @@
+"""
+Module. Forecast cache warming and bulk refresh: the locations users
+follow are refreshed periodically, many locations per Celery message
+and per weather API request.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List
+
+from redis.asyncio import Redis as AsyncRedis
+from sqlalchemy import Select, func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.cache import CachedForecast, ForecastCache, LocalCache, SingleFlight
+from app.logger.logging_handler import info_logger
+from app.models import Favorites, Wishlist
+from app.utils.redis_engine import PubSubListener
+from app.utils.settings import settings
+from .run_celery import celery_app
+from .tasks import get_forecasts
+
+# Beat runs the warmer twice an hour.
+RUN_INTERVAL_SEC: int = 30 * 60
+
+
+class ForecastWarmer:
+    """
+    Class. Refreshes cached forecasts of favorite and wishlist locations
+    that would go stale before the next run, so they stay fresh until it.
+    Most followed locations are warmed first and the run stops once the
+    upstream budget is spent or the upstream quota runs low.
+    Due locations are fetched in bulk requests of chunk_size locations.
+    Attributes:
+        batch_size (int): location ids read from the database at once.
+        concurrency (int): bulk requests in flight.
+        budget (int): upstream calls allowed per run.
+        chunk_size (int): locations per bulk request.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.cache_warmer.BATCH_SIZE,
+        concurrency: int = settings.cache_warmer.CONCURRENCY,
+        budget: int = settings.cache_warmer.UPSTREAM_BUDGET,
+        chunk_size: int = settings.upstream.BULK_MAX_LOCATIONS,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.budget = budget
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def followed_locations() -> Select:
+        """
+        Function. Distinct followed location ids, most followed first.
+        :return: select statement
+        """
+        followed = union_all(
+            select(Favorites.loc_id), select(Wishlist.loc_id)
+        ).subquery()
+        return (
+            select(followed.c.loc_id)
+            .group_by(followed.c.loc_id)
+            .order_by(func.count().desc(), followed.c.loc_id)
+        )
+
+    @staticmethod
+    @asynccontextmanager
+    async def forecast_cache() -> AsyncIterator[ForecastCache]:
+        """
+        Function. Forecast cache on a connection of its own, for use
+        inside a worker's event loop.
+        :return: forecast cache
+        """
+        redis_connection: AsyncRedis = AsyncRedis(host=settings.REDIS_LOCALHOST)
+        listener: PubSubListener = PubSubListener(redis_connection)
+        try:
+            yield ForecastCache(
+                redis_connection,
+                listener,
+                SingleFlight(redis_connection, listener),
+                LocalCache("forecast_warmer", max_size=0, max_ttl=0),
+            )
+        finally:
+            await redis_connection.aclose()
+
+    async def run(self) -> Dict[str, int]:
+        """
+        Function. Warm the cache once.
+        :return: run statistics
+        """
+        engine: AsyncEngine = create_async_engine(
+            url=settings.db_conn, pool_size=1, max_overflow=0
+        )
+        stats: Dict[str, int] = dict.fromkeys(
+            ("seen", "fresh", "warmed", "skipped", "failed", "upstream"), 0
+        )
+
+        try:
+            async with self.forecast_cache() as cache, engine.connect() as connection:
+                result = await connection.stream_scalars(
+                    self.followed_locations().execution_options(
+                        yield_per=self.batch_size
+                    )
+                )
+                async for batch in result.partitions():
+                    if await cache.quota.is_low():
+                        info_logger.info("Forecast warmer suspended, quota is low.")
+                        break
+                    await self._warm_batch(cache, batch, stats)
+                    if stats["upstream"] >= self.budget:
+                        info_logger.info("Forecast warmer upstream budget spent.")
+                        break
+        finally:
+            await engine.dispose()
+
+        return stats
+
+    async def refresh(self, location_ids: List[int], days: int) -> Dict[str, int]:
+        """
+        Function. Refetch forecasts of locations regardless of freshness.
+        :param location_ids: location ids
+        :param days: days of forecast
+        :return: refresh statistics
+        """
+        stats: Dict[str, int] = dict.fromkeys(
+            ("seen", "warmed", "skipped", "failed", "upstream"), 0
+        )
+        stats["seen"] = len(location_ids)
+        async with self.forecast_cache() as cache:
+            await self._fetch(
+                cache, {cache.horizon(days): list(dict.fromkeys(location_ids))}, stats
+            )
+        return stats
+
+    async def _warm_batch(
+        self, cache: ForecastCache, batch: List[int], stats: Dict[str, int]
+    ) -> None:
+        fresh_until: float = time.time() + RUN_INTERVAL_SEC
+        stats["seen"] += len(batch)
+        found: Dict[int, CachedForecast | None] = await cache.read_many(batch)
+
+        due: Dict[int, List[int]] = defaultdict(list)
+        planned: int = 0
+        for location_id, cached in found.items():
+            if cached is not None and cached.stale_at > fresh_until:
+                stats["fresh"] += 1
+            elif stats["upstream"] + planned >= self.budget:
+                stats["skipped"] += 1
+            else:
+                planned += 1
+                due[cache.horizon(cached.days if cached else 0)].append(location_id)
+
+        await self._fetch(cache, due, stats, not_before=fresh_until)
+
+    async def _fetch(
+        self,
+        cache: ForecastCache,
+        due: Dict[int, List[int]],
+        stats: Dict[str, int],
+        not_before: float | None = None,
+    ) -> None:
+        semaphore: asyncio.Semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_chunk(days: int, chunk: List[int]) -> None:
+            async with semaphore:
+                if await cache.quota.is_low():
+                    stats["skipped"] += len(chunk)
+                    return
+                stats["upstream"] += len(chunk)
+                try:
+                    # Runs inside a worker: call the upstream directly rather
+                    # than queueing get_forecasts and blocking on its result.
+                    forecasts: Dict[str, Any] = await asyncio.to_thread(
+                        get_forecasts, chunk, days
+                    )
+                except Exception as exc:
+                    stats["failed"] += len(chunk)
+                    info_logger.error(
+                        f"Fetching forecasts of {len(chunk)} locations failed: {exc!r}"
+                    )
+                    return
+
+            for location_id in chunk:
+                forecast: Dict[str, Any] | None = forecasts.get(str(location_id))
+                if forecast is None:
+                    stats["failed"] += 1
+                    continue
+                await cache.write(location_id, forecast, days, not_before=not_before)
+                stats["warmed"] += 1
+
+        await asyncio.gather(
+            *(
+                fetch_chunk(days, location_ids[offset : offset + self.chunk_size])
+                for days, location_ids in due.items()
+                for offset in range(0, len(location_ids), self.chunk_size)
+            )
+        )
+
+
+@celery_app.task(name="run_tasks.warm_forecast_cache", ignore_result=True)
+def warm_forecast_cache() -> None:
+    """
+    Function. Beat entry point, warm followed locations' forecasts.
+    :return: None
+    """
+    stats: Dict[str, int] = asyncio.run(ForecastWarmer().run())
+    info_logger.info(f"Forecast cache warmed: {stats}")
+
+
+@celery_app.task(name="run_tasks.refresh_forecasts", ignore_result=True)
+def refresh_forecasts(location_ids: List[int], amount_of_days: int) -> None:
+    """
+    Function. Refresh cached forecasts of many locations with one message,
+    fetched in bulk requests and cached one by one.
+    :param location_ids: location ids
+    :param amount_of_days: days of forecast
+    :return: None
+    """
+    stats: Dict[str, int] = asyncio.run(
+        ForecastWarmer().refresh(location_ids, amount_of_days)
+    )
+    info_logger.info(f"Forecasts refreshed: {stats}")
@@ -9,19 +9,24 @@ import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from fastapi.responses import ORJSONResponse
 from fastapi_limiter import FastAPILimiter
-from prometheus_client import make_asgi_app
+from prometheus_client import REGISTRY, make_asgi_app
 from prometheus_fastapi_instrumentator import Instrumentator
 from redis import Redis
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import JSONResponse
 
 from app.api_v1.views import location_router
+from app.cache.forecast_cache import forecast_cache
+from app.celery_tasks.http_client import async_upstream_client
+from app.celery_tasks.queue_metrics import QueueDepthCollector
 from app.users.settings_router import settings_router
 from app.users.user_router import user_router
 from app.utils import settings
 from app.utils.auth import user_auth, AuthResponseMiddleware
 from app.utils.db_engine import db_engine
 from app.utils.limiter import error_callback
+from app.utils.redis_engine import pubsub_listener, redis_async_client
+from app.utils.retry import UpstreamError, upstream_status_code
 
 
 @asynccontextmanager
@@ -40,7 +45,12 @@ async def lifespan(app: FastAPI):  # pylint: disable=W0613, W0621
         redis=redis_connection,
         http_callback=error_callback,
     )
+    await pubsub_listener.start()
+    await forecast_cache.subscribe_invalidations()
     yield
+    await pubsub_listener.stop()
+    await async_upstream_client.aclose()
+    await redis_async_client.aclose()
     await db_engine.dispose()
     await FastAPILimiter.close()
 
@@ -54,6 +64,12 @@ app.include_router(
 )
 app.include_router(location_router, tags=["locations"])
 
+REGISTRY.register(
+    QueueDepthCollector(
+        Redis.from_url(settings.REDIS_LOCAL_CONN, socket_timeout=1),
+        [settings.task_queues.INTERACTIVE, settings.task_queues.BULK],
+    )
+)
 metrics_app = make_asgi_app()
 app.mount("/metrics", metrics_app)
 
@@ -82,6 +98,14 @@ async def error_handler(request: Request, exc: HTTPException):
     )
 
 
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    return ORJSONResponse(
+        status_code=upstream_status_code(exc),
+        content={"detail": "Weather service is unavailable.", "headers": None},
+    )
+
+
 @app.get("/", tags=["root"])
 def index():
     """
@@ -6,6 +6,8 @@ __all__ = (
     "Favorites",
     "Daily",
     "Hourly",
+    "Gazetteer",
+    "GazetteerQuery",
     "AbstractBaseModel",
 )
 
@@ -17,4 +19,5 @@ from .current import Current
 from .favorites import Favorites
 from .daily import Daily
 from .hourly import Hourly
+from .gazetteer import Gazetteer, GazetteerQuery
 from .base import AbstractBaseModel
@@ -0,0 +1,109 @@
+"""
+Module. Gazetteer of known weather API locations SQLAlchemy database models.
+"""
+
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import ARRAY, DateTime, Index, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import AbstractBaseModel
+from .tables import Tables
+
+
+class Gazetteer(AbstractBaseModel):
+    """
+    SQLAlchemy model for a location ever returned by the weather API search.
+    Attributes
+    ----------
+    id: int
+        weather API location ID
+    name: str
+        location name (String(100), nullable=False)
+    region: str
+        location region (String(100), nullable=False)
+    country: str
+        location country (String(100), nullable=False)
+    lat: float
+        latitude
+    lon: float
+        longitude
+    search_name: str
+        normalized name, trigram indexed for similarity and prefix search
+    hits: int
+        times the location was served from the gazetteer
+    first_seen_at: datetime
+        first time the weather API returned the location
+    last_seen_at: datetime
+        last time the weather API returned the location
+    """
+
+    __tablename__ = Tables.GAZETTEER
+    __table_args__ = (
+        Index(
+            "ix_gazetteer_search_name_trgm",
+            "search_name",
+            postgresql_using="gin",
+            postgresql_ops={"search_name": "gin_trgm_ops"},
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    region: Mapped[str] = mapped_column(String(100), nullable=False)
+    country: Mapped[str] = mapped_column(String(100), nullable=False)
+    lat: Mapped[float] = mapped_column(nullable=False)
+    lon: Mapped[float] = mapped_column(nullable=False)
+    search_name: Mapped[str] = mapped_column(String(100), nullable=False)
+    hits: Mapped[int] = mapped_column(default=0, server_default="0")
+    first_seen_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    last_seen_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__}("
+            f"id={self.id}, "
+            f"name={self.name}, "
+            f"region={self.region}, "
+            f"country={self.country}"
+            f")>"
+        )
+
+
+class GazetteerQuery(AbstractBaseModel):
+    """
+    SQLAlchemy model for a normalized search query answered by the weather API.
+    Attributes
+    ----------
+    query: str
+        normalized search query (String(200), unique)
+    location_ids: List[int]
+        gazetteer location IDs in weather API order
+    hits: int
+        times the query was answered from the gazetteer
+    searched_at: datetime
+        last time the query was sent to the weather API
+    """
+
+    __tablename__ = Tables.GAZETTEER_QUERIES
+
+    query: Mapped[str] = mapped_column(String(200), unique=True)
+    location_ids: Mapped[List[int]] = mapped_column(ARRAY(Integer), nullable=False)
+    hits: Mapped[int] = mapped_column(default=0, server_default="0")
+    searched_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__}("
+            f"query={self.query}, "
+            f"location_ids={self.location_ids}, "
+            f"hits={self.hits}"
+            f")>"
+        )
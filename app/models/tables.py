@@ -19,3 +19,5 @@ class Tables(StrEnum):
     CURRENT = "current"
     DAILY = "daily"
     FAVORITES = "favorites"
+    GAZETTEER = "gazetteer"
+    GAZETTEER_QUERIES = "gazetteer_queries"
@@ -2,9 +2,9 @@
 Module. Weather pydantic models.
 """
 
-from typing import Set, List
+from typing import Any, Dict, Set, List
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, field_validator
 
 from app.schemas.setting_schemas import (
     CurrentSettings,
@@ -436,6 +436,133 @@ class ForecastPublic(BaseModel):
     alerts: Alerts
 
 
+class ForecastError(BaseModel):
+    """
+    Class. Forecast of a location that could not be served in a batch.
+    Attributes
+    ---------
+    id: int
+        location id
+    status_code: int
+        HTTP status the location alone would have been answered with
+    detail: str
+        error description
+    """
+
+    model_config = ConfigDict()
+    id: int
+    status_code: int
+    detail: str
+
+
+class RoundedPressure(BaseModel):
+    """
+    Class. Rounds fractional upstream pressure to the integer pressure_mb
+    field of the model it is mixed into.
+    """
+
+    @field_validator("pressure_mb", mode="before", check_fields=False)
+    @classmethod
+    def round_pressure(cls, value: Any) -> Any:
+        """
+        Function. Round fractional pressure.
+        :param value: upstream value
+        :return: rounded value
+        """
+        return round(value) if isinstance(value, float) else value
+
+
+class CurrentWeatherDocument(RoundedPressure, CurrentWeatherPublic):
+    """
+    Class. Current weather of a canonical forecast document.
+    Attributes
+    ----------
+    last_updated_epoch: int | None = None
+        upstream update time, drives cache freshness
+    """
+
+    last_updated_epoch: int | None = None
+
+
+class HourlyForecastDocument(RoundedPressure, HourlyForecastPublic):
+    """
+    Class. Hourly forecast of a canonical forecast document.
+    Attributes
+    ----------
+    time_epoch: int
+        hour start epoch seconds
+    """
+
+    time_epoch: int
+
+
+class DailyForecastDocument(BaseModel):
+    """
+    Class. Forecast day of a canonical forecast document.
+    Attributes
+    ---------
+    date: str
+        date of forecast
+    day: DailyWeatherPublic
+        daily weather
+    astro: Astro
+        astro info
+    hour: List[HourlyForecastDocument]
+        hourly forecast of the day
+    """
+
+    date: str
+    day: DailyWeatherPublic
+    astro: Astro
+    hour: List[HourlyForecastDocument]
+
+
+class ForecastDaysDocument(BaseModel):
+    """
+    Class. Forecast days of a canonical forecast document.
+    Attributes
+    ---------
+    forecastday: List[DailyForecastDocument]
+        forecast days
+    """
+
+    forecastday: List[DailyForecastDocument]
+
+
+class ForecastDocument(BaseModel):
+    """
+    Class. Canonical forecast document: an upstream forecast validated once
+    at ingest, keeping only the fields responses are shaped from.
+    Attributes
+    ---------
+    location: Location
+        location info
+    current: CurrentWeatherDocument
+        current weather
+    forecast: ForecastDaysDocument
+        forecast days
+    alerts: Alerts
+        alerts
+    """
+
+    location: Location
+    current: CurrentWeatherDocument
+    forecast: ForecastDaysDocument
+    alerts: Alerts = Alerts()
+
+
+def normalize_forecast(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Function. Validate an upstream forecast once and trim it to a canonical
+    forecast document. Unused fields are dropped and values coerced to the
+    response types, so responses are shaped from it without validation.
+    :param payload: upstream forecast payload
+    :return: canonical forecast document
+    :raises ValidationError: malformed payload
+    """
+    return ForecastDocument.model_validate(payload).model_dump(exclude_none=True)
+
+
 def exclude_fields(
     current: CurrentSettings = None,
     daily: DailySettings = None,
@@ -5,6 +5,8 @@ __all__ = (
     "handling_interface_error",
     "settings",
     "encode_jwt",
+    "redis_async_client",
+    "pubsub_listener",
 )
 
 from .db_engine import db_engine
@@ -12,3 +14,4 @@ from .utils import to_json, handling_integrity_error
 from .utils import to_json, handling_interface_error
 from .settings import settings
 from .auth import encode_jwt
+from .redis_engine import redis_async_client, pubsub_listener
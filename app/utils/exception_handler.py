@@ -41,3 +41,8 @@ class DatabaseInterfaceError(HTTPException):
     def __init__(self, message: str):
         super().__init__(500, f"Database interface error. {message}")
         database_logger.error("Database interface error.")
+
+
+class GatewayTimeoutError(HTTPException):
+    def __init__(self, message: str):
+        super().__init__(504, message)
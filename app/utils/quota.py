@@ -0,0 +1,452 @@
+"""
+Module. Weather API plan quota and API key pool: a token bucket per key
+shared by all workers, with per-endpoint call costs, and quarantine of
+keys the weather API rejects.
+"""
+
+import hashlib
+import itertools
+import random
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple
+
+from prometheus_client import Counter, Gauge
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from app.logger.logging_handler import info_logger
+from app.utils.redis_engine import redis_async_client
+from app.utils.retry import QuotaExhaustedError
+from app.utils.settings import settings
+
+upstream_quota_spent: Counter = Counter(
+    "upstream_quota_spent_total",
+    "Weather API quota tokens spent.",
+    ["endpoint", "credential"],
+)
+upstream_quota_denied: Counter = Counter(
+    "upstream_quota_denied_total",
+    "Weather API calls not made because no healthy key had quota left.",
+    ["endpoint"],
+)
+upstream_quota_level: Gauge = Gauge(
+    "upstream_quota_level",
+    "Fraction of a weather API quota bucket left, as last seen by the process.",
+    ["credential"],
+)
+upstream_key_calls: Counter = Counter(
+    "upstream_key_calls_total",
+    "Weather API calls by key and outcome.",
+    ["credential", "outcome"],
+)
+upstream_key_quarantined: Counter = Counter(
+    "upstream_key_quarantined_total",
+    "Weather API keys quarantined, by rejecting status.",
+    ["credential", "status"],
+)
+
+# Refills by elapsed time and takes the cost only if it is all there.
+# KEYS[1] bucket; ARGV capacity, refill per ms, cost, now ms, expiry ms.
+TAKE_SCRIPT: str = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_ms')
+local capacity = tonumber(ARGV[1])
+local now = tonumber(ARGV[4])
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * tonumber(ARGV[2]))
+local taken = 0
+if tokens >= tonumber(ARGV[3]) then
+    tokens = tokens - tonumber(ARGV[3])
+    taken = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_ms', now)
+redis.call('PEXPIRE', KEYS[1], ARGV[5])
+return {taken, tostring(tokens)}
+"""
+
+
+def credential_id(token: str) -> str:
+    """
+    Function. Short stable id of an API key, safe for Redis keys, logs
+    and metric labels.
+    :param token: API key
+    :return: key id
+    """
+    return hashlib.sha256(token.encode()).hexdigest()[:8]
+
+
+def bucket_tokens(
+    tokens: bytes | None,
+    updated_ms: bytes | None,
+    capacity: float,
+    refill_per_ms: float,
+) -> float:
+    """
+    Function. Tokens in a bucket read from Redis, refilled up to now.
+    :param tokens: stored tokens, None for a new bucket
+    :param updated_ms: epoch milliseconds tokens were stored
+    :param capacity: bucket size
+    :param refill_per_ms: tokens added per millisecond
+    :return: tokens available now
+    """
+    if tokens is None or updated_ms is None:
+        return capacity
+    elapsed_ms: float = max(0.0, time.time() * 1000 - float(updated_ms))
+    return min(capacity, float(tokens) + elapsed_ms * refill_per_ms)
+
+
+class UpstreamQuota:
+    """
+    Class. Token bucket of one API key's calls kept in Redis. The bucket
+    refills at the plan's monthly rate and holds a burst of calls;
+    every call takes its endpoint's cost.
+    Attributes:
+        redis_connection (Redis): redis connection.
+        async_redis_connection (AsyncRedis): redis connection of the
+            asyncio execution mode.
+        name (str): id of the key the bucket belongs to.
+        capacity (float): bucket size in tokens.
+        refill_per_ms (float): tokens added per millisecond.
+        costs (Dict[str, int]): tokens per call by endpoint.
+        default_cost (int): tokens per call of other endpoints.
+        key (str): bucket key.
+    """
+
+    def __init__(
+        self,
+        redis_connection: Redis,
+        name: str,
+        async_redis_connection: AsyncRedis = redis_async_client,
+        calls_per_month: int = settings.upstream_quota.CALLS_PER_MONTH,
+        burst: int = settings.upstream_quota.BURST,
+        costs: Dict[str, int] = settings.upstream_quota.ENDPOINT_COSTS,
+        default_cost: int = settings.upstream_quota.DEFAULT_COST,
+        key_prefix: str = settings.upstream_quota.KEY,
+    ):
+        self.redis_connection = redis_connection
+        self.async_redis_connection = async_redis_connection
+        self.name = name
+        self.capacity = float(burst)
+        self.refill_per_ms = calls_per_month / (30 * 24 * 3600 * 1000)
+        self.costs = costs
+        self.default_cost = default_cost
+        self.key = f"{key_prefix}:{name}"
+        # Untouched long enough to refill completely, the bucket is dropped.
+        self.expiry_ms: int = int(self.capacity / self.refill_per_ms) + 1
+        self._take = self.redis_connection.register_script(TAKE_SCRIPT)
+        self._take_async = self.async_redis_connection.register_script(TAKE_SCRIPT)
+
+    def cost(self, endpoint: str) -> int:
+        """
+        Function. Tokens taken by a call of endpoint.
+        :param endpoint: endpoint path, e.g. "forecast.json"
+        :return: call cost
+        """
+        return self.costs.get(endpoint, self.default_cost)
+
+    def try_spend(self, endpoint: str, calls: int = 1) -> bool:
+        """
+        Function. Take the cost of calls from the bucket, all or nothing.
+        :param endpoint: endpoint path, e.g. "forecast.json"
+        :param calls: calls made, locations of a bulk request
+        :return: whether the calls are allowed
+        """
+        cost: int = self.cost(endpoint) * calls
+        taken, tokens = self._take(keys=[self.key], args=self._take_args(cost))
+        return self._spent(endpoint, cost, taken, tokens)
+
+    async def try_spend_async(self, endpoint: str, calls: int = 1) -> bool:
+        """
+        Function. Take the cost of calls from the bucket from the event loop.
+        :param endpoint: endpoint path, e.g. "forecast.json"
+        :param calls: calls made, locations of a bulk request
+        :return: whether the calls are allowed
+        """
+        cost: int = self.cost(endpoint) * calls
+        taken, tokens = await self._take_async(
+            keys=[self.key], args=self._take_args(cost)
+        )
+        return self._spent(endpoint, cost, taken, tokens)
+
+    def _take_args(self, cost: int) -> List[Any]:
+        return [
+            self.capacity,
+            self.refill_per_ms,
+            cost,
+            int(time.time() * 1000),
+            self.expiry_ms,
+        ]
+
+    def _spent(self, endpoint: str, cost: int, taken: int, tokens: bytes) -> bool:
+        upstream_quota_level.labels(self.name).set(float(tokens) / self.capacity)
+        if taken:
+            upstream_quota_spent.labels(endpoint, self.name).inc(cost)
+        return bool(taken)
+
+
+class Credential(NamedTuple):
+    """
+    Class. Pooled weather API key.
+    Attributes:
+        id (str): key id.
+        token (str): API key.
+        quota (UpstreamQuota): the key's quota bucket.
+    """
+
+    id: str
+    token: str
+    quota: UpstreamQuota
+
+
+class CredentialPool:
+    """
+    Class. Weather API keys shared by all workers. Calls are spread
+    round robin over keys that are not quarantined and have quota left.
+    A key answered with 401/403 or 429 is quarantined in Redis, so every
+    worker skips it until the quarantine ends.
+    Attributes:
+        redis_connection (Redis): redis connection.
+        async_redis_connection (AsyncRedis): redis connection of the
+            asyncio execution mode.
+        credentials (List[Credential]): pooled keys.
+        auth_quarantine_ms (int): quarantine after 401/403 in milliseconds.
+        rate_limit_quarantine_ms (int): quarantine after 429 in milliseconds.
+        key_prefix (str): quarantine keys prefix.
+    """
+
+    def __init__(
+        self,
+        redis_connection: Redis,
+        tokens: List[str],
+        async_redis_connection: AsyncRedis = redis_async_client,
+        auth_quarantine_sec: int = settings.credential_pool.AUTH_QUARANTINE_SEC,
+        rate_limit_quarantine_sec: int = (
+            settings.credential_pool.RATE_LIMIT_QUARANTINE_SEC
+        ),
+        key_prefix: str = "upstream_key",
+    ):
+        self.redis_connection = redis_connection
+        self.async_redis_connection = async_redis_connection
+        self.credentials = [
+            Credential(
+                credential_id(token),
+                token,
+                UpstreamQuota(
+                    redis_connection, credential_id(token), async_redis_connection
+                ),
+            )
+            for token in dict.fromkeys(tokens)
+        ]
+        self.auth_quarantine_ms = auth_quarantine_sec * 1000
+        self.rate_limit_quarantine_ms = rate_limit_quarantine_sec * 1000
+        self.key_prefix = key_prefix
+        # Processes start at random keys so they do not all hit the first one.
+        self._turns = itertools.count(random.randrange(len(self.credentials)))
+
+    def quarantine_key(self, credential: Credential) -> str:
+        """
+        Function. Quarantine flag key of a pooled key.
+        :param credential: pooled key
+        :return: redis key
+        """
+        return f"{self.key_prefix}:{credential.id}:quarantine"
+
+    def acquire(
+        self, endpoint: str, exclude: Iterable[str] = (), calls: int = 1
+    ) -> Credential:
+        """
+        Function. Pick the next healthy key and pay for the calls with it.
+        :param endpoint: endpoint path, e.g. "forecast.json"
+        :param exclude: ids of keys not to use
+        :param calls: calls made, locations of a bulk request
+        :return: pooled key
+        :raises QuotaExhaustedError: no healthy key has quota left
+        """
+        ordered: List[Credential] = self._ordered()
+        quarantined: List[bytes | None] = self.redis_connection.mget(
+            [self.quarantine_key(credential) for credential in ordered]
+        )
+        for credential in self._usable(ordered, quarantined, exclude):
+            if credential.quota.try_spend(endpoint, calls):
+                return credential
+        raise self._exhausted(endpoint)
+
+    async def acquire_async(
+        self, endpoint: str, exclude: Iterable[str] = (), calls: int = 1
+    ) -> Credential:
+        """
+        Function. Pick the next healthy key and pay for the calls with it
+        from the event loop.
+        :param endpoint: endpoint path, e.g. "forecast.json"
+        :param exclude: ids of keys not to use
+        :param calls: calls made, locations of a bulk request
+        :return: pooled key
+        :raises QuotaExhaustedError: no healthy key has quota left
+        """
+        ordered: List[Credential] = self._ordered()
+        quarantined: List[bytes | None] = await self.async_redis_connection.mget(
+            [self.quarantine_key(credential) for credential in ordered]
+        )
+        for credential in self._usable(ordered, quarantined, exclude):
+            if await credential.quota.try_spend_async(endpoint, calls):
+                return credential
+        raise self._exhausted(endpoint)
+
+    def record(self, credential: Credential, status_code: int | None) -> bool:
+        """
+        Function. Count a call outcome of a key, quarantining the key when
+        the weather API rejected it.
+        :param credential: pooled key
+        :param status_code: response status, None if no response came
+        :return: whether the key was quarantined
+        """
+        quarantine_ms: int | None = self._quarantine_ms(credential, status_code)
+        if quarantine_ms is None:
+            return False
+        self.redis_connection.set(
+            self.quarantine_key(credential), status_code, px=quarantine_ms
+        )
+        self._quarantined(credential, status_code, quarantine_ms)
+        return True
+
+    async def record_async(
+        self, credential: Credential, status_code: int | None
+    ) -> bool:
+        """
+        Function. Count a call outcome of a key from the event loop,
+        quarantining the key when the weather API rejected it.
+        :param credential: pooled key
+        :param status_code: response status, None if no response came
+        :return: whether the key was quarantined
+        """
+        quarantine_ms: int | None = self._quarantine_ms(credential, status_code)
+        if quarantine_ms is None:
+            return False
+        await self.async_redis_connection.set(
+            self.quarantine_key(credential), status_code, px=quarantine_ms
+        )
+        self._quarantined(credential, status_code, quarantine_ms)
+        return True
+
+    def _ordered(self) -> List[Credential]:
+        turn: int = next(self._turns) % len(self.credentials)
+        return self.credentials[turn:] + self.credentials[:turn]
+
+    @staticmethod
+    def _usable(
+        ordered: List[Credential],
+        quarantined: List[bytes | None],
+        exclude: Iterable[str],
+    ) -> List[Credential]:
+        excluded = set(exclude)
+        return [
+            credential
+            for credential, is_quarantined in zip(ordered, quarantined)
+            if not is_quarantined and credential.id not in excluded
+        ]
+
+    @staticmethod
+    def _exhausted(endpoint: str) -> QuotaExhaustedError:
+        upstream_quota_denied.labels(endpoint).inc()
+        info_logger.error(f"No weather API key can take a {endpoint} call.")
+        return QuotaExhaustedError(f"{endpoint}: no healthy API key has quota left")
+
+    def _quarantine_ms(
+        self, credential: Credential, status_code: int | None
+    ) -> int | None:
+        if status_code is None or status_code >= 500:
+            upstream_key_calls.labels(credential.id, "failed").inc()
+            return None
+        if status_code < 400:
+            upstream_key_calls.labels(credential.id, "ok").inc()
+            return None
+
+        upstream_key_calls.labels(credential.id, "rejected").inc()
+        if status_code in (401, 403):
+            return self.auth_quarantine_ms
+        if status_code == 429:
+            return self.rate_limit_quarantine_ms
+        return None
+
+    @staticmethod
+    def _quarantined(
+        credential: Credential, status_code: int, quarantine_ms: int
+    ) -> None:
+        upstream_key_quarantined.labels(credential.id, str(status_code)).inc()
+        info_logger.error(
+            f"Weather API key {credential.id} quarantined for {quarantine_ms} ms "
+            f"after HTTP {status_code}."
+        )
+
+
+class QuotaState:
+    """
+    Class. Read-only view of the pooled quota buckets for async callers
+    deciding whether to spend upstream calls. The level is re-read from
+    Redis at most once per check interval.
+    Attributes:
+        redis_connection (AsyncRedis): async redis connection.
+        bucket_keys (List[str]): quota bucket keys of the pooled keys.
+        burst (float): size of one bucket in tokens.
+        refill_per_ms (float): tokens added to a bucket per millisecond.
+        low_ratio (float): pool fraction below which callers degrade.
+        check_interval (float): seconds a read level is reused.
+    """
+
+    def __init__(
+        self,
+        redis_connection: AsyncRedis,
+        tokens: List[str] = settings.api_tokens,
+        calls_per_month: int = settings.upstream_quota.CALLS_PER_MONTH,
+        burst: int = settings.upstream_quota.BURST,
+        low_ratio: float = settings.upstream_quota.LOW_RATIO,
+        key_prefix: str = settings.upstream_quota.KEY,
+        check_interval: float = settings.upstream_quota.CHECK_INTERVAL_SEC,
+    ):
+        self.redis_connection = redis_connection
+        self.bucket_keys = [
+            f"{key_prefix}:{credential_id(token)}" for token in dict.fromkeys(tokens)
+        ]
+        self.burst = float(burst)
+        self.refill_per_ms = calls_per_month / (30 * 24 * 3600 * 1000)
+        self.low_ratio = low_ratio
+        self.check_interval = check_interval
+        self._level: float = 1.0
+        self._checked_at: float = 0.0
+
+    async def level(self) -> float:
+        """
+        Function. Fraction of all buckets left.
+        :return: level between 0 and 1
+        """
+        now: float = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                async with self.redis_connection.pipeline(transaction=False) as pipe:
+                    for key in self.bucket_keys:
+                        pipe.hmget(key, ["tokens", "updated_ms"])
+                    buckets: List[List[bytes | None]] = await pipe.execute()
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                # Unknown level: keep the last one rather than fail requests.
+                info_logger.error(f"Upstream quota read failed: {exc!r}")
+            else:
+                self._level = sum(
+                    bucket_tokens(*bucket, self.burst, self.refill_per_ms)
+                    for bucket in buckets
+                ) / (self.burst * len(buckets))
+                upstream_quota_level.labels("pool").set(self._level)
+        return self._level
+
+    async def is_low(self) -> bool:
+        """
+        Function. Whether upstream calls should be saved for requests that
+        cannot be answered from cache.
+        :return: low quota flag
+        """
+        return await self.level() < self.low_ratio
+
+
+credential_pool: CredentialPool = CredentialPool(
+    Redis(host=settings.REDIS_LOCALHOST), settings.api_tokens
+)
@@ -0,0 +1,122 @@
+"""
+Module. Async Redis connection and shared pub/sub listener.
+"""
+
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Set
+
+import redis.asyncio as aioredis
+from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.client import PubSub
+
+from app.logger.logging_handler import info_logger
+from app.utils.settings import settings
+
+
+class PubSubListener:
+    """
+    Class. One pub/sub connection per process, dispatching channel messages
+    to waiter queues and permanent handlers.
+    Attributes:
+        redis_connection (AsyncRedis): async redis connection.
+        poll_timeout (float): seconds between listener polls.
+    """
+
+    def __init__(self, redis_connection: AsyncRedis, poll_timeout: float = 1.0):
+        self.redis_connection = redis_connection
+        self.poll_timeout = poll_timeout
+        self._pubsub: PubSub | None = None
+        self._listener: asyncio.Task | None = None
+        self._waiters: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._handlers: Dict[str, List[Callable[[bytes], Any]]] = defaultdict(list)
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """
+        Function. Open pub/sub connection and start listening.
+        :return: None
+        """
+        self._pubsub = self.redis_connection.pubsub(ignore_subscribe_messages=True)
+        self._listener = asyncio.create_task(
+            self._pubsub.run(
+                exception_handler=self._on_error,
+                poll_timeout=self.poll_timeout,
+            )
+        )
+
+    async def stop(self) -> None:
+        """
+        Function. Stop listening and close pub/sub connection.
+        :return: None
+        """
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.aclose()
+
+    @asynccontextmanager
+    async def waiter(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        """
+        Function. Subscribe to a channel for the lifetime of the context.
+        The subscription is active before returning, so messages published
+        after entering the context are never missed.
+        :param channel: channel name
+        :return: queue receiving message data
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        async with self._lock:
+            await self._subscribe(channel)
+            self._waiters[channel].add(queue)
+        try:
+            yield queue
+        finally:
+            async with self._lock:
+                self._waiters[channel].discard(queue)
+                await self._unsubscribe(channel)
+
+    async def add_handler(
+        self, channel: str, handler: Callable[[bytes], Any | Awaitable[Any]]
+    ) -> None:
+        """
+        Function. Register permanent channel message handler.
+        :param channel: channel name
+        :param handler: callable receiving message data
+        :return: None
+        """
+        async with self._lock:
+            await self._subscribe(channel)
+            self._handlers[channel].append(handler)
+
+    async def _subscribe(self, channel: str) -> None:
+        if not self._waiters.get(channel) and not self._handlers.get(channel):
+            await self._pubsub.subscribe(**{channel: partial(self._dispatch, channel)})
+
+    async def _unsubscribe(self, channel: str) -> None:
+        if not self._waiters.get(channel) and not self._handlers.get(channel):
+            self._waiters.pop(channel, None)
+            self._handlers.pop(channel, None)
+            await self._pubsub.unsubscribe(channel)
+
+    async def _dispatch(self, channel: str, message: Dict[str, Any]) -> None:
+        for queue in self._waiters.get(channel, ()):
+            queue.put_nowait(message["data"])
+
+        for handler in self._handlers.get(channel, ()):
+            result = handler(message["data"])
+            if asyncio.iscoroutine(result):
+                await result
+
+    @staticmethod
+    def _on_error(exc: BaseException, pubsub: PubSub) -> None:
+        info_logger.error(f"Pub/sub listener error: {exc!r}")
+
+
+redis_async_client: AsyncRedis = aioredis.Redis(host=settings.REDIS_LOCALHOST)
+pubsub_listener: PubSubListener = PubSubListener(redis_async_client)
@@ -1,67 +1,480 @@
+"""
+Module. Upstream call policy: retries with backoff and jitter, a global
+retry budget and a circuit breaker.
+"""
+
+import asyncio
+import random
 import time
 from functools import wraps
+from typing import Any, Awaitable, Callable, List
 
 import celery
-from celery.exceptions import MaxRetriesExceededError, TimeoutError
-from fastapi import HTTPException
-from kombu.exceptions import OperationalError
+from prometheus_client import Counter
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
 from app.logger.logging_handler import info_logger
+from app.utils.redis_engine import redis_async_client
 from app.utils.settings import settings
 
+upstream_retries: Counter = Counter(
+    "upstream_retries_total",
+    "Upstream call retry decisions.",
+    ["outcome"],
+)
+circuit_transitions: Counter = Counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes.",
+    ["circuit", "state"],
+)
+
+
+class UpstreamError(Exception):
+    """
+    Class. Weather API call failed, retrying will not help.
+    """
+
+
+class UpstreamUnavailableError(UpstreamError):
+    """
+    Class. Weather API is unreachable or overloaded, the call may be retried.
+    """
+
+
+class UpstreamRateLimitedError(UpstreamUnavailableError):
+    """
+    Class. Every usable API key was rate limited. The keys are quarantined,
+    the service itself is up.
+    """
+
+
+class CircuitOpenError(UpstreamError):
+    """
+    Class. Weather API is considered down, the call was not made.
+    """
+
+
+class QuotaExhaustedError(UpstreamError):
+    """
+    Class. Weather API plan quota is spent, the call was not made.
+    """
+
+
+def upstream_status_code(exc: UpstreamError) -> int:
+    """
+    Function. HTTP status answered for a failed weather API call.
+    :param exc: upstream error
+    :return: 503 while the API is not called, 502 otherwise
+    """
+    return 503 if isinstance(exc, (CircuitOpenError, QuotaExhaustedError)) else 502
+
 
-class APIRetryHandler:
+class RetryPolicy:
     """
-    Class. API retry handler. Attempts to retry the request if an error occurs.
+    Class. Exponential backoff with full jitter.
     Attributes:
-        max_retries (int): The maximum number of retries.
-        delay(int): The delay in seconds between retries.
+        max_retries (int): retries after the first attempt.
+        base_delay (float): delay cap of the first retry in seconds.
+        max_delay (float): delay cap of any retry in seconds.
     """
 
     def __init__(
         self,
         max_retries: int = settings.retry.LIMIT,
-        delay: int = settings.retry.DELAY_SEC,
+        base_delay: float = settings.retry.BASE_DELAY_SEC,
+        max_delay: float = settings.retry.MAX_DELAY_SEC,
     ):
         self.max_retries = max_retries
-        self.delay = delay
+        self.base_delay = base_delay
+        self.max_delay = max_delay
 
-    def __call__(self, fn):
+    def backoff(self, retries: int) -> float:
+        """
+        Function. Delay before the next retry.
+        :param retries: retries made so far
+        :return: delay in seconds
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retries))
 
-        @wraps(fn)
-        def wrapper(*args, **kwargs):
-            attempts: int = 1
-            while attempts <= self.max_retries:
-                print(
-                    f"Trying {fn.__name__.upper()!r}... [attempts: {attempts}/{self.max_retries}]"
+
+class RetryBudget:
+    """
+    Class. Caps retries to a fraction of requests across all workers,
+    so an outage does not multiply upstream load.
+    Counted in Redis over the current and previous window.
+    Attributes:
+        redis_connection (Redis): redis connection.
+        async_redis_connection (AsyncRedis): redis connection of the
+            asyncio execution mode.
+        ratio (float): retries allowed per request.
+        min_retries (int): retries always allowed per window.
+        window (int): window length in seconds.
+        key (str): counters key prefix.
+    """
+
+    def __init__(
+        self,
+        redis_connection: Redis,
+        async_redis_connection: AsyncRedis = redis_async_client,
+        ratio: float = settings.retry.BUDGET_RATIO,
+        min_retries: int = settings.retry.BUDGET_MIN_RETRIES,
+        window: int = settings.retry.BUDGET_WINDOW_SEC,
+        key: str = "retry_budget",
+    ):
+        self.redis_connection = redis_connection
+        self.async_redis_connection = async_redis_connection
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self.key = key
+
+    def record_request(self) -> None:
+        """
+        Function. Count a first attempt.
+        :return: None
+        """
+        key: str = self._key("requests", self._window())
+        with self.redis_connection.pipeline(transaction=False) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, self.window * 2)
+            pipe.execute()
+
+    async def record_request_async(self) -> None:
+        """
+        Function. Count a first attempt from the event loop.
+        :return: None
+        """
+        key: str = self._key("requests", self._window())
+        async with self.async_redis_connection.pipeline(transaction=False) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, self.window * 2)
+            await pipe.execute()
+
+    def try_spend(self) -> bool:
+        """
+        Function. Take one retry from the budget.
+        :return: whether the retry is allowed
+        """
+        window: int = self._window()
+        with self.redis_connection.pipeline(transaction=False) as pipe:
+            pipe.mget(self._spend_keys(window))
+            pipe.incr(self._key("retries", window))
+            pipe.expire(self._key("retries", window), self.window * 2)
+            counts, retries, _ = pipe.execute()
+
+        if self._over_budget(counts, retries):
+            self.redis_connection.decr(self._key("retries", window))
+            return False
+        return True
+
+    async def try_spend_async(self) -> bool:
+        """
+        Function. Take one retry from the budget from the event loop.
+        :return: whether the retry is allowed
+        """
+        window: int = self._window()
+        async with self.async_redis_connection.pipeline(transaction=False) as pipe:
+            pipe.mget(self._spend_keys(window))
+            pipe.incr(self._key("retries", window))
+            pipe.expire(self._key("retries", window), self.window * 2)
+            counts, retries, _ = await pipe.execute()
+
+        if self._over_budget(counts, retries):
+            await self.async_redis_connection.decr(self._key("retries", window))
+            return False
+        return True
+
+    def _window(self) -> int:
+        return int(time.time() // self.window)
+
+    def _key(self, counter: str, window: int) -> str:
+        return f"{self.key}:{counter}:{window}"
+
+    def _spend_keys(self, window: int) -> List[str]:
+        return [
+            self._key("requests", window),
+            self._key("requests", window - 1),
+            self._key("retries", window - 1),
+        ]
+
+    def _over_budget(self, counts: List[Any], retries: int) -> bool:
+        requests, previous_requests, previous_retries = (
+            int(count or 0) for count in counts
+        )
+        allowed: float = max(
+            self.min_retries, self.ratio * (requests + previous_requests)
+        )
+        return retries + previous_retries > allowed
+
+
+class CircuitBreaker:
+    """
+    Class. Shared circuit breaker kept in Redis.
+    Closed: calls pass, failures within a window are counted. Open: calls
+    fail fast until the open period ends. Half-open: one probe call at a
+    time decides between closing and opening again.
+    Attributes:
+        redis_connection (Redis): redis connection.
+        async_redis_connection (AsyncRedis): redis connection of the
+            asyncio execution mode.
+        name (str): circuit name.
+        failure_threshold (int): failures within the window opening the circuit.
+        failure_window (int): failure counting window in seconds.
+        open_ms (int): open period in milliseconds.
+        probe_ms (int): half-open probe lease in milliseconds.
+    """
+
+    def __init__(
+        self,
+        redis_connection: Redis,
+        name: str,
+        async_redis_connection: AsyncRedis = redis_async_client,
+        failure_threshold: int = settings.circuit_breaker.FAILURE_THRESHOLD,
+        failure_window: int = settings.circuit_breaker.FAILURE_WINDOW_SEC,
+        open_sec: int = settings.circuit_breaker.OPEN_SEC,
+        probe_sec: int = settings.circuit_breaker.PROBE_SEC,
+    ):
+        self.redis_connection = redis_connection
+        self.async_redis_connection = async_redis_connection
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.open_ms = open_sec * 1000
+        self.probe_ms = probe_sec * 1000
+        self.key = f"circuit:{name}"
+
+    def allow(self) -> bool:
+        """
+        Function. Whether a call may be made now.
+        :return: allow flag
+        """
+        is_open, tripped = self.redis_connection.mget(
+            f"{self.key}:open", f"{self.key}:tripped"
+        )
+        if is_open:
+            return False
+        if tripped:
+            return bool(
+                self.redis_connection.set(
+                    f"{self.key}:probe", 1, nx=True, px=self.probe_ms
                 )
-                try:
-                    return fn(*args, **kwargs)
-                except ConnectionError as e:
-                    info_logger.info(f"Retrying {fn}, exception: {e}")
-                except Exception as e:
-                    info_logger.info(f"Retrying {fn}, exception: {e}")
+            )
+        return True
 
-                attempts += 1
-                time.sleep(self.delay)
+    async def allow_async(self) -> bool:
+        """
+        Function. Whether a call may be made now, from the event loop.
+        :return: allow flag
+        """
+        is_open, tripped = await self.async_redis_connection.mget(
+            f"{self.key}:open", f"{self.key}:tripped"
+        )
+        if is_open:
+            return False
+        if tripped:
+            return bool(
+                await self.async_redis_connection.set(
+                    f"{self.key}:probe", 1, nx=True, px=self.probe_ms
+                )
+            )
+        return True
 
-            raise HTTPException(status_code=502, detail="Too many retries.")
+    def record_success(self) -> None:
+        """
+        Function. Close the circuit after a successful call.
+        :return: None
+        """
+        with self.redis_connection.pipeline(transaction=False) as pipe:
+            self._close(pipe)
+            was_tripped, _ = pipe.execute()
+        self._closed(was_tripped)
 
-        return wrapper
+    async def record_success_async(self) -> None:
+        """
+        Function. Close the circuit after a successful call, from the event
+        loop.
+        :return: None
+        """
+        async with self.async_redis_connection.pipeline(transaction=False) as pipe:
+            self._close(pipe)
+            was_tripped, _ = await pipe.execute()
+        self._closed(was_tripped)
+
+    def record_failure(self) -> None:
+        """
+        Function. Count a failed call, open the circuit past the threshold
+        or when the half-open probe failed.
+        :return: None
+        """
+        if self.redis_connection.exists(f"{self.key}:tripped"):
+            self._open()
+            return
+
+        with self.redis_connection.pipeline(transaction=False) as pipe:
+            self._count_failure(pipe)
+            failures, _ = pipe.execute()
+        if failures >= self.failure_threshold:
+            self._open()
+
+    async def record_failure_async(self) -> None:
+        """
+        Function. Count a failed call from the event loop, open the circuit
+        past the threshold or when the half-open probe failed.
+        :return: None
+        """
+        if await self.async_redis_connection.exists(f"{self.key}:tripped"):
+            await self._open_async()
+            return
+
+        async with self.async_redis_connection.pipeline(transaction=False) as pipe:
+            self._count_failure(pipe)
+            failures, _ = await pipe.execute()
+        if failures >= self.failure_threshold:
+            await self._open_async()
+
+    def _close(self, pipe: Any) -> None:
+        pipe.delete(f"{self.key}:tripped")
+        pipe.delete(f"{self.key}:failures", f"{self.key}:probe")
+
+    def _closed(self, was_tripped: int) -> None:
+        if was_tripped:
+            circuit_transitions.labels(self.name, "closed").inc()
+            info_logger.info(f"Circuit {self.name!r} closed.")
 
+    def _count_failure(self, pipe: Any) -> None:
+        pipe.incr(f"{self.key}:failures")
+        pipe.expire(f"{self.key}:failures", self.failure_window, nx=True)
 
-class RetryTask(celery.Task):
+    def _trip(self, pipe: Any) -> None:
+        pipe.set(f"{self.key}:open", 1, px=self.open_ms)
+        pipe.set(f"{self.key}:tripped", 1)
+        pipe.delete(f"{self.key}:failures", f"{self.key}:probe")
+
+    def _opened(self) -> None:
+        circuit_transitions.labels(self.name, "open").inc()
+        info_logger.error(f"Circuit {self.name!r} open for {self.open_ms} ms.")
+
+    def _open(self) -> None:
+        with self.redis_connection.pipeline(transaction=False) as pipe:
+            self._trip(pipe)
+            pipe.execute()
+        self._opened()
+
+    async def _open_async(self) -> None:
+        async with self.async_redis_connection.pipeline(transaction=False) as pipe:
+            self._trip(pipe)
+            await pipe.execute()
+        self._opened()
+
+
+class UpstreamRetryHandler:
     """
-    Class. Inheritor of celery.Task class. Sets retry options.
+    Class. Applies the upstream call policy to a bound Celery task.
+    Retries are rescheduled with a countdown instead of sleeping, so
+    a failing call never holds a worker slot. A task called directly,
+    outside a worker, is not retried.
+    Attributes:
+        policy (RetryPolicy): retry limit and backoff.
+        budget (RetryBudget): global retry budget.
+        breaker (CircuitBreaker): upstream circuit breaker.
     """
 
-    autoretry_for = (
-        Exception,
-        ConnectionError,
-        MaxRetriesExceededError,
-        TimeoutError,
-        OperationalError,
-    )
-    retry_kwargs = {"max_retries": 5}
-    retry_backoff = 1
-    retry_jitter = True
+    def __init__(
+        self, policy: RetryPolicy, budget: RetryBudget, breaker: CircuitBreaker
+    ):
+        self.policy = policy
+        self.budget = budget
+        self.breaker = breaker
+
+    def __call__(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+
+        @wraps(fn)
+        def wrapper(task: celery.Task, *args, **kwargs):
+            if not self.breaker.allow():
+                raise CircuitOpenError("Weather service is unavailable.")
+
+            retries: int = task.request.retries or 0
+            if retries == 0:
+                self.budget.record_request()
+
+            try:
+                result: Any = fn(*args, **kwargs)
+            except QuotaExhaustedError:
+                # Nothing was sent, the call says nothing about the service.
+                raise
+            except UpstreamUnavailableError as exc:
+                if not isinstance(exc, UpstreamRateLimitedError):
+                    # Rate limits are per key and handled by the key pool.
+                    self.breaker.record_failure()
+                if retries >= self.policy.max_retries:
+                    upstream_retries.labels("exhausted").inc()
+                    raise
+                if not self.budget.try_spend():
+                    upstream_retries.labels("over_budget").inc()
+                    raise
+                upstream_retries.labels("scheduled").inc()
+                info_logger.info(f"Retrying {fn.__name__!r}, exception: {exc!r}")
+                raise task.retry(
+                    exc=exc,
+                    countdown=self.policy.backoff(retries),
+                    max_retries=self.policy.max_retries,
+                )
+            except UpstreamError:
+                # The service answered, only this request was rejected.
+                self.breaker.record_success()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+        return wrapper
+
+    async def call_async(self, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Function. Apply the policy to a coroutine run by the asyncio execution
+        mode. There is no worker to reschedule on, so retries wait on the
+        event loop. The breaker is asked before every attempt, so a circuit
+        opened meanwhile stops the remaining retries.
+        :param fn: upstream coroutine function
+        :param args: coroutine arguments
+        :return: coroutine result
+        """
+        retries: int = 0
+        while True:
+            if not await self.breaker.allow_async():
+                raise CircuitOpenError("Weather service is unavailable.")
+            if retries == 0:
+                await self.budget.record_request_async()
+            try:
+                result: Any = await fn(*args)
+            except QuotaExhaustedError:
+                raise
+            except UpstreamUnavailableError as exc:
+                if not isinstance(exc, UpstreamRateLimitedError):
+                    await self.breaker.record_failure_async()
+                if retries >= self.policy.max_retries:
+                    upstream_retries.labels("exhausted").inc()
+                    raise
+                if not await self.budget.try_spend_async():
+                    upstream_retries.labels("over_budget").inc()
+                    raise
+                upstream_retries.labels("scheduled").inc()
+                info_logger.info(f"Retrying {fn.__name__!r}, exception: {exc!r}")
+                await asyncio.sleep(self.policy.backoff(retries))
+                retries += 1
+                continue
+            except UpstreamError:
+                await self.breaker.record_success_async()
+                raise
+
+            await self.breaker.record_success_async()
+            return result
+
+
+redis_connection: Redis = Redis(host=settings.REDIS_LOCALHOST)
+upstream_retry: UpstreamRetryHandler = UpstreamRetryHandler(
+    RetryPolicy(),
+    RetryBudget(redis_connection),
+    CircuitBreaker(redis_connection, "weatherapi"),
+)
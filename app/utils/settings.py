@@ -3,6 +3,7 @@ Module. Create pydantic app settings.
 """
 
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -11,8 +12,136 @@ BASE_DIR = Path(__file__).parent
 
 
 class APIRetrySettings(BaseModel):
-    LIMIT: int = 5
-    DELAY_SEC: int = 3
+    # Retries after the first attempt, each rescheduled with full jitter.
+    LIMIT: int = 3
+    BASE_DELAY_SEC: float = 1.0
+    MAX_DELAY_SEC: float = 10.0
+    # Retries allowed per request over the last two windows, fleet-wide.
+    BUDGET_RATIO: float = 0.2
+    BUDGET_MIN_RETRIES: int = 10
+    BUDGET_WINDOW_SEC: int = 60
+
+
+class CircuitBreakerOptions(BaseModel):
+    FAILURE_THRESHOLD: int = 10
+    FAILURE_WINDOW_SEC: int = 30
+    OPEN_SEC: int = 30
+    PROBE_SEC: int = 10
+
+
+class UpstreamOptions(BaseModel):
+    BASE_URL: str = "https://api.weatherapi.com/v1"
+    CONNECT_TIMEOUT_SEC: float = 3.0
+    READ_TIMEOUT_SEC: float = 10.0
+    MAX_CONNECTIONS: int = 20
+    MAX_KEEPALIVE: int = 10
+    KEEPALIVE_EXPIRY_SEC: float = 60.0
+    # Needs the h2 package, falls back to HTTP/1.1 without it.
+    HTTP2: bool = False
+    # Provider limit of locations in one bulk request.
+    BULK_MAX_LOCATIONS: int = 50
+
+
+class UpstreamQuotaOptions(BaseModel):
+    KEY: str = "upstream_quota"
+    # Plan calls of each API key, refilled evenly over 30 days.
+    CALLS_PER_MONTH: int = 1_000_000
+    BURST: int = 5000
+    # Tokens taken per call, the plan counts every call as one.
+    ENDPOINT_COSTS: dict[str, int] = {
+        "search.json": 1,
+        "current.json": 1,
+        "forecast.json": 1,
+    }
+    DEFAULT_COST: int = 1
+    # Below this bucket fraction cached data is served instead of refreshed
+    # and warmers pause.
+    LOW_RATIO: float = 0.2
+    CHECK_INTERVAL_SEC: float = 1.0
+
+
+class CredentialPoolOptions(BaseModel):
+    # Keys rejected as invalid or forbidden wait for an operator to notice.
+    AUTH_QUARANTINE_SEC: int = 3600
+    RATE_LIMIT_QUARANTINE_SEC: int = 60
+
+
+class TaskQueueOptions(BaseModel):
+    # User-facing fetches, served by their own worker pool.
+    INTERACTIVE: str = "interactive"
+    # Warming and batch refreshes, and any task without a route.
+    BULK: str = "bulk"
+
+
+class TaskExecutionOptions(BaseModel):
+    # "celery": upstream tasks run in Celery worker pools. "asyncio":
+    # location_by_name, get_forecast and get_current_weather run as
+    # coroutines in the process awaiting them, without a broker round trip.
+    MODE: Literal["celery", "asyncio"] = "celery"
+    ASYNC_MAX_IN_FLIGHT: int = 500
+    ASYNC_MAX_CONNECTIONS: int = 200
+
+
+class TaskResultOptions(BaseModel):
+    TIMEOUT_SEC: int = 30
+
+
+class ForecastCacheOptions(BaseModel):
+    # Entries are canonical forecast documents, raw payloads were cached
+    # under "forecast" and are never read back.
+    KEY_PREFIX: str = "forecast:doc"
+    LEASE_MS: int = 35_000
+    WAIT_TIMEOUT_SEC: int = 40
+    INVALIDATION_CHANNEL: str = "forecast:invalidate"
+    LOCAL_MAX_SIZE: int = 1024
+    LOCAL_MAX_TTL_SEC: int = 300
+    STALE_GRACE_SEC: int = 600
+    # Stale forecasts are kept this long to answer while the upstream fails.
+    STALE_IF_ERROR_SEC: int = 6 * 3600
+    SHAPED_MAX_SIZE: int = 4096
+    CODEC: str = "orjson-zlib"
+    # Written instead when the CODEC package is not installed.
+    FALLBACK_CODEC: str = "json-zlib"
+    # Horizon fetched on every load, smaller day counts are sliced from it.
+    MAX_DAYS: int = 3
+    # Longest forecast the weather API serves, bounds requested days.
+    UPSTREAM_MAX_DAYS: int = 14
+    # Forecasts stay fresh until the provider's next expected update.
+    UPSTREAM_INTERVAL_SEC: int = 900
+    MIN_FRESH_SEC: int = 300
+    MAX_FRESH_SEC: int = 3600
+    JITTER_SEC: int = 180
+    # Locations allowed in one batch forecast request.
+    BATCH_MAX_IDS: int = 50
+
+
+class SearchCacheOptions(BaseModel):
+    KEY_PREFIX: str = "search"
+    TTL_SEC: int = 7 * 24 * 3600
+    EMPTY_TTL_SEC: int = 3600
+    # Search query aliases, matched after case, accent and whitespace folding.
+    ALIASES: dict[str, str] = {
+        "SPb": "Saint Petersburg",
+        "Piter": "Saint Petersburg",
+        "NYC": "New York",
+        "LA": "Los Angeles",
+        "SF": "San Francisco",
+        "DC": "Washington",
+    }
+    # Opt-in trigram similarity at which gazetteer names answer a query never
+    # searched upstream. Such an answer is cached like an upstream one and may
+    # miss other places of that name. None sends unseen queries upstream.
+    GAZETTEER_MIN_SIMILARITY: float | None = None
+    GAZETTEER_MAX_RESULTS: int = 10
+
+
+class CacheWarmerOptions(BaseModel):
+    # Minutes before each :00/:30 boundary the warmer runs.
+    LEAD_MIN: int = 5
+    BATCH_SIZE: int = 200
+    CONCURRENCY: int = 8
+    # Upstream forecast calls allowed per run.
+    UPSTREAM_BUDGET: int = 500
 
 
 class LimiterOptions(BaseModel):
@@ -69,6 +198,11 @@ class Settings(BaseSettings):
     DB_PASSWORD: str
     DB_HOST: str
     API_TOKEN: str
+    # Comma separated weather API keys pooled together, API_TOKEN if empty.
+    API_TOKENS: str = ""
+    # Weather API base url override, e.g. the offline stand-in
+    # http://localhost:8765/v1, upstream.BASE_URL if empty.
+    UPSTREAM_BASE_URL: str = ""
 
     REDIS_LOCALHOST: str = "localhost"
     REDIS_DOCKERHOST: str = "redis"
@@ -85,6 +219,26 @@ class Settings(BaseSettings):
 
     retry: APIRetrySettings = APIRetrySettings()
 
+    circuit_breaker: CircuitBreakerOptions = CircuitBreakerOptions()
+
+    upstream: UpstreamOptions = UpstreamOptions()
+
+    upstream_quota: UpstreamQuotaOptions = UpstreamQuotaOptions()
+
+    credential_pool: CredentialPoolOptions = CredentialPoolOptions()
+
+    task_queues: TaskQueueOptions = TaskQueueOptions()
+
+    task_execution: TaskExecutionOptions = TaskExecutionOptions()
+
+    task_result: TaskResultOptions = TaskResultOptions()
+
+    forecast_cache: ForecastCacheOptions = ForecastCacheOptions()
+
+    cache_warmer: CacheWarmerOptions = CacheWarmerOptions()
+
+    search_cache: SearchCacheOptions = SearchCacheOptions()
+
     @property
     def db_conn(self) -> str:
         """
@@ -101,6 +255,25 @@ class Settings(BaseSettings):
         """
         return self.API_TOKEN
 
+    @property
+    def api_tokens(self) -> list[str]:
+        """
+        Function. pooled api tokens
+        :return: api tokens
+        """
+        tokens: list[str] = [
+            token.strip() for token in self.API_TOKENS.split(",") if token.strip()
+        ]
+        return tokens or [self.API_TOKEN]
+
+    @property
+    def upstream_base_url(self) -> str:
+        """
+        Function. weather API base url
+        :return: base url
+        """
+        return self.UPSTREAM_BASE_URL or self.upstream.BASE_URL
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 
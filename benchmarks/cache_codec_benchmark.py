@@ -0,0 +1,64 @@
+"""
+Module. Bytes per key and encode/decode time of forecast cache codecs.
+
+Run from the project root:
+    python -m benchmarks.cache_codec_benchmark [path/to/forecast.json]
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from app.cache.codec import CODECS
+
+FIXTURE: Path = Path(__file__).parent / "fixtures" / "forecast_3d.json"
+ROUNDS: int = 200
+
+
+def timed(fn: Callable[[], Any], rounds: int = ROUNDS) -> float:
+    """
+    Function. Mean call time in microseconds.
+    :param fn: callable to time
+    :param rounds: number of calls
+    :return: mean time in microseconds
+    """
+    start: float = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1_000_000
+
+
+def main(fixture: Path = FIXTURE) -> None:
+    """
+    Function. Print a codec comparison table.
+    :param fixture: forecast.json payload
+    :return: None
+    """
+    forecast: Dict[str, Any] = json.loads(fixture.read_text())
+    entry: Dict[str, Any] = {
+        "forecast": forecast,
+        "fetched_at": time.time(),
+        "stale_at": time.time(),
+    }
+
+    legacy: bytes = json.dumps(entry).encode()
+    print(f"{'codec':<16}{'bytes':>10}{'ratio':>8}{'encode us':>12}{'decode us':>12}")
+    print(
+        f"{'json (legacy)':<16}{len(legacy):>10}{1:>8.2f}"
+        f"{timed(lambda: json.dumps(entry).encode()):>12.0f}"
+        f"{timed(lambda: json.loads(legacy)):>12.0f}"
+    )
+
+    for codec in CODECS.values():
+        encoded: bytes = codec.encode(entry)
+        print(
+            f"{codec.name:<16}{len(encoded):>10}{len(legacy) / len(encoded):>8.2f}"
+            f"{timed(lambda: codec.encode(entry)):>12.0f}"
+            f"{timed(lambda: codec.decode(encoded)):>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else FIXTURE)
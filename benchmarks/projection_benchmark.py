@@ -0,0 +1,173 @@
+"""
+Module. Forecast shaping time of model validation of upstream payloads
+against compiled projection plans over canonical forecast documents,
+whole and with a sparse fieldset, over a 14 day forecast with a 336 hour
+window.
+
+Run from the project root:
+    python -m benchmarks.projection_benchmark [units]
+"""
+
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Set
+
+from pydantic_core import to_json
+
+from app.api_v1.projection import _compile_plan, parse_fields, projection_plan
+from app.schemas.setting_schemas import CurrentSettings, DailySettings, HourlySettings
+from app.schemas.weather_schemas import (
+    Astro,
+    CurrentWeatherBritish,
+    CurrentWeatherMetric,
+    CurrentWeatherPublic,
+    DailyForecastPublic,
+    DailyWeatherBritish,
+    DailyWeatherMetric,
+    DailyWeatherPublic,
+    ForecastPublic,
+    HourlyForecastPublic,
+    HourlyWeatherBritish,
+    HourlyWeatherMetric,
+    exclude_fields,
+    normalize_forecast,
+)
+from benchmarks.weatherapi_stub import MAX_DAYS, Fixtures
+
+ROUNDS: int = 50
+HOURS: int = MAX_DAYS * 24
+SPARSE_FIELDS: str = "current.temp,forecasthour.temp,forecasthour.condition"
+
+
+def timed(fn: Callable[[], Any], rounds: int = ROUNDS) -> float:
+    """
+    Function. Mean call time in microseconds.
+    :param fn: callable to time
+    :param rounds: number of calls
+    :return: mean time in microseconds
+    """
+    start: float = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1_000_000
+
+
+def validated(
+    forecast: Dict[str, Any],
+    units: str,
+    current_settings: CurrentSettings,
+    daily_settings: DailySettings,
+    hourly_settings: HourlySettings,
+) -> bytes:
+    """
+    Function. Shaping by validating every section into its units model,
+    dumping it and validating the dump into the public model.
+    :param forecast: forecast payload
+    :param units: "C" for metric, British otherwise
+    :param current_settings: current weather settings
+    :param daily_settings: daily weather settings
+    :param hourly_settings: hourly weather settings
+    :return: encoded ForecastPublic
+    """
+    metric: bool = units == "C"
+    current_exclude: Set[str] = exclude_fields(current=current_settings)
+    daily_exclude: Set[str] = exclude_fields(daily=daily_settings)
+    hourly_exclude: Set[str] = exclude_fields(hourly=hourly_settings)
+
+    current_model = CurrentWeatherMetric if metric else CurrentWeatherBritish
+    daily_model = DailyWeatherMetric if metric else DailyWeatherBritish
+    hourly_model = HourlyWeatherMetric if metric else HourlyWeatherBritish
+
+    forecast_days = []
+    hours = []
+    for forecast_day in forecast["forecast"]["forecastday"]:
+        day: Dict[str, Any] = {
+            "date": forecast_day["date"],
+            "day": DailyWeatherPublic.model_validate(
+                daily_model(**forecast_day["day"]).model_dump(exclude=daily_exclude)
+            ),
+            "astro": Astro.model_validate(forecast_day["astro"]),
+        }
+        if "astro" in daily_exclude:
+            del day["astro"]
+        forecast_days.append(DailyForecastPublic.model_validate(day))
+        hours.extend(forecast_day["hour"])
+
+    return (
+        ForecastPublic.model_validate(
+            {
+                "location": forecast["location"],
+                "current": CurrentWeatherPublic.model_validate(
+                    current_model(**forecast["current"]).model_dump(
+                        exclude=current_exclude
+                    )
+                ),
+                "forecast": {
+                    "forecastday": forecast_days,
+                    "forecasthour": [
+                        HourlyForecastPublic.model_validate(
+                            hourly_model(**hour).model_dump(exclude=hourly_exclude)
+                        )
+                        for hour in hours[:HOURS]
+                    ],
+                },
+                "alerts": forecast["alerts"],
+            }
+        )
+        .model_dump_json(exclude_none=True)
+        .encode()
+    )
+
+
+def main(units: str = "F") -> None:
+    """
+    Function. Print a shaping comparison table.
+    :param units: "C" for metric, British otherwise
+    :return: None
+    """
+    forecast: Dict[str, Any] = Fixtures().forecast_answer(
+        1, MAX_DAYS, datetime.now(timezone.utc)
+    )
+    document: Dict[str, Any] = normalize_forecast(forecast)
+    current_settings = CurrentSettings(visibility=True, humidity=True)
+    daily_settings = DailySettings(visibility=True, humidity=True, astro=True)
+    hourly_settings = HourlySettings(visibility=True, humidity=True, pressure=True)
+
+    def compiled() -> bytes:
+        plan = projection_plan(units, current_settings, daily_settings, hourly_settings)
+        return to_json(plan.shape(document, MAX_DAYS, 0, HOURS))
+
+    def sparse() -> bytes:
+        plan = projection_plan(
+            units,
+            current_settings,
+            daily_settings,
+            hourly_settings,
+            parse_fields(SPARSE_FIELDS),
+        )
+        return to_json(plan.shape(document, MAX_DAYS, 0, HOURS))
+
+    def models() -> bytes:
+        return validated(
+            forecast, units, current_settings, daily_settings, hourly_settings
+        )
+
+    def compile_cold() -> None:
+        _compile_plan.cache_clear()
+        projection_plan(units, current_settings, daily_settings, hourly_settings)
+
+    print(f"{MAX_DAYS} days, {HOURS} hours, units {units}")
+    print(f"{'shaping':<22}{'bytes':>10}{'us':>10}")
+    print(f"{'validated models':<22}{len(models()):>10}{timed(models):>10.0f}")
+    print(f"{'projection plan':<22}{len(compiled()):>10}{timed(compiled):>10.0f}")
+    print(f"{'sparse fieldset':<22}{len(sparse()):>10}{timed(sparse):>10.0f}")
+    print(f"{'plan compile (cold)':<22}{'':>10}{timed(compile_cold):>10.0f}")
+    print(
+        f"{'ingest (once)':<22}{len(to_json(document)):>10}"
+        f"{timed(lambda: normalize_forecast(forecast)):>10.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,173 @@
+"""
+Module. Throughput and memory of the two task execution modes against the
+offline weather API stand-in answering after a fixed latency: a prefork pool of
+processes making one call at a time, and a single process running
+concurrent coroutines.
+
+Needs the redis of the credential pool. Run from the project root:
+    python -m benchmarks.task_execution_benchmark [processes] [coroutines]
+"""
+
+import asyncio
+import multiprocessing
+import resource
+import sys
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+import uvicorn
+
+from app.celery_tasks.http_client import AsyncUpstreamClient, UpstreamClient
+from app.celery_tasks.tasks import forecast_request
+from app.utils.quota import Credential, CredentialPool, UpstreamQuota
+from app.utils.retry import redis_connection
+from benchmarks.weatherapi_stub import StubOptions, WeatherApiStub
+
+HOST: str = "127.0.0.1"
+PORT: int = 8765
+LATENCY_SEC: float = 0.1
+DURATION_SEC: float = 10.0
+
+
+def stub_server(latency: float = LATENCY_SEC) -> uvicorn.Server:
+    """
+    Function. Start a weather API stand-in in a background thread.
+    :param latency: seconds before every answer
+    :return: running server
+    """
+    server = uvicorn.Server(
+        uvicorn.Config(
+            WeatherApiStub(StubOptions(latency_ms=latency * 1000)).app(),
+            host=HOST,
+            port=PORT,
+            log_level="warning",
+        )
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def benchmark_credentials() -> CredentialPool:
+    """
+    Function. Key pool of a stand-in key with a bucket too large to run
+    out, so the benchmark never touches the quota of real keys.
+    :return: credential pool
+    """
+    pool = CredentialPool(redis_connection, ["benchmark"])
+    pool.credentials = [
+        Credential(
+            credential.id,
+            credential.token,
+            UpstreamQuota(redis_connection, credential.id, burst=10**9),
+        )
+        for credential in pool.credentials
+    ]
+    return pool
+
+
+def max_rss_mb() -> float:
+    """
+    Function. Peak resident memory of this process.
+    :return: megabytes
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def prefork_process(duration: float) -> Tuple[int, float]:
+    """
+    Function. One prefork worker process: sequential calls until the
+    deadline.
+    :param duration: seconds to run
+    :return: calls made and peak memory in megabytes
+    """
+    client = UpstreamClient(
+        credentials=benchmark_credentials(),
+        base_url=f"http://{HOST}:{PORT}/v1",
+        http2=False,
+    )
+    calls: int = 0
+    deadline: float = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        client.get(*forecast_request(calls, 3))
+        calls += 1
+    client.close()
+    return calls, max_rss_mb()
+
+
+def asyncio_process(coroutines: int, duration: float) -> Tuple[int, float]:
+    """
+    Function. One asyncio mode process: concurrent calls until the
+    deadline.
+    :param coroutines: calls in flight
+    :param duration: seconds to run
+    :return: calls made and peak memory in megabytes
+    """
+    client = AsyncUpstreamClient(
+        credentials=benchmark_credentials(),
+        base_url=f"http://{HOST}:{PORT}/v1",
+        max_connections=coroutines,
+        max_keepalive=coroutines,
+        http2=False,
+    )
+    calls: Dict[str, int] = {"made": 0}
+
+    async def caller(deadline: float) -> None:
+        while asyncio.get_running_loop().time() < deadline:
+            await client.get(*forecast_request(calls["made"], 3))
+            calls["made"] += 1
+
+    async def run() -> None:
+        deadline: float = asyncio.get_running_loop().time() + duration
+        await asyncio.gather(*[caller(deadline) for _ in range(coroutines)])
+        await client.aclose()
+
+    asyncio.run(run())
+    return calls["made"], max_rss_mb()
+
+
+def report(mode: str, results: Any, duration: float) -> None:
+    """
+    Function. Print one row of the comparison table.
+    :param mode: execution mode description
+    :param results: calls and peak memory of every process
+    :param duration: seconds run
+    :return: None
+    """
+    calls: int = sum(result[0] for result in results)
+    memory: float = sum(result[1] for result in results)
+    print(
+        f"{mode:<22}{calls / duration:>10.0f}{memory:>10.0f}"
+        f"{calls / duration / memory:>12.2f}"
+    )
+
+
+def main(processes: int = 8, coroutines: int = 200) -> None:
+    """
+    Function. Print an execution mode comparison table.
+    :param processes: prefork pool size
+    :param coroutines: calls in flight of the asyncio process
+    :return: None
+    """
+    server: uvicorn.Server = stub_server()
+    context = multiprocessing.get_context("spawn")
+    print(f"{'mode':<22}{'calls/s':>10}{'RSS MB':>10}{'calls/s/MB':>12}")
+    with context.Pool(processes) as pool:
+        report(
+            f"prefork x{processes}",
+            pool.map(prefork_process, [DURATION_SEC] * processes),
+            DURATION_SEC,
+        )
+    with context.Pool(1) as pool:
+        report(
+            f"asyncio x1, {coroutines} tasks",
+            [pool.apply(asyncio_process, (coroutines, DURATION_SEC))],
+            DURATION_SEC,
+        )
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,527 @@
+"""
+Module. Offline stand-in of the weather API serving search.json,
+forecast.json and current.json, single and bulk, from fixtures.
+Any location id and day count is answered: unknown ids get a location
+derived from a fixture one and every day is a fixture day moved to its
+date with a per location temperature shift.
+
+The shipped forecast_3d.json is synthetic: Berlin shaped, in the weather
+API format, with imperial values converted from the metric ones. The
+record command replaces it with a real answer. Latency and failures are
+configurable, so the forecast path can be load tested and profiled
+without spending quota.
+
+Run from the project root and point the app at it with
+UPSTREAM_BASE_URL=http://localhost:8765/v1:
+    python -m benchmarks.weatherapi_stub serve --latency lognormal --latency-ms 80
+    python -m benchmarks.weatherapi_stub record <api key> [location]
+"""
+
+import argparse
+import asyncio
+import copy
+import random
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Tuple
+
+import httpx
+import orjson
+import uvicorn
+from pydantic import BaseModel
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+FIXTURES: Path = Path(__file__).parent / "fixtures"
+MAX_DAYS: int = 14
+# Ids of synthesized search results, above weather API ids and below 2**31.
+SYNTHETIC_ID_BASE: int = 100_000_000
+
+
+class StubOptions(BaseModel):
+    """
+    Class. Stand-in behaviour.
+    Attributes:
+        latency (str): "fixed", "uniform" or "lognormal" answer delay.
+        latency_ms (float): fixed delay, uniform mean or lognormal median.
+        latency_spread (float): uniform half width as a fraction of
+            latency_ms, or lognormal sigma.
+        error_rate (float): fraction of calls answered with 503.
+        rate_limit_rate (float): fraction of calls answered with 429.
+        stall_rate (float): fraction of calls answered after stall_sec,
+            past client read timeouts.
+        stall_sec (float): delay of stalled calls.
+        invalid_keys (List[str]): keys answered with 401.
+        seed (int | None): random seed of delays and failures.
+    """
+
+    latency: Literal["fixed", "uniform", "lognormal"] = "fixed"
+    latency_ms: float = 50.0
+    latency_spread: float = 0.5
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    stall_rate: float = 0.0
+    stall_sec: float = 30.0
+    invalid_keys: List[str] = []
+    seed: int | None = None
+
+
+class StubError(Exception):
+    """
+    Class. Weather API error answer.
+    Attributes:
+        status_code (int): HTTP status.
+        code (int): weather API error code.
+        message (str): error message.
+    """
+
+    def __init__(self, status_code: int, code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.message = message
+
+    def body(self) -> Dict[str, Any]:
+        """
+        Function. Error body in weather API format.
+        :return: error body
+        """
+        return {"error": {"code": self.code, "message": self.message}}
+
+
+NO_LOCATION: StubError = StubError(400, 1006, "No matching location found.")
+
+
+def shifted(values: Dict[str, Any], shift: float) -> Dict[str, Any]:
+    """
+    Function. Copy of a day, hour or current block with every temperature
+    moved by shift degrees Celsius.
+    :param values: weather values
+    :param shift: degrees Celsius
+    :return: shifted weather values
+    """
+    result: Dict[str, Any] = dict(values)
+    for key, value in values.items():
+        if key.endswith("_c") and isinstance(value, (int, float)):
+            celsius: float = round(value + shift, 1)
+            result[key] = celsius
+            result[f"{key[:-2]}_f"] = round(celsius * 9 / 5 + 32, 1)
+    return result
+
+
+class Fixtures:
+    """
+    Class. Fixture weather API answers and the data synthesized from them.
+    Attributes:
+        forecast (Dict[str, Any]): fixture forecast.json answer.
+        locations (List[Dict[str, Any]]): fixture search.json answer.
+        known (Dict[int, Dict[str, Any]]): search results by id, from the
+            fixture and synthesized.
+    """
+
+    def __init__(self, directory: Path = FIXTURES):
+        self.forecast = orjson.loads((directory / "forecast_3d.json").read_bytes())
+        self.locations = orjson.loads((directory / "search.json").read_bytes())
+        self.known = {location["id"]: location for location in self.locations}
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Function. Fixture locations starting with the query, or one
+        synthesized location named after it.
+        :param query: search query
+        :return: search results
+        """
+        name: str = query.strip().lower()
+        if not name:
+            raise StubError(400, 1003, "Parameter q is missing.")
+        found: List[Dict[str, Any]] = [
+            location
+            for location in self.locations
+            if location["name"].lower().startswith(name)
+        ]
+        if found or len(name) < 3:
+            return found
+
+        location_id: int = (
+            SYNTHETIC_ID_BASE + zlib.crc32(name.encode()) % SYNTHETIC_ID_BASE
+        )
+        if location_id not in self.known:
+            base: Dict[str, Any] = self.location(location_id)
+            self.known[location_id] = {
+                **base,
+                "name": name.title(),
+                "url": name.replace(" ", "-"),
+            }
+        return [self.known[location_id]]
+
+    def location(self, location_id: int) -> Dict[str, Any]:
+        """
+        Function. Search result of a location id. An unknown id is a
+        fixture location moved by up to a degree.
+        :param location_id: weather API location id
+        :return: search result
+        """
+        if location_id in self.known:
+            return self.known[location_id]
+        base: Dict[str, Any] = self.locations[location_id % len(self.locations)]
+        rng = random.Random(location_id)
+        return {
+            **base,
+            "id": location_id,
+            "lat": round(base["lat"] + rng.uniform(-1, 1), 2),
+            "lon": round(base["lon"] + rng.uniform(-1, 1), 2),
+        }
+
+    def resolve(self, query: str) -> int:
+        """
+        Function. Location id of a q parameter.
+        :param query: "id:<id>" or a location name
+        :return: location id
+        """
+        if query.startswith("id:"):
+            try:
+                return int(query[3:])
+            except ValueError:
+                raise NO_LOCATION from None
+        found: List[Dict[str, Any]] = self.search(query)
+        if not found:
+            raise NO_LOCATION
+        return found[0]["id"]
+
+    @staticmethod
+    def shift(location_id: int, day: str) -> float:
+        """
+        Function. Temperature shift of a location on a date.
+        :param location_id: location id
+        :param day: ISO date
+        :return: degrees Celsius
+        """
+        return random.Random(f"{location_id}:{day}").uniform(-4, 4)
+
+    @lru_cache(maxsize=4096)
+    def forecast_days(self, location_id: int, today: str) -> Tuple[Dict, ...]:
+        """
+        Function. Forecast days of a location from a date on, fixture
+        days repeated to the longest horizon.
+        :param location_id: location id
+        :param today: ISO date of the first day
+        :return: forecast days
+        """
+        fixture_days: List[Dict[str, Any]] = self.forecast["forecast"]["forecastday"]
+        first: datetime = datetime.fromisoformat(today).replace(tzinfo=timezone.utc)
+        days: List[Dict[str, Any]] = []
+        for number in range(MAX_DAYS):
+            date: datetime = first + timedelta(days=number)
+            day: str = date.strftime("%Y-%m-%d")
+            shift: float = self.shift(location_id, day)
+            source: Dict[str, Any] = fixture_days[number % len(fixture_days)]
+            hours: List[Dict[str, Any]] = []
+            for hour_number, hour in enumerate(source["hour"]):
+                hour_start: datetime = date + timedelta(hours=hour_number)
+                hours.append(
+                    {
+                        **shifted(hour, shift),
+                        "time_epoch": int(hour_start.timestamp()),
+                        "time": hour_start.strftime("%Y-%m-%d %H:%M"),
+                    }
+                )
+            days.append(
+                {
+                    "date": day,
+                    "date_epoch": int(date.timestamp()),
+                    "day": shifted(source["day"], shift),
+                    "astro": copy.deepcopy(source["astro"]),
+                    "hour": hours,
+                }
+            )
+        return tuple(days)
+
+    def current(self, location_id: int, now: datetime) -> Dict[str, Any]:
+        """
+        Function. Location and current weather blocks, times in UTC.
+        :param location_id: location id
+        :param now: answer time
+        :return: current.json answer
+        """
+        location: Dict[str, Any] = self.location(location_id)
+        updated: datetime = now.replace(
+            minute=now.minute // 15 * 15, second=0, microsecond=0
+        )
+        return {
+            "location": {
+                "name": location["name"],
+                "region": location["region"],
+                "country": location["country"],
+                "lat": location["lat"],
+                "lon": location["lon"],
+                "tz_id": "UTC",
+                "localtime_epoch": int(now.timestamp()),
+                "localtime": now.strftime("%Y-%m-%d %H:%M"),
+            },
+            "current": {
+                **shifted(
+                    self.forecast["current"],
+                    self.shift(location_id, now.strftime("%Y-%m-%d")),
+                ),
+                "last_updated_epoch": int(updated.timestamp()),
+                "last_updated": updated.strftime("%Y-%m-%d %H:%M"),
+            },
+        }
+
+    def forecast_answer(
+        self, location_id: int, days: int, now: datetime
+    ) -> Dict[str, Any]:
+        """
+        Function. Forecast of a location.
+        :param location_id: location id
+        :param days: forecast days, clamped to the provider range
+        :param now: answer time
+        :return: forecast.json answer
+        """
+        forecast_days: Tuple[Dict, ...] = self.forecast_days(
+            location_id, now.strftime("%Y-%m-%d")
+        )
+        return {
+            **self.current(location_id, now),
+            "forecast": {
+                "forecastday": list(forecast_days[: max(1, min(days, MAX_DAYS))])
+            },
+            "alerts": {"alert": []},
+        }
+
+
+class WeatherApiStub:
+    """
+    Class. Starlette application of the stand-in.
+    Attributes:
+        options (StubOptions): latency and failure knobs.
+        fixtures (Fixtures): fixture and synthesized data.
+        random (random.Random): delay and failure draws.
+        calls (Counter): answers by endpoint and status.
+    """
+
+    def __init__(self, options: StubOptions, fixtures: Fixtures | None = None):
+        self.options = options
+        self.fixtures = Fixtures() if fixtures is None else fixtures
+        self.random = random.Random(options.seed)
+        self.calls = Counter()
+
+    def app(self) -> Starlette:
+        """
+        Function. Routes under /v1 like the weather API.
+        :return: Starlette application
+        """
+        return Starlette(
+            routes=[
+                Mount(
+                    "/v1",
+                    routes=[
+                        Route(
+                            f"/{endpoint}",
+                            self.endpoint(endpoint),
+                            methods=["GET", "POST"],
+                        )
+                        for endpoint in ("search.json", "forecast.json", "current.json")
+                    ],
+                ),
+                Route("/stats", self.stats),
+            ]
+        )
+
+    def latency(self) -> float:
+        """
+        Function. Draw an answer delay.
+        :return: seconds
+        """
+        mean: float = self.options.latency_ms / 1000
+        spread: float = self.options.latency_spread
+        if self.options.latency == "uniform":
+            return self.random.uniform(mean * (1 - spread), mean * (1 + spread))
+        if self.options.latency == "lognormal":
+            return self.random.lognormvariate(0, spread) * mean
+        return mean
+
+    async def fail(self, key: str | None) -> None:
+        """
+        Function. Delay the answer and draw a failure.
+        :param key: API key of the call
+        :return: None
+        :raises StubError: failure answer
+        """
+        draw: float = self.random.random()
+        if draw < self.options.stall_rate:
+            await asyncio.sleep(self.options.stall_sec)
+        else:
+            await asyncio.sleep(self.latency())
+
+        if not key:
+            raise StubError(401, 1002, "API key is invalid or not provided.")
+        if key in self.options.invalid_keys:
+            raise StubError(401, 2006, "API key provided is invalid.")
+        draw = self.random.random()
+        if draw < self.options.error_rate:
+            raise StubError(503, 9999, "Internal application error.")
+        if draw < self.options.error_rate + self.options.rate_limit_rate:
+            raise StubError(429, 9999, "Too many requests.")
+
+    def answer(self, endpoint: str, query: str, days: int) -> Any:
+        """
+        Function. Answer of one location query.
+        :param endpoint: endpoint path
+        :param query: q parameter
+        :param days: forecast days
+        :return: answer body
+        """
+        if endpoint == "search.json":
+            return self.fixtures.search(query)
+        now: datetime = datetime.now(timezone.utc)
+        location_id: int = self.fixtures.resolve(query)
+        if endpoint == "current.json":
+            return self.fixtures.current(location_id, now)
+        return self.fixtures.forecast_answer(location_id, days, now)
+
+    def endpoint(self, endpoint: str):
+        """
+        Function. Request handler of an endpoint.
+        :param endpoint: endpoint path
+        :return: Starlette endpoint
+        """
+
+        async def handle(request: Request) -> Response:
+            params = request.query_params
+            try:
+                await self.fail(params.get("key"))
+                query: str = params.get("q", "")
+                days: int = int(params.get("days", 1))
+                if request.method == "POST" and query == "bulk":
+                    body: Dict[str, Any] = orjson.loads(await request.body())
+                    result: Any = {
+                        "bulk": [
+                            {"query": self.bulk_answer(endpoint, location, days)}
+                            for location in body.get("locations", [])
+                        ]
+                    }
+                else:
+                    result = self.answer(endpoint, query, days)
+            except StubError as exc:
+                self.calls[(endpoint, exc.status_code)] += 1
+                return Response(
+                    orjson.dumps(exc.body()),
+                    status_code=exc.status_code,
+                    media_type="application/json",
+                )
+            self.calls[(endpoint, 200)] += 1
+            return Response(orjson.dumps(result), media_type="application/json")
+
+        return handle
+
+    def bulk_answer(
+        self, endpoint: str, location: Dict[str, Any], days: int
+    ) -> Dict[str, Any]:
+        """
+        Function. One entry of a bulk answer.
+        :param endpoint: endpoint path
+        :param location: {"q": ..., "custom_id": ...} bulk request entry
+        :param days: forecast days
+        :return: answer with the query echoed, or its error
+        """
+        echo: Dict[str, Any] = {
+            "custom_id": location.get("custom_id"),
+            "q": location.get("q", ""),
+        }
+        try:
+            return {**echo, **self.answer(endpoint, echo["q"], days)}
+        except StubError as exc:
+            return {**echo, **exc.body()}
+
+    async def stats(self, _: Request) -> Response:
+        """
+        Function. Answers served so far, by endpoint and status.
+        :return: {"forecast.json 200": 12, ...}
+        """
+        return Response(
+            orjson.dumps(
+                {
+                    f"{endpoint} {status}": n
+                    for (endpoint, status), n in self.calls.items()
+                }
+            ),
+            media_type="application/json",
+        )
+
+
+def record(key: str, location: str, directory: Path = FIXTURES) -> None:
+    """
+    Function. Record fixtures from the real weather API, spends two calls.
+    :param key: weather API key
+    :param location: location to record
+    :param directory: fixtures directory
+    :return: None
+    """
+    with httpx.Client(base_url="https://api.weatherapi.com/v1/") as client:
+        search: httpx.Response = client.get(
+            "search.json", params={"key": key, "q": location}
+        )
+        forecast: httpx.Response = client.get(
+            "forecast.json",
+            params={"key": key, "q": location, "days": 3, "aqi": "no", "alerts": "yes"},
+        )
+    for name, response in (("search.json", search), ("forecast_3d.json", forecast)):
+        response.raise_for_status()
+        (directory / name).write_bytes(
+            orjson.dumps(response.json(), option=orjson.OPT_INDENT_2)
+        )
+        print(f"Recorded {directory / name}")
+
+
+def main() -> None:
+    """
+    Function. Command line entry point.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run the stand-in")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    for name, field in StubOptions.model_fields.items():
+        flag: str = f"--{name.replace('_', '-')}"
+        if name == "invalid_keys":
+            serve.add_argument(flag, nargs="*", default=[])
+        elif name == "latency":
+            serve.add_argument(flag, choices=["fixed", "uniform", "lognormal"])
+        else:
+            serve.add_argument(flag, type=float if name != "seed" else int)
+
+    recorder = commands.add_parser("record", help="record fixtures, spends quota")
+    recorder.add_argument("key")
+    recorder.add_argument("location", nargs="?", default="Berlin")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.key, args.location)
+        return
+
+    options = StubOptions(
+        **{
+            name: value
+            for name, value in vars(args).items()
+            if name in StubOptions.model_fields and value is not None
+        }
+    )
+    uvicorn.run(
+        WeatherApiStub(options).app(),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
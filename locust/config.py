@@ -33,6 +33,34 @@ class Config:
     # )
 
     location_name: list[str] = ["SPb", "NY", "Berlin", "London"]
+    location_id: list[int] = [2145091, 2618724, 2801268, 2643743]
+    cold_location_id: int = 2801268
+    redis_url: str = "redis://localhost:6379"
+    forecast_body: dict = {
+        "user_settings": {
+            "current": True,
+            "daily": 3,
+            "hourly": 8,
+            "units": "F",
+        },
+        "current": {
+            "visibility": True,
+            "humidity": True,
+            "wind_extended": True,
+            "pressure": True,
+        },
+        "hourly": {
+            "visibility": True,
+            "humidity": True,
+            "wind_extended": True,
+            "pressure": True,
+        },
+        "daily": {
+            "visibility": True,
+            "humidity": True,
+            "astro": True,
+        },
+    }
     user_login: str = "user@example.com"
     user_password: str = "string"
 
@@ -0,0 +1,99 @@
+"""
+Module. Forecast cache miss coalescing load test.
+
+Every user sends one request for the same flushed location at once, then the
+number of get_forecast tasks executed by Celery workers is reported. With
+request coalescing it must be 1 whatever the number of users or uvicorn workers:
+    locust -f locust/http_cold_forecast_req.py --headless -u 200 -r 200 -t 30s
+The run fails unless every user got a 200 and exactly one task ran. Each
+user sends its own X-Forwarded-For address, so the per IP rate limiter
+lets every request reach the cache.
+Needs access to the app Redis (cache and broker), run it from the project env
+with the project root on PYTHONPATH.
+The Redis entry is deleted and an invalidation published, so every API
+worker also drops its in-process copy; shaped bodies are keyed by fetch
+time and are not reused for the new entry.
+"""
+
+import itertools
+import logging
+from typing import Any, Iterator
+
+import redis
+from celery import Celery
+from locust import HttpUser, constant, events, task
+from locust.exception import StopUser
+
+from app.utils.settings import settings
+from config import cfg
+
+FORECAST_TASK: str = "run_tasks.get_forecast"
+
+celery_control = Celery(broker=cfg.redis_url).control
+# Distinct client addresses, one per user, for the per IP rate limiter.
+client_addresses: Iterator[str] = (
+    f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}" for n in itertools.count(1)
+)
+
+
+def forecast_tasks_total() -> int:
+    """
+    Function. Sum of get_forecast tasks executed by all workers.
+    :return: number of tasks
+    """
+    stats: dict[str, Any] = celery_control.inspect().stats() or {}
+    return sum(worker["total"].get(FORECAST_TASK, 0) for worker in stats.values())
+
+
+@events.test_start.add_listener
+def flush_forecast(environment, **kwargs) -> None:
+    redis_connection: redis.Redis = redis.Redis.from_url(cfg.redis_url)
+    redis_connection.delete(
+        f"{settings.forecast_cache.KEY_PREFIX}:{cfg.cold_location_id}"
+    )
+    # Any origin but a worker's own makes every worker drop its local entry.
+    redis_connection.publish(
+        settings.forecast_cache.INVALIDATION_CHANNEL,
+        f"locust:{cfg.cold_location_id}",
+    )
+    environment.forecast_tasks_before = forecast_tasks_total()
+
+
+@events.test_stop.add_listener
+def report_upstream_calls(environment, **kwargs) -> None:
+    upstream_calls: int = forecast_tasks_total() - environment.forecast_tasks_before
+    requests: int = environment.stats.total.num_requests
+    failures: int = environment.stats.total.num_failures
+    logging.info(
+        "%s simultaneous misses (%s failed) -> %s upstream forecast calls",
+        requests,
+        failures,
+        upstream_calls,
+    )
+    if not requests or failures or upstream_calls != 1:
+        logging.error("Cold forecast misses were not coalesced into one call.")
+        environment.process_exit_code = 1
+
+
+class ColdForecastUser(HttpUser):
+    """
+    Class. Sends one request for a cold location and stops.
+    """
+
+    wait_time = constant(0)
+    host = cfg.api_host
+
+    def on_start(self) -> None:
+        self.client.headers["X-Forwarded-For"] = next(client_addresses)
+
+    @task
+    def get_cold_forecast(self) -> None:
+        with self.client.post(
+            f"/api_v1/id/{cfg.cold_location_id}/",
+            catch_response=True,
+            json=cfg.forecast_body,
+            name=self.get_cold_forecast.__name__,
+        ) as request:
+            if request.status_code != 200:
+                request.failure(request.text)
+        raise StopUser()
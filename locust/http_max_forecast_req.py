@@ -0,0 +1,38 @@
+"""
+Module. Concurrent forecast capacity load test.
+
+Run the same scenario against two builds (e.g. before and after the async
+forecast path) with a fixed number of users and compare RPS and p99:
+    LOCUSTFILE=http_max_forecast_req docker compose -f compose.locust.yaml up
+Cold requests (cache flushed) park a request on the Celery result, so the
+difference shows up once users exceed the threadpool size (~40).
+Raise settings.limiter.REQUEST_LIMIT for the run, all users share one IP.
+"""
+
+import random
+
+from locust import HttpUser, constant_pacing, task
+
+from config import cfg
+
+
+class ForecastUser(HttpUser):
+    """
+    Class. Load test for forecast by ID endpoint.
+    """
+
+    wait_time = constant_pacing(cfg.pacing_sec)
+    host = cfg.api_host
+
+    @task
+    def get_location_forecast(self) -> None:
+        location_id: int = random.choice(cfg.location_id)
+
+        with self.client.post(
+            f"/api_v1/id/{location_id}/",
+            catch_response=True,
+            json=cfg.forecast_body,
+            name=self.get_location_forecast.__name__,
+        ) as request:
+            if request.status_code != 200:
+                request.failure(request.text)
@@ -0,0 +1,38 @@
+"""
+Module. Shared test fixtures. Redis is replaced by fakeredis, the
+settings read at import time get placeholder values.
+"""
+
+import os
+
+for variable in ("DB_NAME", "DB_USERNAME", "DB_PASSWORD", "DB_HOST", "API_TOKEN"):
+    os.environ.setdefault(variable, "test")
+
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import pytest
+from fakeredis import FakeServer
+
+from app.schemas.weather_schemas import normalize_forecast
+from benchmarks.weatherapi_stub import Fixtures
+
+
+@pytest.fixture
+def redis_server() -> FakeServer:
+    """
+    Function. In-memory Redis server shared by the clients of one test.
+    :return: fake redis server
+    """
+    return FakeServer()
+
+
+@pytest.fixture(scope="session")
+def forecast_document() -> Dict[str, Any]:
+    """
+    Function. Canonical three day forecast document of the stand-in fixtures.
+    :return: forecast document
+    """
+    return normalize_forecast(
+        Fixtures().forecast_answer(2801268, 3, datetime.now(timezone.utc))
+    )
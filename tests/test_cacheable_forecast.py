@@ -0,0 +1,68 @@
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_limiter import FastAPILimiter
+
+from app.cache.forecast_cache import CachedForecast
+from app.utils.settings import settings
+
+pytestmark = pytest.mark.skipif(
+    not settings.jwt_authentication.private_key_path.exists(),
+    reason="JWT keys are not generated",
+)
+
+URL = "/app/api_v1/id/2801268/?units=C&days=3&hours=8&current=hv"
+
+
+@pytest.fixture
+def client(monkeypatch, redis_server, forecast_document: Dict[str, Any]):
+    from app.api_v1.views import location_controller
+    from app.api_v1.views.locations_router import location_router
+
+    cached = CachedForecast(forecast_document, time.time() - 60, time.time() + 600, 3)
+
+    async def get(location_id: int, days: int) -> CachedForecast:
+        return cached
+
+    monkeypatch.setattr(location_controller.forecast_cache, "get", get)
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        await FastAPILimiter.init(FakeAsyncRedis(server=redis_server))
+        yield
+
+    app = FastAPI(lifespan=lifespan, root_path="/app")
+    app.include_router(location_router)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_anonymous_responses_are_public(client):
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    assert response.headers["vary"] == "Authorization"
+
+
+def test_authenticated_responses_are_private(client):
+    from app.utils.auth import encode_jwt
+
+    token: str = encode_jwt({"sub": "1", "login": "user@example.com"})
+    response = client.get(URL, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("private, max-age=")
+    assert response.headers["vary"] == "Authorization"
+
+
+def test_revalidation_is_answered_without_a_body(client):
+    etag: str = client.get(URL).headers["etag"]
+    response = client.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert response.headers["vary"] == "Authorization"
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from app.cache.codec import CODECS, CacheCodec, decode, get_codec, register_codec
+
+DOCUMENT = {
+    "location": {"name": "Berlin", "localtime": "2025-06-01 12:00"},
+    "current": {"temp_c": 21.5, "is_day": 1, "condition": {"code": 1000}},
+    "hours": [{"time_epoch": 1748772000, "chance_of_rain": 0, "uv": None}],
+}
+
+
+@pytest.mark.parametrize("codec", list(CODECS.values()), ids=lambda codec: codec.name)
+def test_round_trip(codec: CacheCodec):
+    encoded: bytes = codec.encode(DOCUMENT)
+    assert encoded[0] == codec.version
+    assert decode(encoded) == DOCUMENT
+
+
+def test_legacy_json_is_read():
+    assert decode(json.dumps(DOCUMENT).encode()) == DOCUMENT
+
+
+def test_unknown_version_is_rejected():
+    with pytest.raises(ValueError, match="Unknown cache format version 250"):
+        decode(bytes((250,)) + b"data")
+
+
+def test_corrupted_value_is_rejected():
+    encoded: bytes = get_codec("json-zlib").encode(DOCUMENT)
+    with pytest.raises(ValueError, match="Corrupted 'json-zlib'"):
+        decode(encoded[:-4])
+
+
+def test_missing_codec_falls_back():
+    assert get_codec("cbor-brotli", "json-zlib") is get_codec("json-zlib")
+    with pytest.raises(ValueError, match="'cbor-brotli' is not available"):
+        get_codec("cbor-brotli")
+
+
+def test_taken_version_is_refused():
+    json_zlib: CacheCodec = get_codec("json-zlib")
+    with pytest.raises(ValueError, match="is taken"):
+        register_codec(
+            CacheCodec(
+                "json-copy",
+                json_zlib.version,
+                json_zlib.dumps,
+                json_zlib.loads,
+                json_zlib.compress,
+                json_zlib.decompress,
+            )
+        )
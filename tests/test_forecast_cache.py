@@ -0,0 +1,239 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+
+from app.cache.codec import get_codec
+from app.cache.forecast_cache import CachedForecast, ForecastCache
+from app.cache.local_cache import LocalCache
+from app.cache.single_flight import SingleFlight
+from app.utils.quota import QuotaState
+from app.utils.redis_engine import PubSubListener
+
+LOCATION_ID = 2801268
+STALE_GRACE = 600
+STALE_IF_ERROR = 3600
+
+
+class FixedTtl:
+    """
+    Class. TTL policy keeping written forecasts fresh for a set time.
+    """
+
+    def __init__(self, fresh: float = 900):
+        self.fresh = fresh
+
+    def stale_at(self, forecast, fetched_at: float, not_before=None) -> float:
+        return fetched_at + self.fresh
+
+
+class Upstream:
+    """
+    Class. Stands in for the Celery fetch, counting loads by horizon.
+    """
+
+    def __init__(self, forecast: Dict[str, Any]):
+        self.forecast = forecast
+        self.loads: List[int] = []
+        self.error: Exception | None = None
+
+    def patch(self, cache: ForecastCache) -> None:
+        async def load(location_id: int, days: int) -> CachedForecast:
+            self.loads.append(days)
+            await asyncio.sleep(0.01)
+            if self.error is not None:
+                raise self.error
+            return await cache.write(location_id, self.forecast, days)
+
+        cache._load = load
+
+
+async def started(
+    redis_server: FakeServer, forecast: Dict[str, Any], low_quota: bool = False
+):
+    redis_connection = FakeAsyncRedis(server=redis_server)
+    listener = PubSubListener(redis_connection, poll_timeout=0.01)
+    await listener.start()
+    cache = ForecastCache(
+        redis_connection,
+        listener,
+        SingleFlight(redis_connection, listener),
+        LocalCache("test", max_size=16, max_ttl=300),
+        stale_grace=STALE_GRACE,
+        stale_if_error=STALE_IF_ERROR,
+        codec=get_codec("json-zlib"),
+        max_days=3,
+        ttl_policy=FixedTtl(),
+        quota=QuotaState(
+            redis_connection, tokens=["key"], low_ratio=1.1 if low_quota else 0.0
+        ),
+    )
+    await cache.subscribe_invalidations()
+    upstream = Upstream(forecast)
+    upstream.patch(cache)
+    return cache, upstream
+
+
+async def aged(cache: ForecastCache, seconds_stale: float, days: int = 3):
+    """
+    Function. Store an entry that went stale seconds ago in both tiers.
+    """
+    cached: CachedForecast = await cache.write(LOCATION_ID, {"aged": True}, days)
+    cached = cached._replace(
+        fetched_at=cached.fetched_at - 900 - seconds_stale,
+        stale_at=time.time() - seconds_stale,
+    )
+    cache.local_cache.set(LOCATION_ID, cached, 60)
+    return cached
+
+
+async def settled(cache: ForecastCache) -> None:
+    while cache._refreshes:
+        await asyncio.sleep(0.01)
+    await cache.listener.stop()
+
+
+def test_miss_loads_the_horizon_once(redis_server, forecast_document):
+    async def scenario():
+        cache, upstream = await started(redis_server, forecast_document)
+        served = await asyncio.gather(*(cache.get(LOCATION_ID, 1) for _ in range(10)))
+        await settled(cache)
+        return served, upstream.loads
+
+    served, loads = asyncio.run(scenario())
+    assert loads == [3]
+    assert all(cached.forecast == forecast_document for cached in served)
+
+
+def test_longer_request_loads_past_the_cached_days(redis_server, forecast_document):
+    async def scenario():
+        cache, upstream = await started(redis_server, forecast_document)
+        await cache.get(LOCATION_ID, 3)
+        await cache.get(LOCATION_ID, 2)
+        await cache.get(LOCATION_ID, 5)
+        await settled(cache)
+        return upstream.loads
+
+    assert asyncio.run(scenario()) == [3, 5]
+
+
+def test_fresh_entry_is_read_from_redis(redis_server, forecast_document):
+    async def scenario():
+        cache, upstream = await started(redis_server, forecast_document)
+        await cache.get(LOCATION_ID, 3)
+        cache.local_cache.delete(LOCATION_ID)
+        cached = await cache.get(LOCATION_ID, 3)
+        await settled(cache)
+        return cached, upstream.loads
+
+    cached, loads = asyncio.run(scenario())
+    assert loads == [3]
+    assert cached.forecast == forecast_document
+    assert not cached.is_stale
+
+
+def test_stale_entry_is_served_and_refreshed(redis_server, forecast_document):
+    async def scenario():
+        cache, upstream = await started(redis_server, forecast_document)
+        stale = await aged(cache, STALE_GRACE / 2)
+        served = await cache.get(LOCATION_ID, 3)
+        await settled(cache)
+        return stale, served, upstream.loads, cache.local_cache.get(LOCATION_ID)
+
+    stale, served, loads, refreshed = asyncio.run(scenario())
+    assert served == stale
+    assert loads == [3]
+    assert refreshed.forecast == forecast_document
+
+
+def test_low_quota_serves_stale_without_refreshing(redis_server, forecast_document):
+    async def scenario():
+        cache, upstream = await started(redis_server, forecast_document, True)
+        stale = await aged(cache, STALE_GRACE * 2)
+        served = await cache.get(LOCATION_ID, 3)
+        await settled(cache)
+        return stale, served, upstream.loads
+
+    stale, served, loads = asyncio.run(scenario())
+    assert served == stale
+    assert loads == []
+
+
+def test_entry_past_grace_is_reloaded(redis_server, forecast_document):
+    async def scenario():
+        cache, upstream = await started(redis_server, forecast_document)
+        await aged(cache, STALE_GRACE * 2)
+        served = await cache.get(LOCATION_ID, 3)
+        await settled(cache)
+        return served, upstream.loads
+
+    served, loads = asyncio.run(scenario())
+    assert loads == [3]
+    assert served.forecast == forecast_document
+
+
+def test_stale_entry_is_served_if_the_load_fails(redis_server, forecast_document):
+    async def scenario():
+        cache, upstream = await started(redis_server, forecast_document)
+        stale = await aged(cache, STALE_GRACE * 2)
+        upstream.error = RuntimeError("upstream down")
+        served = await cache.get(LOCATION_ID, 3)
+        await settled(cache)
+        return stale, served, upstream.loads
+
+    stale, served, loads = asyncio.run(scenario())
+    assert served == stale
+    assert loads == [3]
+
+
+def test_miss_fails_if_the_load_fails(redis_server, forecast_document):
+    async def scenario():
+        cache, upstream = await started(redis_server, forecast_document)
+        upstream.error = RuntimeError("upstream down")
+        try:
+            await cache.get(LOCATION_ID, 3)
+        finally:
+            await settled(cache)
+
+    with pytest.raises(RuntimeError, match="upstream down"):
+        asyncio.run(scenario())
+
+
+def test_batch_answers_failed_locations_with_their_error(
+    redis_server, forecast_document
+):
+    async def scenario():
+        cache, upstream = await started(redis_server, forecast_document)
+        await cache.get(LOCATION_ID, 3)
+        upstream.error = RuntimeError("upstream down")
+        found = await cache.get_many([LOCATION_ID, 1], 3)
+        await settled(cache)
+        return found
+
+    found = asyncio.run(scenario())
+    assert found[LOCATION_ID].forecast == forecast_document
+    assert isinstance(found[1], RuntimeError)
+
+
+def test_other_workers_writes_drop_the_local_entry(redis_server, forecast_document):
+    async def scenario():
+        cache, _ = await started(redis_server, forecast_document)
+        other, _ = await started(redis_server, forecast_document)
+        await cache.get(LOCATION_ID, 3)
+        # Let the invalidation of the first write land before the second.
+        await asyncio.sleep(0.1)
+        await other.write(LOCATION_ID, forecast_document, 3)
+        for _ in range(100):
+            if cache.local_cache.get(LOCATION_ID) is None:
+                break
+            await asyncio.sleep(0.01)
+        own_entry = other.local_cache.get(LOCATION_ID)
+        await settled(cache)
+        await settled(other)
+        return cache.local_cache.get(LOCATION_ID), own_entry
+
+    dropped, own_entry = asyncio.run(scenario())
+    assert dropped is None
+    assert own_entry is not None
@@ -0,0 +1,66 @@
+from typing import Annotated
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.api_v1.forecast_query import ForecastQuery, etag_matches, forecast_query
+from app.utils.settings import settings
+
+ETAG = '"1748772000.12-0123456789abcdef"'
+
+app = FastAPI()
+
+
+@app.get("/query")
+def echo_query(query: Annotated[ForecastQuery, Depends(forecast_query)]) -> dict:
+    return {"canonical": query.canonical, "etag": query.etag(1748772000, 12)}
+
+
+client = TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "if_none_match, matches",
+    [
+        (None, False),
+        ("", False),
+        (ETAG, True),
+        (f"W/{ETAG}", True),
+        (f'"other", {ETAG}', True),
+        ("*", True),
+        ('"1748772000.12-fedcba9876543210"', False),
+    ],
+)
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(ETAG, if_none_match) is matches
+
+
+def test_spellings_of_the_same_settings_share_an_etag():
+    first = client.get("/query?units=C&days=3&current=wvhp&daily=vah&hourly=hh")
+    second = client.get("/query?hourly=h&daily=ahv&current=hpvw&units=C")
+    assert first.json() == second.json()
+    assert first.json()["canonical"] == (
+        "units=C&days=3&hours=8&current=hpvw&daily=ahv&hourly=h"
+    )
+
+
+def test_settings_change_the_etag():
+    first = client.get("/query?units=C&current=h")
+    second = client.get("/query?units=C&current=p")
+    assert first.json()["etag"] != second.json()["etag"]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "units=K",
+        "current=x",
+        "days=0",
+        f"days={settings.forecast_cache.UPSTREAM_MAX_DAYS + 1}",
+        f"hours={settings.forecast_cache.UPSTREAM_MAX_DAYS * 24 + 1}",
+        "fields=current.nope",
+    ],
+)
+def test_invalid_queries_are_rejected(query):
+    assert client.get(f"/query?{query}").status_code == 422
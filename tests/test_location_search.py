@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.api_v1.views import location_controller
+
+LOCATION: Dict[str, Any] = {
+    "id": 2801268,
+    "name": "London",
+    "region": "City of London, Greater London",
+    "country": "United Kingdom",
+    "lat": 51.52,
+    "lon": -0.11,
+}
+
+
+class Session:
+    """
+    Class. Stands in for the SQLAlchemy session, counting rollbacks.
+    """
+
+    def __init__(self):
+        self.rollbacks = 0
+
+    async def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def upstream(monkeypatch) -> List[str]:
+    searched: List[str] = []
+
+    async def get(location_name: str, load):
+        return await load(location_name.lower())
+
+    async def search_upstream(query: str) -> List[Dict[str, Any]]:
+        searched.append(query)
+        return [LOCATION]
+
+    monkeypatch.setattr(location_controller.search_cache, "get", get)
+    monkeypatch.setattr(
+        location_controller.search_cache, "search_upstream", search_upstream
+    )
+    return searched
+
+
+def database_down(*args, **kwargs):
+    raise OperationalError("SELECT", {}, Exception("connection refused"))
+
+
+async def found_nothing(session, query: str) -> List[Dict[str, Any]]:
+    return []
+
+
+def test_failing_gazetteer_falls_back_to_the_weather_api(monkeypatch, upstream):
+    async def failing(*args, **kwargs):
+        database_down()
+
+    monkeypatch.setattr(location_controller, "find_gazetteer_locations", failing)
+    monkeypatch.setattr(location_controller, "save_gazetteer_locations", failing)
+    # Keep the database error file log out of the test run.
+    monkeypatch.setattr(
+        location_controller, "database_logger", logging.getLogger(__name__)
+    )
+    session = Session()
+    locations = asyncio.run(location_controller.get_locations("London", session))
+    assert [location.id for location in locations] == [LOCATION["id"]]
+    assert upstream == ["london"]
+    assert session.rollbacks == 2
+
+
+def test_query_known_to_find_nothing_is_not_searched_again(monkeypatch, upstream):
+    monkeypatch.setattr(location_controller, "find_gazetteer_locations", found_nothing)
+    locations = asyncio.run(location_controller.get_locations("Nowhere", Session()))
+    assert locations == []
+    assert upstream == []
@@ -0,0 +1,117 @@
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import pytest
+from pydantic_core import to_json
+
+from app.api_v1.projection import parse_fields, projection_plan
+from app.schemas.setting_schemas import CurrentSettings, DailySettings, HourlySettings
+from app.schemas.weather_schemas import normalize_forecast
+from benchmarks.projection_benchmark import validated
+from benchmarks.weatherapi_stub import Fixtures
+
+CURRENT = CurrentSettings(visibility=True, humidity=True)
+DAILY = DailySettings(visibility=True, humidity=True, astro=True)
+HOURLY = HourlySettings(visibility=True, humidity=True, pressure=True)
+
+
+def hour_times(shaped: Dict[str, Any]) -> List[str]:
+    return [hour["time"] for hour in shaped["forecast"]["forecasthour"]]
+
+
+@pytest.mark.parametrize(
+    "fields, selection",
+    [
+        (None, ()),
+        ("", ()),
+        (" current.temp , current ", ("current",)),
+        (
+            "forecasthour.condition,current.temp,forecasthour.temp",
+            ("current.temp", "forecasthour.condition", "forecasthour.temp"),
+        ),
+        ("forecastday.astro,alerts", ("alerts", "forecastday.astro")),
+    ],
+)
+def test_parse_fields_is_canonical(fields, selection):
+    assert parse_fields(fields) == selection
+
+
+@pytest.mark.parametrize(
+    "fields, message",
+    [
+        ("current.temp,", "Empty field selector"),
+        (",current", "Empty field selector"),
+        ("current.", "Empty field selector"),
+        ("current.temp,weather", "Unknown fields: weather"),
+        ("current.nope,forecasthour.temp", "Unknown fields: current.nope"),
+    ],
+)
+def test_parse_fields_rejects_bad_selectors(fields, message):
+    with pytest.raises(ValueError, match=message):
+        parse_fields(fields)
+
+
+@pytest.mark.parametrize("units", ["C", "F"])
+def test_plan_matches_model_validation(units):
+    forecast: Dict[str, Any] = Fixtures().forecast_answer(
+        2801268, 3, datetime.now(timezone.utc)
+    )
+    plan = projection_plan(units, CURRENT, DAILY, HOURLY)
+    shaped = plan.shape(normalize_forecast(forecast), 3, 0, 72)
+    assert json.loads(to_json(shaped)) == json.loads(
+        validated(forecast, units, CURRENT, DAILY, HOURLY)
+    )
+
+
+def test_units_select_unit_fields(forecast_document):
+    metric = projection_plan("C", CURRENT, DAILY, HOURLY).shape(
+        forecast_document, 1, 0, 1
+    )
+    british = projection_plan("F", CURRENT, DAILY, HOURLY).shape(
+        forecast_document, 1, 0, 1
+    )
+    assert "temp_c" in metric["current"] and "temp_f" not in metric["current"]
+    assert "temp_f" in british["current"] and "temp_c" not in british["current"]
+
+
+def test_hour_window_spans_days(forecast_document):
+    plan = projection_plan("C", CURRENT, DAILY, HOURLY)
+    hours: List[Dict[str, Any]] = [
+        hour
+        for forecast_day in forecast_document["forecast"]["forecastday"]
+        for hour in forecast_day["hour"]
+    ]
+    shaped = plan.shape(forecast_document, 3, 20, 8)
+    assert hour_times(shaped) == [hour["time"] for hour in hours[20:28]]
+    assert len(shaped["forecast"]["forecastday"]) == 3
+
+
+def test_hour_window_stops_at_the_shown_days(forecast_document):
+    plan = projection_plan("C", CURRENT, DAILY, HOURLY)
+    assert len(hour_times(plan.shape(forecast_document, 1, 20, 8))) == 4
+
+
+def test_sparse_fieldset_leaves_sections_out(forecast_document):
+    plan = projection_plan(
+        "C", CURRENT, DAILY, HOURLY, parse_fields("current.temp,forecasthour.temp")
+    )
+    shaped = plan.shape(forecast_document, 3, 0, 2)
+    assert set(shaped) == {"current", "forecast"}
+    assert shaped["current"] == {"temp_c": forecast_document["current"]["temp_c"]}
+    assert set(shaped["forecast"]) == {"forecasthour"}
+    assert all(
+        set(hour) == {"time", "temp_c"} for hour in shaped["forecast"]["forecasthour"]
+    )
+
+
+def test_display_settings_hide_fields(forecast_document):
+    plan = projection_plan(
+        "C",
+        CURRENT.model_copy(update={"humidity": False}),
+        DAILY.model_copy(update={"astro": False}),
+        HOURLY,
+    )
+    shaped = plan.shape(forecast_document, 1, 0, 1)
+    assert "humidity" not in shaped["current"]
+    assert "astro" not in shaped["forecast"]["forecastday"][0]
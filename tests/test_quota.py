@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeAsyncRedis, FakeRedis
+
+from app.utils.quota import CredentialPool, QuotaState, UpstreamQuota
+from app.utils.retry import QuotaExhaustedError
+
+TOKENS = ["first-key", "second-key"]
+
+
+@pytest.fixture
+def pool(redis_server) -> CredentialPool:
+    return CredentialPool(
+        FakeRedis(server=redis_server),
+        TOKENS,
+        FakeAsyncRedis(server=redis_server),
+        auth_quarantine_sec=60,
+        rate_limit_quarantine_sec=10,
+    )
+
+
+def quota(redis_server, burst: int = 3) -> UpstreamQuota:
+    return UpstreamQuota(
+        FakeRedis(server=redis_server),
+        "key",
+        FakeAsyncRedis(server=redis_server),
+        calls_per_month=1,
+        burst=burst,
+        costs={"forecast.json": 2},
+        default_cost=1,
+    )
+
+
+def test_bucket_takes_endpoint_costs_all_or_nothing(redis_server):
+    bucket = quota(redis_server)
+    assert bucket.try_spend("forecast.json")
+    assert not bucket.try_spend("forecast.json")
+    assert bucket.try_spend("search.json")
+    assert not bucket.try_spend("search.json")
+
+
+def test_sync_and_async_spend_one_bucket(redis_server):
+    bucket = quota(redis_server, burst=4)
+    assert bucket.try_spend("forecast.json")
+
+    async def spend():
+        return [await bucket.try_spend_async("search.json") for _ in range(3)]
+
+    assert asyncio.run(spend()) == [True, True, False]
+
+
+def test_bulk_calls_pay_per_location(redis_server):
+    bucket = quota(redis_server, burst=5)
+    assert not bucket.try_spend("forecast.json", calls=3)
+    assert bucket.try_spend("forecast.json", calls=2)
+
+
+def test_pool_round_robins_keys(pool):
+    used = {pool.acquire("search.json").id for _ in range(4)}
+    assert used == {credential.id for credential in pool.credentials}
+
+
+def test_rejected_key_is_quarantined_for_every_worker(pool, redis_server):
+    credential = pool.acquire("search.json")
+    assert pool.record(credential, 401)
+    other = CredentialPool(FakeRedis(server=redis_server), TOKENS)
+    assert {other.acquire("search.json").id for _ in range(4)} == {
+        next(c.id for c in other.credentials if c.id != credential.id)
+    }
+
+
+@pytest.mark.parametrize(
+    "status_code, quarantined",
+    [(None, False), (200, False), (500, False), (400, False), (403, True), (429, True)],
+)
+def test_only_key_rejections_quarantine(pool, status_code, quarantined):
+    credential = pool.acquire("search.json")
+    assert pool.record(credential, status_code) is quarantined
+
+
+def test_async_pool_matches_the_sync_one(pool):
+    async def scenario():
+        credential = await pool.acquire_async("search.json")
+        quarantined = await pool.record_async(credential, 429)
+        remaining = {(await pool.acquire_async("search.json")).id for _ in range(4)}
+        return credential, quarantined, remaining
+
+    credential, quarantined, remaining = asyncio.run(scenario())
+    assert quarantined
+    assert credential.id not in remaining and len(remaining) == 1
+    assert credential.id not in {pool.acquire("search.json").id for _ in range(4)}
+
+
+def test_exhausted_pool_refuses_the_call(pool):
+    for credential in pool.credentials:
+        pool.record(credential, 403)
+    with pytest.raises(QuotaExhaustedError):
+        pool.acquire("search.json")
+
+    async def scenario():
+        await pool.acquire_async("search.json")
+
+    with pytest.raises(QuotaExhaustedError):
+        asyncio.run(scenario())
+
+
+def test_excluded_keys_are_skipped(pool):
+    first = pool.acquire("search.json")
+    assert pool.acquire("search.json", exclude=[first.id]).id != first.id
+
+
+def test_quota_state_reads_the_pool_level(redis_server):
+    bucket = quota(redis_server, burst=4)
+    bucket.try_spend("forecast.json")
+
+    async def scenario():
+        state = QuotaState(
+            FakeAsyncRedis(server=redis_server),
+            tokens=[],
+            burst=4,
+            calls_per_month=1,
+            low_ratio=0.6,
+            check_interval=0,
+        )
+        state.bucket_keys = [bucket.key]
+        return await state.level(), await state.is_low()
+
+    level, is_low = asyncio.run(scenario())
+    assert level == pytest.approx(0.5, abs=0.01)
+    assert is_low
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+from celery import Celery, states
+from celery.backends.redis import RedisBackend, ResultConsumer
+from celery.signals import after_task_publish
+from fakeredis import FakeAsyncRedis, FakeRedis
+
+from app.celery_tasks.result_consumer import AsyncResultConsumer
+from app.utils.redis_engine import PubSubListener
+
+LOCATIONS = [{"id": 2801268, "name": "London"}]
+
+
+@pytest.fixture
+def outcome() -> Dict[str, Any]:
+    return {"result": LOCATIONS, "state": states.SUCCESS}
+
+
+@pytest.fixture
+def celery_app(monkeypatch, redis_server, outcome: Dict[str, Any]) -> Celery:
+    monkeypatch.setattr(
+        RedisBackend,
+        "_create_client",
+        lambda backend, **params: FakeRedis(server=redis_server),
+    )
+    app = Celery("test", broker="memory://", backend="redis://")
+
+    @app.task(name="search")
+    def search(query: str):
+        return LOCATIONS
+
+    def answer(sender=None, headers=None, **kwargs):
+        # Stands in for a worker storing the outcome of every sent task.
+        if sender == "search":
+            app.backend.store_result(headers["id"], outcome["result"], outcome["state"])
+
+    after_task_publish.connect(answer, weak=False)
+    yield app
+    after_task_publish.disconnect(answer)
+
+
+def applied(celery_app: Celery, redis_server, calls: int):
+    async def scenario():
+        listener = PubSubListener(FakeAsyncRedis(server=redis_server), 0.01)
+        await listener.start()
+        consumer = AsyncResultConsumer(listener, app=celery_app, mode="celery")
+        try:
+            return await asyncio.gather(
+                *(
+                    consumer.apply(celery_app.tasks["search"], ("london",))
+                    for _ in range(calls)
+                )
+            )
+        finally:
+            await listener.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_results_are_awaited_on_the_listener_only(
+    monkeypatch, celery_app, redis_server
+):
+    subscribed: List[str] = []
+    monkeypatch.setattr(ResultConsumer, "consume_from", subscribed.append)
+    assert applied(celery_app, redis_server, 20) == [LOCATIONS] * 20
+    # The backend's own result consumer never subscribed.
+    assert subscribed == []
+
+
+def test_failed_task_raises_its_error(celery_app, redis_server, outcome):
+    outcome.update(result=ValueError("no such place"), state=states.FAILURE)
+    with pytest.raises(ValueError, match="no such place"):
+        applied(celery_app, redis_server, 1)
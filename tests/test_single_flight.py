@@ -0,0 +1,128 @@
+import asyncio
+from typing import Dict, List
+
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+
+from app.cache.single_flight import SingleFlight
+from app.utils.exception_handler import GatewayTimeoutError
+from app.utils.redis_engine import PubSubListener
+
+
+class Store:
+    """
+    Class. Value store standing in for the forecast cache, counting loads.
+    """
+
+    def __init__(self, load_delay: float = 0.05):
+        self.values: Dict[str, str] = {}
+        self.loads: List[str] = []
+        self.load_delay = load_delay
+
+    def read(self, key: str):
+        async def read() -> str | None:
+            return self.values.get(key)
+
+        return read
+
+    def load(self, key: str, value: str):
+        async def load() -> str:
+            self.loads.append(key)
+            await asyncio.sleep(self.load_delay)
+            self.values[key] = value
+            return value
+
+        return load
+
+
+async def started(redis_server: FakeServer, **kwargs) -> SingleFlight:
+    redis_connection = FakeAsyncRedis(server=redis_server)
+    listener = PubSubListener(redis_connection, poll_timeout=0.01)
+    await listener.start()
+    return SingleFlight(redis_connection, listener, **kwargs)
+
+
+def test_concurrent_callers_share_one_load(redis_server):
+    async def scenario():
+        single_flight = await started(redis_server)
+        store = Store()
+        values = await asyncio.gather(
+            *(
+                single_flight.do("k", store.read("k"), store.load("k", "v"))
+                for _ in range(20)
+            )
+        )
+        await single_flight.listener.stop()
+        return values, store.loads
+
+    values, loads = asyncio.run(scenario())
+    assert values == ["v"] * 20
+    assert loads == ["k"]
+
+
+def test_processes_share_one_load(redis_server):
+    async def scenario():
+        flights = [await started(redis_server) for _ in range(3)]
+        store = Store()
+        values = await asyncio.gather(
+            *(
+                single_flight.do("k", store.read("k"), store.load("k", "v"))
+                for single_flight in flights
+                for _ in range(5)
+            )
+        )
+        for single_flight in flights:
+            await single_flight.listener.stop()
+        return values, store.loads
+
+    values, loads = asyncio.run(scenario())
+    assert values == ["v"] * 15
+    assert loads == ["k"]
+
+
+def test_lease_is_released_after_a_failed_load(redis_server):
+    async def scenario():
+        single_flight = await started(redis_server)
+        store = Store()
+
+        async def fail() -> str:
+            raise RuntimeError("upstream down")
+
+        with pytest.raises(RuntimeError):
+            await single_flight.do("k", store.read("k"), fail)
+        value = await single_flight.do("k", store.read("k"), store.load("k", "v"))
+        lease = await single_flight.redis_connection.get("lease:k")
+        await single_flight.listener.stop()
+        return value, lease
+
+    assert asyncio.run(scenario()) == ("v", None)
+
+
+def test_follower_times_out_on_a_stuck_leader(redis_server):
+    async def scenario():
+        single_flight = await started(redis_server, wait_timeout=0.2)
+        await single_flight.redis_connection.set("lease:k", "other", px=10_000)
+        store = Store()
+        try:
+            await single_flight.do("k", store.read("k"), store.load("k", "v"))
+        finally:
+            await single_flight.listener.stop()
+
+    with pytest.raises(GatewayTimeoutError):
+        asyncio.run(scenario())
+
+
+def test_try_lead_skips_a_key_in_flight(redis_server):
+    async def scenario():
+        single_flight = await started(redis_server)
+        store = Store()
+        flight = asyncio.create_task(
+            single_flight.do("k", store.read("k"), store.load("k", "v"))
+        )
+        await asyncio.sleep(0)
+        led = await single_flight.try_lead("k", store.load("k", "w"))
+        await flight
+        await single_flight.listener.stop()
+        return led, store.loads
+
+    assert asyncio.run(scenario()) == (False, ["k"])
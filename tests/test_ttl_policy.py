@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+from app.cache.ttl_policy import TtlPolicy, next_half_hour
+
+FETCHED_AT = 1_800_000_000.0
+
+
+@pytest.fixture
+def policy() -> TtlPolicy:
+    return TtlPolicy(upstream_interval=900, min_ttl=300, max_ttl=3600, jitter=0)
+
+
+def forecast(last_updated: float | None) -> dict:
+    return {"current": {"last_updated_epoch": last_updated}}
+
+
+@pytest.mark.parametrize(
+    "moment, boundary",
+    [
+        ("2026-10-17 12:00:00", "2026-10-17 12:30:00"),
+        ("2026-10-17 12:29:59", "2026-10-17 12:30:00"),
+        ("2026-10-17 12:30:00", "2026-10-17 13:00:00"),
+        ("2026-10-17 23:45:10", "2026-10-18 00:00:00"),
+    ],
+)
+def test_next_half_hour(moment, boundary):
+    assert next_half_hour(datetime.fromisoformat(moment)) == datetime.fromisoformat(
+        boundary
+    )
+
+
+def test_fresh_until_the_next_upstream_update(policy):
+    stale_at = policy.stale_at(forecast(FETCHED_AT - 100), FETCHED_AT)
+    assert stale_at == FETCHED_AT - 100 + 900
+
+
+def test_late_data_stays_fresh_for_the_minimum(policy):
+    assert policy.stale_at(forecast(FETCHED_AT - 3000), FETCHED_AT) == FETCHED_AT + 300
+
+
+def test_freshness_is_capped(policy):
+    assert policy.stale_at(forecast(FETCHED_AT + 9000), FETCHED_AT) == (
+        FETCHED_AT + 3600
+    )
+
+
+def test_not_before_extends_freshness(policy):
+    stale_at = policy.stale_at(forecast(FETCHED_AT), FETCHED_AT, FETCHED_AT + 1200)
+    assert stale_at == FETCHED_AT + 1200
+
+
+def test_payload_without_update_time_goes_stale_at_a_boundary(policy):
+    stale_at = policy.stale_at(forecast(None), FETCHED_AT)
+    assert stale_at == next_half_hour(datetime.fromtimestamp(FETCHED_AT)).timestamp()
+
+
+def test_jitter_spreads_expiry():
+    policy = TtlPolicy(upstream_interval=900, min_ttl=300, max_ttl=3600, jitter=180)
+    stale_ats = {policy.stale_at(forecast(FETCHED_AT), FETCHED_AT) for _ in range(50)}
+    assert len(stale_ats) > 1
+    assert all(
+        FETCHED_AT + 900 <= stale_at <= FETCHED_AT + 1080 for stale_at in stale_ats
+    )